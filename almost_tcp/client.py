@@ -0,0 +1,433 @@
+"""
+Host-side Almost TCP connections, over asyncio.
+
+A Client multiplexes many streams over one serial link: any asyncio
+StreamReader / StreamWriter pair. Each stream is set up with a
+syn / synack / ack handshake, and tracks its own sequence and
+acknowledgement numbers; its callers get an asyncio.StreamReader and a
+StreamWriter-like writer, as from asyncio.open_connection.
+
+-   Sending is windowed (see WindowedSender): as much data as the peer's
+    window allows is sent back-to-back, without waiting for each packet to
+    be acknowledged.
+-   Acknowledgements are delayed and cumulative: each batch of packets read
+    from the link is acknowledged at once. They ride on outgoing data where
+    there is any, and are only sent alone if nothing else goes out within
+    `ack_delay`, or if a lot of data is unacknowledged.
+
+The serial link is assumed to be reliable and in-order; there is no
+retransmission.
+
+A client can probe the device for its capacity: which streams it has, and
+how much each can buffer. Then connections are opened on the device's
+streams as they are free, so the same host runs at full concurrency on
+devices with more or fewer streams.
+"""
+
+import asyncio
+import random
+from typing import Callable, Optional
+
+from almost_tcp.message_host import (
+    AlreadyFinishedError, ConnectionFailedError, PROBE_STREAM,
+    Capacity, Flags, Header, Packet, WindowedSender, decode_many)
+
+
+class Stream:
+    """
+    State of one ATCP stream.
+
+    Created by a Client, when opening a connection or accepting one.
+
+    Parameters
+    ----------
+    client:     Client
+                Link the stream runs over.
+    stream_id:  int
+                Stream ID.
+    """
+
+    SEQ_MOD = WindowedSender.SEQ_MOD
+
+    def __init__(self, client: "Client", stream_id: int):
+        self.id = stream_id
+        self._client = client
+        # Initial sequence number; the syn occupies it.
+        self._isn = random.randrange(self.SEQ_MOD)
+        self.sender = WindowedSender(
+            stream_id, seq=(self._isn + 1) % self.SEQ_MOD,
+            max_length=client.max_length)
+        # Sequence number of the next byte expected from the peer:
+        self.rcv_next = 0
+        self.reader = asyncio.StreamReader()
+        self.writer = StreamWriter(self)
+
+        self.state = "closed"
+        self.established = asyncio.Event()
+        self.fin_acked = asyncio.Event()
+        # Set on each acknowledgement, for drain().
+        self.progress = asyncio.Event()
+        self._closing = False
+        self._fin_sent = False
+        self._fin_received = False
+        # Bytes received but not yet acknowledged:
+        self._unacked = 0
+        self._ack_timer: Optional[asyncio.TimerHandle] = None
+
+    def _send(self, flags: Flags, seq: int, body: bytes = bytes()):
+        header = Header(flags, self.id, length=len(body), seq=seq)
+        self._stamp(header)
+        self._client._send(Packet(header, body))
+
+    def _stamp(self, header: Header):
+        """
+        Fill in the acknowledgement of an outgoing header.
+        """
+        if self.state == "syn_sent":
+            # Nothing to acknowledge yet.
+            header.window = self._client.window
+            return
+        header.flags.ack = True
+        header.ack = self.rcv_next
+        header.window = self._client.window
+        self._unacked = 0
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+
+    def connect(self):
+        """
+        Active open: send a syn.
+        """
+        self.state = "syn_sent"
+        self._send(Flags(syn=True), self._isn)
+
+    def accept(self, header: Header):
+        """
+        Passive open: answer a syn with a synack.
+        """
+        self.state = "syn_received"
+        self.rcv_next = (header.seq + 1) % self.SEQ_MOD
+        self._send(Flags(syn=True), self._isn)
+
+    def receive(self, packet: Packet):
+        header = packet.header
+        if header.flags.rst:
+            self.reader.set_exception(ConnectionResetError())
+            self._client._forget(self)
+            self.state = "closed"
+            self.established.set()
+            self.fin_acked.set()
+            self.progress.set()
+            return
+
+        if self.state == "syn_sent":
+            if not (header.flags.syn and header.flags.ack):
+                return
+            self.rcv_next = (header.seq + 1) % self.SEQ_MOD
+            self.state = "established"
+            self.sender.receive(header)
+            self.established.set()
+            # Complete the handshake now; data may be a while coming.
+            self.ack()
+            return
+
+        if header.flags.ack:
+            self.sender.receive(header)
+            self.progress.set()
+            if (self.state == "syn_received"
+                    and header.ack == self.sender.seq):
+                self.state = "established"
+                self.established.set()
+                self._client._accepted(self)
+            if self._fin_sent and self.sender.in_flight() == 0:
+                self.fin_acked.set()
+
+        if header.seq == self.rcv_next and not self._fin_received:
+            if packet.body:
+                self.reader.feed_data(packet.body)
+                self.rcv_next = (self.rcv_next + len(packet.body)) % self.SEQ_MOD
+                self._unacked += len(packet.body)
+            if header.flags.fin:
+                self.rcv_next = (self.rcv_next + 1) % self.SEQ_MOD
+                self._fin_received = True
+                self.reader.feed_eof()
+                self.ack()
+
+        if self._fin_received and self.fin_acked.is_set():
+            self._client._forget(self)
+
+    def settle(self):
+        """
+        After a batch of packets is received: send what the window allows,
+        and acknowledge what was received.
+        """
+        self.flush()
+        if self._unacked >= 2 * self._client.max_length:
+            self.ack()
+        elif self._unacked > 0 and self._ack_timer is None:
+            self._ack_timer = asyncio.get_running_loop().call_later(
+                self._client.ack_delay, self.ack)
+
+    def ack(self):
+        """
+        Send an acknowledgement, without data.
+        """
+        self._ack_timer = None
+        self._send(Flags(), self.sender.seq)
+
+    def flush(self):
+        """
+        Send what the window allows; then the fin, once all is sent.
+        """
+        if self.state != "established":
+            return
+        for packet in self.sender.packets():
+            self._stamp(packet.header)
+            self._client._send(packet)
+        if self._closing and not self._fin_sent and self.sender.pending() == 0:
+            self._fin_sent = True
+            self._send(Flags(fin=True), self.sender.seq)
+            # The fin occupies a sequence number.
+            self.sender.seq = (self.sender.seq + 1) % self.SEQ_MOD
+
+    def close(self):
+        self._closing = True
+        self.flush()
+
+
+class StreamWriter:
+    """
+    Writer for an ATCP stream, like asyncio.StreamWriter.
+
+    Closing the writer sends a fin: the stream can still be read until the
+    peer closes its side too.
+    """
+
+    def __init__(self, stream: Stream):
+        self._stream = stream
+
+    def write(self, data: bytes):
+        if self._stream._closing or self._stream.state == "closed":
+            raise AlreadyFinishedError("stream is closed for writing")
+        self._stream.sender.write(data)
+        self._stream.flush()
+
+    def writelines(self, data):
+        for line in data:
+            self.write(line)
+
+    async def drain(self):
+        """
+        Wait until the data written is (nearly all) sent.
+        """
+        stream = self._stream
+        while (stream.sender.pending() > stream._client.max_length
+               and stream.state != "closed"):
+            stream.progress.clear()
+            await stream.progress.wait()
+        await stream._client._writer.drain()
+
+    def can_write_eof(self):
+        return True
+
+    def write_eof(self):
+        self._stream.close()
+
+    def close(self):
+        self._stream.close()
+
+    def is_closing(self):
+        return self._stream._closing
+
+    async def wait_closed(self):
+        """
+        Wait until the fin is acknowledged.
+        """
+        await self._stream.fin_acked.wait()
+
+
+class Client:
+    """
+    Almost TCP streams over a serial link.
+
+    Use as an async context manager, to run the link:
+
+        async with Client(link_reader, link_writer) as client:
+            reader, writer = await client.open_connection(1)
+
+    Parameters
+    ----------
+    reader:     asyncio.StreamReader
+                Bytes from the device.
+    writer:     asyncio.StreamWriter
+                Bytes to the device.
+    client_connected_cb: optional callable
+                If given, streams the peer opens are accepted, and the
+                callback called with their reader and writer (as with
+                asyncio.start_server). Otherwise, they are reset.
+    window:     int
+                Receive window to advertise, per stream.
+    max_length: int
+                Maximum body length of a packet.
+    ack_delay:  float
+                Seconds to wait for data to carry an acknowledgement,
+                before sending it alone.
+    timeout:    float
+                Seconds to wait for a connection to be accepted,
+                or a probe answered.
+    capacity:   optional Capacity
+                If given, capacity probes from the peer are answered with it,
+                as a device would.
+
+    Attributes
+    ----------
+    peer_capacity: optional Capacity
+                What the peer has, once probed.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer,
+                 client_connected_cb: Optional[Callable] = None,
+                 window: int = 4096, max_length: int = 256,
+                 ack_delay: float = 0.01, timeout: float = 1.0,
+                 capacity: Optional[Capacity] = None):
+        self._reader = reader
+        self._writer = writer
+        self._client_connected_cb = client_connected_cb
+        self._capacity = capacity
+        self.peer_capacity: Optional[Capacity] = None
+        self._probe: Optional[asyncio.Future] = None
+        # Set when a stream closes, for open_connection to take its ID.
+        self._freed = asyncio.Event()
+        self.window = window
+        self.max_length = max_length
+        self.ack_delay = ack_delay
+        self.timeout = timeout
+        self._streams: dict[int, Stream] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def probe(self) -> Capacity:
+        """
+        Probe the device's capacity.
+
+        Later connections are opened on its streams; and packets are no
+        longer than a stream's buffer.
+        """
+        if self._probe is None:
+            self._probe = asyncio.get_running_loop().create_future()
+            self._send(Capacity.probe())
+        try:
+            async with asyncio.timeout(self.timeout):
+                capacity = await asyncio.shield(self._probe)
+        except TimeoutError:
+            self._probe = None
+            raise ConnectionFailedError("no answer to capacity probe")
+        self.peer_capacity = capacity
+        self.max_length = max(1, min(self.max_length, capacity.window))
+        return capacity
+
+    async def open_connection(self, stream_id: Optional[int] = None):
+        """
+        Open a stream.
+
+        If no stream ID is given, one of the device's streams is used (see
+        probe), waiting for one to be free if all are in use.
+
+        Returns
+        -------
+        (asyncio.StreamReader, StreamWriter)
+        """
+        if stream_id is None:
+            if self.peer_capacity is None:
+                await self.probe()
+            stream_id = await self._free_stream()
+        if stream_id in self._streams:
+            raise ValueError(f"stream {stream_id} is already open")
+        stream = Stream(self, stream_id)
+        self._streams[stream_id] = stream
+        stream.connect()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await stream.established.wait()
+        except TimeoutError:
+            self._forget(stream)
+            raise ConnectionFailedError(f"stream {stream_id}: no synack")
+        if stream.state != "established":
+            raise ConnectionFailedError(f"stream {stream_id}: reset")
+        return (stream.reader, stream.writer)
+
+    async def _free_stream(self) -> int:
+        while True:
+            for stream_id in self.peer_capacity.stream_ids:
+                if stream_id not in self._streams:
+                    return stream_id
+            self._freed.clear()
+            await self._freed.wait()
+
+    def _send(self, packet: Packet):
+        self._writer.write(packet.encode())
+
+    def _forget(self, stream: Stream):
+        if self._streams.get(stream.id) is stream:
+            del self._streams[stream.id]
+            self._freed.set()
+
+    def _accepted(self, stream: Stream):
+        result = self._client_connected_cb(stream.reader, stream.writer)
+        if asyncio.iscoroutine(result):
+            asyncio.create_task(result)
+
+    def _dispatch(self, packet: Packet) -> Optional[Stream]:
+        header = packet.header
+        if header.stream == PROBE_STREAM:
+            if not header.flags.syn:
+                pass
+            elif header.flags.ack:
+                if self._probe is not None and not self._probe.done():
+                    self._probe.set_result(Capacity.decode(packet.body))
+            elif self._capacity is not None:
+                self._send(self._capacity.response())
+            return None
+        stream = self._streams.get(header.stream)
+        if stream is not None:
+            stream.receive(packet)
+            return stream
+        elif header.flags.rst:
+            pass
+        elif (header.flags.syn and not header.flags.ack
+              and self._client_connected_cb is not None):
+            stream = Stream(self, header.stream)
+            self._streams[header.stream] = stream
+            stream.accept(header)
+        else:
+            self._send(Packet(Header(
+                Flags(rst=True), header.stream, seq=header.ack), bytes()))
+
+    async def _run(self):
+        buffer = bytearray()
+        while True:
+            data = await self._reader.read(4096)
+            if not data:
+                break
+            buffer += data
+            (packets, consumed) = decode_many(buffer)
+            del buffer[:consumed]
+            # Acknowledge each batch at once, rather than each packet.
+            received = set(self._dispatch(packet) for packet in packets)
+            for stream in received - {None}:
+                if stream.state != "closed":
+                    stream.settle()
+        # The link is gone, and all its streams with it.
+        for stream in list(self._streams.values()):
+            stream.receive(Packet(Header(Flags(rst=True), stream.id), bytes()))
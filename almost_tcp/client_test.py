@@ -0,0 +1,181 @@
+"""
+Tests for the asyncio ATCP client, over an in-memory link.
+"""
+
+import asyncio
+import pytest
+
+from almost_tcp.client import Client
+from almost_tcp.message_host import (
+    ConnectionFailedError, Capacity, Packet, PROBE_STREAM)
+
+pytest_plugins = ('pytest_asyncio',)
+
+
+class Pipe:
+    """
+    One direction of an in-memory serial link.
+
+    Each write is a packet; they're all logged, in order, to a log shared
+    with the other direction.
+    """
+
+    def __init__(self, name: str, log: list):
+        self.reader = asyncio.StreamReader()
+        self._name = name
+        self._log = log
+
+    def write(self, data: bytes):
+        self._log.append((self._name, Packet.decode(data)))
+        self.reader.feed_data(data)
+
+    async def drain(self):
+        pass
+
+
+def link(**kwargs):
+    """
+    A client and a server, connected by an in-memory link,
+    and the log of the packets between them.
+    """
+    log = []
+    to_server = Pipe("client", log)
+    to_client = Pipe("server", log)
+
+    async def upper_echo(reader, writer):
+        while data := await reader.read(100):
+            writer.write(data.upper())
+            await writer.drain()
+        writer.close()
+
+    client = Client(to_client.reader, to_server, **kwargs)
+    server = Client(to_server.reader, to_client,
+                    client_connected_cb=upper_echo, **kwargs)
+    return (client, server, log)
+
+
+async def echo(client, stream_id, data):
+    reader, writer = await client.open_connection(stream_id)
+    writer.write(data)
+    await writer.drain()
+    writer.close()
+    received = await reader.read(-1)
+    await writer.wait_closed()
+    return received
+
+
+@pytest.mark.asyncio
+async def test_echo():
+    (client, server, _log) = link()
+    data = bytes(ord("a") + i % 26 for i in range(10000))
+    async with client, server:
+        received = await echo(client, 1, data)
+        # The server closes once its fin is acknowledged.
+        async with asyncio.timeout(1):
+            while server._streams:
+                await asyncio.sleep(0.001)
+    assert received == data.upper()
+    assert client._streams == {}
+
+
+@pytest.mark.asyncio
+async def test_many_streams():
+    (client, server, _log) = link(max_length=32)
+    data = [f"stream {i} ".encode("utf-8") * 50 for i in range(8)]
+    async with client, server:
+        received = await asyncio.gather(*(
+            echo(client, i, d) for (i, d) in enumerate(data)))
+    assert received == [d.upper() for d in data]
+
+
+@pytest.mark.asyncio
+async def test_window():
+    (client, server, log) = link(window=100, max_length=16)
+    data = bytes(range(256)) * 4
+    async with client, server:
+        received = await echo(client, 3, data)
+    assert received == data.upper()
+
+    # Data in flight is always within the other side's window;
+    # and the window is used, not one packet per round trip.
+    acked = {}
+    window = {}
+    most_in_flight = 0
+    for (sender, packet) in log:
+        header = packet.header
+        if header.flags.ack:
+            acked[sender] = header.ack
+            window[sender] = header.window
+        if packet.body:
+            peer = "server" if sender == "client" else "client"
+            in_flight = (header.seq + header.length - acked[peer]) % 0x10000
+            assert in_flight <= window[peer]
+            most_in_flight = max(most_in_flight, in_flight)
+    assert most_in_flight > 16
+
+
+@pytest.mark.asyncio
+async def test_delayed_acks():
+    (client, server, log) = link(max_length=16)
+    data = bytes(1000)
+    async with client, server:
+        await echo(client, 1, data)
+
+    def count(sender, bare):
+        return sum(1 for (s, p) in log if s == sender and bare(p))
+
+    server_data = count("server", lambda p: len(p.body) > 0)
+    client_data = count("client", lambda p: len(p.body) > 0)
+    # Acknowledgements without data, syn, or fin:
+    client_acks = count("client", lambda p: not (
+        p.body or p.header.flags.syn or p.header.flags.fin))
+    # Cumulative: at most one per two packets received.
+    assert client_acks <= server_data // 2 + 1
+    # Most of the server's acks ride on its responses.
+    server_acks = count("server", lambda p: not (
+        p.body or p.header.flags.syn or p.header.flags.fin))
+    assert server_acks < client_data // 2
+
+
+@pytest.mark.asyncio
+async def test_refused():
+    (client, server, _log) = link()
+    # Streams can't be opened towards the client.
+    async with client, server:
+        with pytest.raises(ConnectionFailedError):
+            await server.open_connection(1)
+
+
+@pytest.mark.asyncio
+async def test_timeout():
+    to_device = Pipe("client", [])
+    silent = asyncio.StreamReader()
+    async with Client(silent, to_device, timeout=0.05) as client:
+        with pytest.raises(ConnectionFailedError):
+            await client.open_connection(1)
+        assert client._streams == {}
+
+
+@pytest.mark.asyncio
+async def test_probe_pool():
+    capacity = Capacity(stream_ids=[4, 9], window=48)
+    (client, server, log) = link(capacity=capacity)
+    data = [bytes([ord("a") + i]) * 200 for i in range(6)]
+    async with client, server:
+        # Connections wait for one of the device's two streams.
+        received = await asyncio.gather(*(
+            echo(client, None, d) for d in data))
+    assert received == [d.upper() for d in data]
+    assert client.peer_capacity == capacity
+    assert {p.header.stream for (_, p) in log} == {PROBE_STREAM, 4, 9}
+    assert max(len(p.body) for (s, p) in log if s == "client"
+               and p.header.stream != PROBE_STREAM) <= 48
+
+
+@pytest.mark.asyncio
+async def test_probe_timeout():
+    (client, server, _log) = link(timeout=0.05)
+    async with client, server:
+        # The server has no capacity to tell.
+        with pytest.raises(ConnectionFailedError):
+            await client.open_connection()
@@ -1,5 +1,5 @@
 """
-Almost TCP data structures: messages and packet decoder.
+Almost TCP data structures: messages, packet decoders, and packet encoder.
 
 Almost TCP is a protocol designed to tunnel data streams
 (specifically, HTTP requests) over a serial port.
@@ -14,16 +14,22 @@ All numeric fields are network-endian (big-endian).
 
 -   Connection-oriented: syn/synack/ack setup
 -   Single stream number, not two port numbers
-    -   Stream number probing to determine # of hardware resources available
+    -   Stream number probing to determine # of hardware resources available:
+        see ProbeResponder
+-   Flow control: each stream's receive buffer advertises its free space as
+    the window, on every header written back to the host
 
 """
 
-from amaranth import Module, Signal, unsigned, Const
+from amaranth import Module, Signal, unsigned, Const, Array
 from amaranth.lib.wiring import Component, In, Out, Signature
 from amaranth.lib import stream
 from amaranth.lib.data import UnionLayout, ArrayLayout, Struct
 from amaranth.lib.fifo import SyncFIFOBuffered
 
+import session
+from almost_tcp.message_host import PROBE_STREAM
+
 
 class FlagsLayout(Struct):
     """
@@ -244,6 +250,9 @@ class ReadPacketStop(Component):
                 with m.If(byte_counter == 4):
                     # Capture the length.
                     m.d.sync += remaining_len.eq(self.packet.header.length)
+        with m.Elif(remaining_len == 0):
+            # No body; the header is valid for just this cycle.
+            m.d.sync += byte_counter.eq(0)
         with m.Else():
             # Forward bytes around the bus,
             # and optionally to the local channel too.
@@ -259,3 +268,612 @@ class ReadPacketStop(Component):
                     m.d.sync += byte_counter.eq(0)
 
         return m
+
+
+class ReadPacketRoot(Component):
+    """
+    Root of a packet-reading bus, that steers each packet to its stream.
+
+    Unlike a chain of ReadPacketStops, where every stop buffers and forwards
+    every byte, the root decodes each header's stream once, and hands the
+    body straight to that stream's output. The latency to a stream doesn't
+    depend on how many streams there are, and backpressure from a stream
+    only stalls the bus while a packet for that stream is passing.
+
+    Packets for none of the streams are passed on, header and body,
+    to `outbus`: e.g. to a chain of ReadPacketStops for more streams.
+    Packets for the root's streams are not passed on.
+
+    Parameters
+    ----------
+    ids: list[int]
+        Stream IDs to steer to.
+
+    Attributes
+    -----------
+    inbus: In(Stream(8))
+        Input from the bus.
+    outbus: Out(Stream(8))
+        Packets for none of the streams.
+    packets: Out(PacketSignature).array(len(ids))
+        The currently-buffered packet, for each stream in `ids`.
+        All share the header; only the packet's stream sees it as valid.
+    """
+
+    def __init__(self, ids: list[int]):
+        if len(set(ids)) != len(ids):
+            raise ValueError("stream IDs must be distinct")
+        super().__init__({
+            "inbus": In(stream.Signature(8)),
+            "outbus": Out(stream.Signature(8)),
+            "packets": Out(PacketSignature()).array(len(ids)),
+        })
+        self._stream_ids = ids
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.outbus = outbus = SyncFIFOBuffered(width=8, depth=4)
+        m.d.comb += [
+            self.outbus.payload.eq(outbus.r_data),
+            self.outbus.valid.eq(outbus.r_rdy),
+            outbus.r_en.eq(self.outbus.ready),
+        ]
+
+        mixed_view = UnionLayout(
+            {
+                "bytes": ArrayLayout(unsigned(8), 10),
+                "header": HeaderLayout
+            })
+        network = Signal(HeaderLayout)
+        pun = mixed_view(network)
+        m.submodules.swizzle = swizzle = HeaderSwizzle()
+        m.d.comb += swizzle.inheader.eq(network)
+        header = swizzle.outheader
+
+        byte_counter = Signal(4)
+        remaining_len = Signal(16)
+
+        # The stream is decoded once, as its byte arrives.
+        which = Signal(range(len(self._stream_ids)))
+        matched = Signal(1)
+        selected = Signal(len(self._stream_ids))
+        stream_valid = Signal(1)
+        header_valid = Signal(1)
+        for (i, packet) in enumerate(self.packets):
+            m.d.comb += [
+                selected[i].eq(matched & (which == i)),
+                packet.header.eq(header),
+                packet.stream_valid.eq(stream_valid & selected[i]),
+                packet.header_valid.eq(header_valid & selected[i]),
+                packet.data.payload.eq(self.inbus.payload),
+            ]
+        data_ready = Array(packet.data.ready for packet in self.packets)[which]
+
+        with m.FSM():
+            with m.State("header"):
+                m.d.comb += [
+                    stream_valid.eq(byte_counter > 1),
+                    self.inbus.ready.eq(1),
+                ]
+                with m.If(self.inbus.valid):
+                    m.d.sync += [
+                        byte_counter.eq(byte_counter + 1),
+                        pun.bytes[byte_counter].eq(self.inbus.payload),
+                    ]
+                    with m.If(byte_counter == 1):
+                        m.d.sync += matched.eq(0)
+                        with m.Switch(self.inbus.payload):
+                            for (i, id) in enumerate(self._stream_ids):
+                                with m.Case(id):
+                                    m.d.sync += [
+                                        which.eq(i),
+                                        matched.eq(1),
+                                    ]
+                    with m.If(byte_counter == 4):
+                        # Capture the length.
+                        m.d.sync += remaining_len.eq(header.length)
+                    with m.If(byte_counter == 9):
+                        m.d.sync += byte_counter.eq(0)
+                        with m.If(matched):
+                            m.next = "body"
+                        with m.Else():
+                            m.next = "replay"
+            with m.State("body"):
+                m.d.comb += [
+                    stream_valid.eq(1),
+                    header_valid.eq(1),
+                ]
+                with m.If(remaining_len == 0):
+                    # No body; the header is valid for just this cycle.
+                    m.next = "header"
+                with m.Else():
+                    m.d.comb += self.inbus.ready.eq(data_ready)
+                    for (i, packet) in enumerate(self.packets):
+                        m.d.comb += packet.data.valid.eq(
+                            self.inbus.valid & selected[i])
+                    with m.If(self.inbus.valid & data_ready):
+                        m.d.sync += remaining_len.eq(remaining_len - 1)
+                        with m.If(remaining_len == 1):
+                            m.next = "header"
+            with m.State("replay"):
+                # Not for us: pass on the header we took...
+                m.d.comb += [
+                    outbus.w_data.eq(pun.bytes[byte_counter]),
+                    outbus.w_en.eq(1),
+                ]
+                with m.If(outbus.w_rdy):
+                    m.d.sync += byte_counter.eq(byte_counter + 1)
+                    with m.If(byte_counter == 9):
+                        m.d.sync += byte_counter.eq(0)
+                        with m.If(remaining_len == 0):
+                            m.next = "header"
+                        with m.Else():
+                            m.next = "forward"
+            with m.State("forward"):
+                # ...and its body.
+                m.d.comb += [
+                    outbus.w_data.eq(self.inbus.payload),
+                    outbus.w_en.eq(self.inbus.valid),
+                    self.inbus.ready.eq(outbus.w_rdy),
+                ]
+                with m.If(self.inbus.valid & outbus.w_rdy):
+                    m.d.sync += remaining_len.eq(remaining_len - 1)
+                    with m.If(remaining_len == 1):
+                        m.next = "header"
+
+        return m
+
+
+class WritePacketStop(Component):
+    """
+    Stop on a packet-writing bus.
+
+    Each stream should have a stop on the same bus, chained by their "inbus"
+    and "outbus" connections, with the last stop's "outbus" going to the
+    host. A stop forwards the packets written by the stops before it, and
+    writes its own packets between them: the bus only changes hands at packet
+    boundaries. When both are waiting, the stop alternates between
+    forwarding a packet and writing its own.
+
+    A packet is offered on the "packet" interface: the stop captures the
+    header once `header_valid` is high and it's `done` with any previous
+    packet, then writes the header (in network order) and `header.length`
+    bytes of body from the `data` stream. `header_valid` must fall between
+    packets; a packet with no body must hold it until the stop is `done`.
+    A Packetizer offers a session's data this way.
+
+    Parameters
+    ----------
+    id: int
+        Stream ID for this stop.
+        Packets written from this stop are for this stream, whatever the
+        stream field of the header they are offered with.
+    advertise: bool
+        If true, the `window` and `ack` inputs replace the header's fields
+        (and set its ack flag): their values as the header starts to be
+        written are advertised, e.g. from a ReceiveBuffer.
+
+    Attributes
+    -----------
+    inbus: In(Stream(8))
+        Packets from the previous stop on the bus.
+    outbus: Out(Stream(8))
+        Output to the next stop on the bus.
+    packet: In(PacketSignature)
+        The packet to write.
+    done: Out(1)
+        High when no packet is waiting to be written.
+    window: In(16)
+    ack:    In(16)
+        Receive window and acknowledgement number to advertise,
+        if `advertise` is set.
+    """
+
+    def __init__(self, id: int, advertise: bool = False):
+        ports = {
+            "inbus": In(stream.Signature(8)),
+            "outbus": Out(stream.Signature(8)),
+            "packet": In(PacketSignature()),
+            "done": Out(1),
+        }
+        if advertise:
+            ports.update({
+                "window": In(16),
+                "ack": In(16),
+            })
+        super().__init__(ports)
+        self._stream_id = id
+        self._advertise = advertise
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # As with ReadPacketStop, a FIFO on the output,
+        # in the hope of avoiding long combinational paths.
+        m.submodules.outbus = outbus = SyncFIFOBuffered(width=8, depth=4)
+        m.d.comb += [
+            self.outbus.payload.eq(outbus.r_data),
+            self.outbus.valid.eq(outbus.r_rdy),
+            outbus.r_en.eq(self.outbus.ready),
+        ]
+
+        # Capture the header once it's valid and we're done with the last one;
+        # but only once per packet, i.e. until header_valid falls.
+        pending = Signal(1)
+        captured = Signal(1)
+        header = Signal(HeaderLayout)
+        with m.If(~self.packet.header_valid):
+            m.d.sync += captured.eq(0)
+        with m.Elif(~captured & ~pending):
+            m.d.sync += [
+                captured.eq(1),
+                pending.eq(1),
+                header.eq(self.packet.header),
+                header.stream.eq(self._stream_id),
+            ]
+        m.d.comb += self.done.eq(~pending)
+
+        mixed_view = UnionLayout(
+            {
+                "bytes": ArrayLayout(unsigned(8), 10),
+                "header": HeaderLayout
+            })
+        network = Signal(HeaderLayout)
+        pun = mixed_view(network)
+        m.submodules.swizzle = swizzle = HeaderSwizzle()
+        m.d.comb += [swizzle.inheader.eq(header),
+                     network.eq(swizzle.outheader)]
+
+        byte_counter = Signal(4)
+        remaining_len = Signal(16)
+        # Forward a packet from the bus before writing another of our own.
+        forward_next = Signal(1)
+
+        def forward():
+            # Transfer a byte from the input bus.
+            m.d.comb += [
+                outbus.w_data.eq(self.inbus.payload),
+                outbus.w_en.eq(self.inbus.valid),
+                self.inbus.ready.eq(outbus.w_rdy),
+            ]
+            return self.inbus.valid & outbus.w_rdy
+
+        with m.FSM():
+            with m.State("idle"):
+                m.d.sync += byte_counter.eq(0)
+                with m.If(pending & ~(forward_next & self.inbus.valid)):
+                    m.next = "write_header"
+                    if self._advertise:
+                        m.d.sync += [
+                            header.window.eq(self.window),
+                            header.ack.eq(self.ack),
+                            header.flags.ack.eq(1),
+                        ]
+                with m.Elif(self.inbus.valid):
+                    m.next = "forward_header"
+            with m.State("write_header"):
+                m.d.comb += [
+                    outbus.w_data.eq(pun.bytes[byte_counter]),
+                    outbus.w_en.eq(1),
+                ]
+                with m.If(outbus.w_rdy):
+                    m.d.sync += byte_counter.eq(byte_counter + 1)
+                    with m.If(byte_counter == 9):
+                        m.d.sync += remaining_len.eq(header.length)
+                        with m.If(header.length == 0):
+                            m.d.sync += [
+                                pending.eq(0),
+                                forward_next.eq(1),
+                            ]
+                            m.next = "idle"
+                        with m.Else():
+                            m.next = "write_body"
+            with m.State("write_body"):
+                m.d.comb += [
+                    outbus.w_data.eq(self.packet.data.payload),
+                    outbus.w_en.eq(self.packet.data.valid),
+                    self.packet.data.ready.eq(outbus.w_rdy),
+                ]
+                with m.If(self.packet.data.valid & outbus.w_rdy):
+                    m.d.sync += remaining_len.eq(remaining_len - 1)
+                    with m.If(remaining_len == 1):
+                        m.d.sync += [
+                            pending.eq(0),
+                            forward_next.eq(1),
+                        ]
+                        m.next = "idle"
+            with m.State("forward_header"):
+                with m.If(forward()):
+                    m.d.sync += byte_counter.eq(byte_counter + 1)
+                    # Length is network-order, i.e. big-endian.
+                    with m.If(byte_counter == 2):
+                        m.d.sync += remaining_len[8:16].eq(self.inbus.payload)
+                    with m.If(byte_counter == 3):
+                        m.d.sync += remaining_len[0:8].eq(self.inbus.payload)
+                    with m.If(byte_counter == 9):
+                        m.d.sync += forward_next.eq(0)
+                        with m.If(remaining_len == 0):
+                            m.next = "idle"
+                        with m.Else():
+                            m.next = "forward_body"
+            with m.State("forward_body"):
+                with m.If(forward()):
+                    m.d.sync += remaining_len.eq(remaining_len - 1)
+                    with m.If(remaining_len == 1):
+                        m.next = "idle"
+
+        return m
+
+
+class Packetizer(Component):
+    """
+    Cuts a session's data into packets, for a WritePacketStop.
+
+    A session's data is a stream of unknown length; a WritePacketStop needs
+    the length of each packet before it writes its header. The packetizer
+    buffers up to `max_length` bytes, and offers them as a packet once:
+    - the buffer is full;
+    - no byte has arrived for `idle_cycles` cycles, so as not to hold back
+      a partial packet; or
+    - the session has ended. The last packet of a session has the fin flag
+      set, and may have no body.
+
+    Sequence numbers count from the `seq` input as the session starts.
+    The stop's stream ID, and window and ack if it advertises them,
+    fill in the rest of the header.
+
+    Parameters
+    ----------
+    max_length: int
+        Most bytes of body in a packet; and bytes of buffer.
+    idle_cycles: int
+        Cycles without input after which a partial packet is sent.
+
+    Attributes
+    ----------
+    session: In(SessionSignature)
+        The data to send.
+    seq:     In(16)
+        Sequence number of the first byte of the session.
+    packet:  Out(PacketSignature)
+        To a WritePacketStop.
+    done:    In(1)
+        The WritePacketStop's `done`.
+    """
+
+    session: In(session.SessionSignature())
+    seq: In(16)
+    packet: Out(PacketSignature())
+    done: In(1)
+
+    def __init__(self, max_length: int = 256, idle_cycles: int = 16):
+        if max_length < 1 or max_length >= 2**16:
+            raise ValueError("max_length must fit in a 16-bit length")
+        super().__init__()
+        self._max_length = max_length
+        self._idle_cycles = idle_cycles
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.buffer = buffer = SyncFIFOBuffered(
+            width=8, depth=self._max_length)
+        m.d.comb += [
+            buffer.w_data.eq(self.session.data.payload),
+            buffer.w_en.eq(self.session.data.valid),
+            self.session.data.ready.eq(buffer.w_rdy),
+        ]
+
+        # Cycles since the last byte arrived:
+        idle = Signal(range(self._idle_cycles + 1))
+        with m.If(self.session.data.valid & buffer.w_rdy):
+            m.d.sync += idle.eq(0)
+        with m.Elif(idle < self._idle_cycles):
+            m.d.sync += idle.eq(idle + 1)
+
+        seq = Signal(16)
+        header = self.packet.header
+        remaining = Signal(16)
+
+        with m.FSM():
+            with m.State("closed"):
+                with m.If(self.session.active):
+                    m.d.sync += seq.eq(self.seq)
+                    m.next = "open"
+            with m.State("open"):
+                ended = ~self.session.active & ~self.session.data.valid
+                full = buffer.level == self._max_length
+                flush = (buffer.level != 0) & (idle == self._idle_cycles)
+                with m.If(self.done & (ended | full | flush)):
+                    m.d.sync += [
+                        header.eq(0),
+                        header.flags.fin.eq(ended),
+                        header.length.eq(buffer.level),
+                        header.seq.eq(seq),
+                        remaining.eq(buffer.level),
+                        seq.eq(seq + buffer.level),
+                    ]
+                    m.next = "offer"
+            with m.State("offer"):
+                # Until the stop takes the header:
+                m.d.comb += self.packet.header_valid.eq(1)
+                with m.If(~self.done):
+                    m.next = "body"
+            with m.State("body"):
+                m.d.comb += [
+                    self.packet.header_valid.eq(1),
+                    self.packet.data.payload.eq(buffer.r_data),
+                    self.packet.data.valid.eq(buffer.r_rdy & (remaining != 0)),
+                    buffer.r_en.eq(self.packet.data.ready & (remaining != 0)),
+                ]
+                with m.If(self.packet.data.valid & self.packet.data.ready):
+                    m.d.sync += remaining.eq(remaining - 1)
+                # Until the stop has written the packet:
+                with m.If((remaining == 0) & self.done):
+                    with m.If(header.flags.fin):
+                        m.next = "closed"
+                    with m.Else():
+                        m.next = "open"
+
+        return m
+
+
+class ReceiveBuffer(Component):
+    """
+    Receive buffer for a stream.
+
+    Buffers the body of the packets read for a stream (e.g. by a
+    ReadPacketStop), and tracks what to advertise to the sender (e.g. via a
+    WritePacketStop): the next sequence number it expects, and how much more
+    it can accept. If the sender keeps within the window, the buffer never
+    fills, so the stream never stalls the bus.
+
+    Packets are assumed to arrive in order; each packet's sequence number
+    sets the acknowledgement number, which counts its body (and syn and fin
+    flags) from there.
+
+    Parameters
+    ----------
+    depth: int
+        Bytes of buffer.
+
+    Attributes
+    ----------
+    packet: In(PacketSignature)
+        Packets read for this stream.
+    data:   Out(Stream(8))
+        Buffered body data.
+    window: Out(16)
+        Free space in the buffer.
+    ack:    Out(16)
+        Sequence number of the next byte expected.
+    """
+
+    packet: In(PacketSignature())
+    data: Out(stream.Signature(8))
+    window: Out(16)
+    ack: Out(16)
+
+    def __init__(self, depth: int):
+        if depth >= 2**16:
+            raise ValueError("depth must fit in a 16-bit window")
+        super().__init__()
+        self._depth = depth
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.buffer = buffer = SyncFIFOBuffered(
+            width=8, depth=self._depth)
+        m.d.comb += [
+            buffer.w_data.eq(self.packet.data.payload),
+            buffer.w_en.eq(self.packet.data.valid),
+            self.packet.data.ready.eq(buffer.w_rdy),
+            self.data.payload.eq(buffer.r_data),
+            self.data.valid.eq(buffer.r_rdy),
+            buffer.r_en.eq(self.data.ready),
+            self.window.eq(self._depth - buffer.level),
+        ]
+
+        received = Signal(1)
+        m.d.comb += received.eq(self.packet.data.valid & buffer.w_rdy)
+
+        # The fin flag counts once the body has been received.
+        last_header_valid = Signal(1)
+        fin = Signal(1)
+        m.d.sync += last_header_valid.eq(self.packet.header_valid)
+        with m.If(self.packet.header_valid & ~last_header_valid):
+            header = self.packet.header
+            m.d.sync += [
+                self.ack.eq(header.seq + header.flags.syn + received),
+                fin.eq(header.flags.fin),
+            ]
+        with m.Elif(~self.packet.header_valid & last_header_valid):
+            m.d.sync += self.ack.eq(self.ack + fin)
+        with m.Else():
+            m.d.sync += self.ack.eq(self.ack + received)
+
+        return m
+
+
+class ProbeResponder(Component):
+    """
+    Answers capacity probes: tells the host which streams this device has,
+    and how much each can buffer.
+
+    A probe is any packet for PROBE_STREAM; so the responder should be
+    between a reader for that stream (e.g. a ReadPacketStop) and a
+    WritePacketStop for it. Each probe is answered with a synack, whose body
+    is the capacity: the buffer per stream (16 bits), the number of streams
+    (8 bits), then their IDs.
+
+    Parameters
+    ----------
+    stream_ids: list[int]
+        IDs of the streams this device has engines for.
+    window: int
+        Receive buffer per stream, e.g. the depth of its ReceiveBuffer.
+
+    Attributes
+    ----------
+    request: In(PacketSignature)
+        Probes.
+    response: Out(PacketSignature)
+        Answers.
+    """
+
+    request: In(PacketSignature())
+    response: Out(PacketSignature())
+
+    def __init__(self, stream_ids: list[int], window: int):
+        if PROBE_STREAM in stream_ids:
+            raise ValueError(f"stream {PROBE_STREAM} is reserved for probes")
+        super().__init__()
+        self._body = [window >> 8, window & 0xFF, len(stream_ids)] + stream_ids
+        self._window = window
+
+    def elaborate(self, platform):
+        m = Module()
+
+        body = Array(Const(b, 8) for b in self._body)
+        idx = Signal(range(len(self._body) + 1))
+        # Acknowledges the probe's syn:
+        ack = Signal(16)
+
+        header = self.response.header
+        m.d.comb += [
+            header.flags.syn.eq(1),
+            header.flags.ack.eq(1),
+            header.stream.eq(PROBE_STREAM),
+            header.length.eq(len(self._body)),
+            header.window.eq(self._window),
+            header.seq.eq(0),
+            header.ack.eq(ack),
+            self.response.data.payload.eq(body[idx]),
+            # Probes have no meaningful body.
+            self.request.data.ready.eq(1),
+        ]
+
+        last_valid = Signal(1)
+        m.d.sync += last_valid.eq(self.request.header_valid)
+
+        with m.FSM():
+            with m.State("idle"):
+                m.d.sync += idx.eq(0)
+                with m.If(self.request.header_valid & ~last_valid):
+                    m.d.sync += ack.eq(self.request.header.seq + 1)
+                    m.next = "respond"
+            with m.State("respond"):
+                m.d.comb += [
+                    self.response.stream_valid.eq(1),
+                    self.response.header_valid.eq(1),
+                    self.response.data.valid.eq(1),
+                ]
+                with m.If(self.response.data.ready):
+                    m.d.sync += idx.eq(idx + 1)
+                    with m.If(idx == len(self._body) - 1):
+                        # Idle for a cycle, to end the packet.
+                        m.next = "idle"
+
+        return m
@@ -3,7 +3,6 @@ Host-side implementation of the Almost TCP protocol.
 """
 
 from dataclasses import dataclass
-import itertools
 import struct
 
 
@@ -13,7 +12,7 @@ class NotEnoughDataError(Exception):
     """
 
     def __init__(self, message=""):
-        if self.message:
+        if message:
             self.add_note(message)
 
 
@@ -23,7 +22,7 @@ class ConnectionFailedError(Exception):
     """
 
     def __init__(self, message=""):
-        if self.message:
+        if message:
             self.add_note(message)
 
 
@@ -33,10 +32,19 @@ class AlreadyFinishedError(Exception):
     """
 
     def __init__(self, message=""):
-        if self.message:
+        if message:
             self.add_note(message)
 
 
+# Flag fields, from the least significant bit.
+_FLAG_FIELDS = ("fin", "syn", "rst", "psh", "ack", "urg", "ecn", "cwr")
+# Field values of each flags byte:
+_FLAG_TABLE = [
+    tuple(((z >> i) & 1) == 1 for i in range(len(_FLAG_FIELDS)))
+    for z in range(256)
+]
+
+
 @dataclass
 class Flags:
     """
@@ -51,27 +59,15 @@ class Flags:
     ecn: bool = False
     cwr: bool = False
 
-    def encode(self):
-        x = 0
-        for (i, v) in itertools.zip_longest(range(0, 8), [
-                self.fin, self.syn, self.rst, self.psh,
-                self.ack, self.urg, self.ecn, self.cwr]):
-            x |= v << i
+    def __int__(self):
+        return (self.fin | self.syn << 1 | self.rst << 2 | self.psh << 3 |
+                self.ack << 4 | self.urg << 5 | self.ecn << 6 | self.cwr << 7)
 
-        return bytes([x])
+    def encode(self):
+        return bytes((int(self),))
 
     def decode(buffer):
-        z = buffer[0]
-        x = Flags()
-        x.fin = ((z >> 0) & 1) == 1
-        x.syn = ((z >> 1) & 1) == 1
-        x.rst = ((z >> 2) & 1) == 1
-        x.psh = ((z >> 3) & 1) == 1
-        x.ack = ((z >> 4) & 1) == 1
-        x.urg = ((z >> 5) & 1) == 1
-        x.ecn = ((z >> 6) & 1) == 1
-        x.cwr = ((z >> 7) & 1) == 1
-        return x
+        return Flags(*_FLAG_TABLE[buffer[0]])
 
 
 @dataclass
@@ -82,7 +78,9 @@ class Header:
 
     # Number of bytes in the header.
     BYTES = 10
-    FORMAT = "!BHHHH"
+    # Flags, stream, length, window, seq, ack:
+    FORMAT = "!BBHHHH"
+    STRUCT = struct.Struct(FORMAT)
 
     flags: Flags
     stream: int
@@ -95,18 +93,18 @@ class Header:
         return Header.BYTES
 
     def encode(self):
-        return self.flags.encode() + struct.pack(
-            Header.FORMAT,
+        return Header.STRUCT.pack(
+            int(self.flags),
             self.stream, self.length, self.window, self.seq, self.ack)
 
-    def decode(buffer):
-        if len(buffer) < Header.BYTES:
+    def decode(buffer, offset: int = 0):
+        if len(buffer) - offset < Header.BYTES:
             raise NotEnoughDataError(
-                f"not enough bytes for header: {len(buffer)} < 10")
-        flags = Flags.decode(buffer)
-        (stream, length, window, seq, ack) = struct.unpack(
-            Header.FORMAT, buffer[1:])
-        return Header(flags, stream, length, window, seq, ack)
+                f"not enough bytes for header: {len(buffer) - offset} < 10")
+        (flags, stream, length, window, seq, ack) = Header.STRUCT.unpack_from(
+            buffer, offset)
+        return Header(Flags(*_FLAG_TABLE[flags]),
+                      stream, length, window, seq, ack)
 
 
 @dataclass
@@ -122,13 +120,191 @@ class Packet:
 
     def decode(buffer):
         header = Header.decode(buffer)
-        tail = buffer[Header.BYTES:]
-        if len(tail) < header.length:
+        end = Header.BYTES + header.length
+        if len(buffer) < end:
             raise NotEnoughDataError(
-                f"not enough bytes for body: {len(tail)} < {header.length}")
-        body = tail[:header.length]
-
-        return Packet(header, body)
+                "not enough bytes for body: "
+                f"{len(buffer) - Header.BYTES} < {header.length}")
+        return Packet(header, bytes(buffer[Header.BYTES:end]))
 
     def encode(self):
         return self.header.encode() + self.body
+
+
+def decode_many(buffer) -> tuple[list[Packet], int]:
+    """
+    Decode the whole packets at the start of a buffer.
+
+    Unlike Packet.decode, a partial packet at the end isn't an error: it is
+    left for the next call, once more data has arrived.
+
+    Parameters
+    ----------
+    buffer: bytes-like
+            Received data.
+
+    Returns
+    -------
+    (packets, consumed): the packets decoded, and the number of bytes they
+    took from the start of the buffer.
+    """
+    unpack_from = Header.STRUCT.unpack_from
+    packets = []
+    offset = 0
+    # Release the view before returning, so a bytearray can be resized.
+    with memoryview(buffer) as view:
+        end = len(view)
+        while end - offset >= Header.BYTES:
+            (flags, stream, length, window, seq, ack) = unpack_from(
+                view, offset)
+            body_end = offset + Header.BYTES + length
+            if body_end > end:
+                break
+            packets.append(Packet(
+                Header(Flags(*_FLAG_TABLE[flags]),
+                       stream, length, window, seq, ack),
+                view[offset + Header.BYTES:body_end].tobytes()))
+            offset = body_end
+    return (packets, offset)
+
+
+# Stream ID reserved for capacity probes.
+PROBE_STREAM = 255
+
+
+@dataclass
+class Capacity:
+    """
+    What a device has: its stream engines, and their buffers.
+
+    A probe is a syn for PROBE_STREAM. The device answers with a synack,
+    whose body is the capacity: the receive buffer per stream, then the
+    stream IDs it has engines for.
+    """
+
+    FORMAT = "!HB"
+    STRUCT = struct.Struct(FORMAT)
+
+    stream_ids: list[int]
+    window: int
+
+    def encode(self):
+        return Capacity.STRUCT.pack(
+            self.window, len(self.stream_ids)) + bytes(self.stream_ids)
+
+    def decode(buffer):
+        if len(buffer) < Capacity.STRUCT.size:
+            raise NotEnoughDataError(
+                f"not enough bytes for capacity: {len(buffer)} < 3")
+        (window, count) = Capacity.STRUCT.unpack_from(buffer)
+        ids = buffer[Capacity.STRUCT.size:Capacity.STRUCT.size + count]
+        if len(ids) < count:
+            raise NotEnoughDataError(
+                f"not enough stream IDs for capacity: {len(ids)} < {count}")
+        return Capacity(list(ids), window)
+
+    def probe():
+        """
+        Packet to probe a device's capacity.
+        """
+        return Packet(Header(Flags(syn=True), PROBE_STREAM), bytes())
+
+    def response(self):
+        """
+        Packet to answer a probe.
+        """
+        body = self.encode()
+        return Packet(Header(Flags(syn=True, ack=True), PROBE_STREAM,
+                             length=len(body), window=self.window), body)
+
+
+class WindowedSender:
+    """
+    Host-side sender for a stream, that keeps within the receive window
+    the device advertises.
+
+    Data written to the sender is cut into packets as the window allows:
+    the data sent but not yet acknowledged never exceeds the window from the
+    latest acknowledgement. So the sender can keep the link full, with
+    packets back-to-back, without overrunning the device's receive buffer.
+
+    Sequence numbers are 16 bits, and wrap.
+
+    Parameters
+    ----------
+    stream:     int
+                Stream ID to send on.
+    seq:        int
+                Sequence number of the first byte to send.
+    max_length: int
+                Maximum body length of a packet.
+    """
+
+    SEQ_MOD = 1 << 16
+
+    def __init__(self, stream: int, seq: int = 0, max_length: int = 256):
+        self.stream = stream
+        # Next sequence number to send:
+        self.seq = seq
+        # Latest acknowledgement and window from the device.
+        # Until the device advertises a window, nothing can be sent.
+        self.acked = seq
+        self.window = 0
+        self.max_length = max_length
+        self._pending = bytearray()
+
+    def write(self, data: bytes):
+        """
+        Queue data to send.
+        """
+        self._pending += data
+
+    def pending(self) -> int:
+        """
+        Bytes written, but not yet sent.
+        """
+        return len(self._pending)
+
+    def in_flight(self) -> int:
+        """
+        Bytes sent, but not yet acknowledged.
+        """
+        return (self.seq - self.acked) % self.SEQ_MOD
+
+    def available(self) -> int:
+        """
+        Bytes that can be sent now, within the window.
+        """
+        return max(0, self.window - self.in_flight())
+
+    def receive(self, header: Header):
+        """
+        Update the window from a header received from the device.
+
+        Headers for other streams, or without an acknowledgement, are ignored.
+        """
+        if header.stream != self.stream or not header.flags.ack:
+            return
+        # Only move forwards; stale acknowledgements can't grow the window.
+        advance = (header.ack - self.acked) % self.SEQ_MOD
+        if advance > self.in_flight():
+            return
+        self.acked = header.ack
+        self.window = header.window
+
+    def packets(self) -> list[Packet]:
+        """
+        Packets of pending data, as much as the window allows.
+        """
+        packets = []
+        while self._pending:
+            length = min(len(self._pending), self.available(), self.max_length)
+            if length == 0:
+                break
+            body = bytes(self._pending[:length])
+            del self._pending[:length]
+            packets.append(Packet(
+                Header(Flags(), self.stream, length=length, seq=self.seq),
+                body))
+            self.seq = (self.seq + length) % self.SEQ_MOD
+        return packets
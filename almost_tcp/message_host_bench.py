@@ -0,0 +1,90 @@
+"""
+Benchmark of the host-side ATCP codec.
+
+Encodes a run of packets, then decodes them as they would arrive from a
+serial port: in chunks, so packets straddle reads. Reports packets per
+second for each.
+
+    python -m almost_tcp.message_host_bench
+"""
+
+import time
+
+from almost_tcp.message_host import (
+    Flags, Header, Packet, NotEnoughDataError, decode_many)
+
+
+def packets(count: int) -> list[Packet]:
+    return [
+        Packet(Header(Flags(ack=True, psh=(i % 3 == 0)), stream=i % 16,
+                      length=i % 64, window=4096, seq=i, ack=2 * i),
+               body=bytes(i % 64))
+        for i in range(count)
+    ]
+
+
+def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def encode(packets: list[Packet]) -> bytes:
+    return b"".join(p.encode() for p in packets)
+
+
+def decode_each(data: bytes, chunk: int) -> int:
+    """
+    One packet at a time, with Packet.decode.
+    """
+    count = 0
+    buffer = bytes()
+    for c in chunks(data, chunk):
+        buffer += c
+        while True:
+            try:
+                packet = Packet.decode(buffer)
+            except NotEnoughDataError:
+                break
+            buffer = buffer[len(packet):]
+            count += 1
+    return count
+
+
+def decode_batched(data: bytes, chunk: int) -> int:
+    """
+    Everything available at once, with decode_many.
+    """
+    count = 0
+    buffer = bytearray()
+    for c in chunks(data, chunk):
+        buffer += c
+        (decoded, consumed) = decode_many(buffer)
+        del buffer[:consumed]
+        count += len(decoded)
+    return count
+
+
+def rate(f, count: int, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def main(count: int = 20000, chunk: int = 4096):
+    ps = packets(count)
+    data = encode(ps)
+    assert decode_each(data, chunk) == count
+    assert decode_batched(data, chunk) == count
+
+    print(f"{count} packets, {len(data)} bytes, {chunk}-byte reads")
+    print(f"encode:         {rate(lambda: encode(ps), count):>12,.0f} packets/s")
+    print(f"Packet.decode:  {rate(lambda: decode_each(data, chunk), count):>12,.0f} packets/s")
+    print(f"decode_many:    {rate(lambda: decode_batched(data, chunk), count):>12,.0f} packets/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@
 Host-side tests for ATCP messages.
 """
 
-from message_host import Flags, Header
+import itertools
+
+from message_host import (
+    Flags, Header, Packet, WindowedSender, decode_many, Capacity, PROBE_STREAM)
 
 
 def test_make_flags():
@@ -23,3 +26,78 @@ def test_decode_header():
     assert not header.flags.fin
     assert header.stream == 0x98
     assert header.length == 0x0102
+
+
+def test_windowed_sender():
+    sender = WindowedSender(stream=2, seq=0xFFF0, max_length=16)
+    sender.write(bytes(range(100)))
+    # No window yet:
+    assert sender.packets() == []
+
+    sender.receive(Header(Flags(ack=True), stream=2, window=40, ack=0xFFF0))
+    packets = sender.packets()
+    assert [p.header.length for p in packets] == [16, 16, 8]
+    assert [p.header.seq for p in packets] == [0xFFF0, 0x0000, 0x0010]
+    assert b"".join(p.body for p in packets) == bytes(range(40))
+    assert sender.available() == 0
+    assert sender.packets() == []
+
+    # Other streams, and headers without an ack, are ignored:
+    sender.receive(Header(Flags(ack=True), stream=3, window=100, ack=0x0018))
+    sender.receive(Header(Flags(), stream=2, window=100, ack=0x0018))
+    assert sender.available() == 0
+
+    # The window is from the acknowledged data:
+    sender.receive(Header(Flags(ack=True), stream=2, window=20, ack=0x0008))
+    assert sender.in_flight() == 16
+    assert sender.available() == 4
+    # A stale acknowledgement doesn't move it back:
+    sender.receive(Header(Flags(ack=True), stream=2, window=40, ack=0xFFF0))
+    assert sender.available() == 4
+
+    packets = sender.packets()
+    assert [p.header.length for p in packets] == [4]
+    assert sender.pending() == 56
+
+
+def test_flags_round_trip():
+    for z in range(256):
+        assert Flags.decode(bytes([z])).encode() == bytes([z])
+
+
+def test_decode_many():
+    packets = [
+        Packet(Header(Flags(syn=True), stream=1, seq=7), body=bytes()),
+        Packet(Header(Flags(ack=True), stream=2, length=5, window=300,
+                      seq=8, ack=0xFFFF), body=b"hello"),
+        Packet(Header(Flags(fin=True, cwr=True), stream=255, length=3),
+               body=b"bye"),
+    ]
+    data = b"".join(p.encode() for p in packets)
+    assert Packet.decode(data).encode() == packets[0].encode()
+
+    # Fed a byte at a time, each packet is decoded once it's whole.
+    ends = list(itertools.accumulate(len(p) for p in packets))
+    buffer = bytearray()
+    decoded = []
+    for i in range(len(data)):
+        buffer += data[i:i+1]
+        (more, consumed) = decode_many(buffer)
+        del buffer[:consumed]
+        decoded += more
+        assert len(decoded) == sum(end <= i + 1 for end in ends)
+    assert buffer == bytearray()
+    assert decoded == packets
+
+    (decoded, consumed) = decode_many(data + data[:8])
+    assert decoded == packets
+    assert consumed == len(data)
+
+
+def test_capacity():
+    capacity = Capacity(stream_ids=[1, 2, 3, 200], window=1024)
+    assert Capacity.decode(capacity.encode()) == capacity
+    response = Packet.decode(capacity.response().encode())
+    assert response.header.stream == PROBE_STREAM
+    assert response.header.flags.syn and response.header.flags.ack
+    assert Capacity.decode(response.body) == capacity
@@ -200,11 +200,9 @@ class MultiPacketSender:
 
                 # Spend at least once cycle with header !valid
                 # before moving to the next example.
-                async for _clk_edge, _rst_value, _ready in (
-                        ctx.tick().sample(iface.data.ready)):
-                    pass
+                await ctx.tick()
 
-                self.done = True
+            self.done = True
 
         return sender
 
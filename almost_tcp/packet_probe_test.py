@@ -0,0 +1,69 @@
+from amaranth import Module
+from amaranth.lib import stream, wiring
+from amaranth.lib.wiring import Component, In, Out, connect
+from amaranth.sim import Simulator
+
+from message_hdl import (
+    ReadPacketStop, WritePacketStop, ProbeResponder, PROBE_STREAM)
+from message_host import Header, Packet, Flags, Capacity, decode_many
+from packet_fixtures import StreamCollector, MultiPacketSender
+
+
+class ProbeBus(Component):
+    """
+    A bus with just a probe responder on it.
+    """
+
+    inbus: In(stream.Signature(8))
+    outbus: Out(stream.Signature(8))
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.reader = reader = ReadPacketStop(id=PROBE_STREAM)
+        m.submodules.responder = responder = ProbeResponder(
+            stream_ids=[1, 2, 7], window=512)
+        m.submodules.writer = writer = WritePacketStop(id=PROBE_STREAM)
+        connect(m, wiring.flipped(self.inbus), reader.inbus)
+        connect(m, reader.outbus, writer.inbus)
+        connect(m, writer.outbus, wiring.flipped(self.outbus))
+        connect(m, reader.packet, responder.request)
+        connect(m, responder.response, writer.packet)
+
+        return m
+
+
+def test_probe():
+    dut = ProbeBus()
+
+    sim = Simulator(dut)
+    sender = MultiPacketSender(random_delay=True, stream=dut.inbus)
+    collector = StreamCollector(random_backpressure=True, stream=dut.outbus)
+
+    other = Packet(Header(Flags(), stream=2, length=3, seq=9), body=b"abc")
+    probe = Packet(Header(Flags(syn=True), stream=PROBE_STREAM, seq=41),
+                   body=bytes())
+    sent = [other, probe, other, probe]
+    capacity = Capacity(stream_ids=[1, 2, 7], window=512)
+    answer = capacity.response()
+    answer.header.ack = 42
+    want_len = sum(len(p) for p in sent) + 2 * len(answer)
+
+    async def driver(ctx):
+        while len(collector) < want_len:
+            await ctx.tick()
+
+    sim.add_clock(1e-6)
+    sim.add_process(sender.send(sent))
+    sim.add_process(collector.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    (got, consumed) = decode_many(collector.body)
+    assert consumed == want_len
+    answers = [p for p in got if p.header.flags.ack]
+    assert [p.encode() for p in answers] == [answer.encode()] * 2
+    assert Capacity.decode(answers[0].body) == capacity
+    # Everything else passes by.
+    assert [p.encode() for p in got if not p.header.flags.ack] == [
+        p.encode() for p in sent]
@@ -1,8 +1,16 @@
+from amaranth import Module
+from amaranth.lib import stream, wiring
+from amaranth.lib.wiring import Component, In, Out, connect
 from amaranth.sim import Simulator
 
-from message_hdl import ReadPacketStop
-from message_host import Header, Packet, Flags
-from packet_fixtures import StreamCollector, PacketSender
+from message_hdl import (
+    ReadPacketStop, WritePacketStop, ReceiveBuffer, PacketSignature,
+    Packetizer)
+from message_host import Header, Packet, Flags, WindowedSender
+from packet_fixtures import (
+    StreamCollector, PacketCollector, PacketSender, MultiPacketSender)
+from session import SessionSignature
+from stream_fixtures import StreamSender
 
 
 def test_packet_stops():
@@ -78,3 +86,315 @@ def test_packet_stops():
     sim.add_testbench(bench(dut, body_collector, packets_collector, p))
 
     sim.run_until(0.0001)
+
+
+def decode_all(data: bytes) -> list[Packet]:
+    """
+    Decode a byte stream into packets, with the host-side codec.
+    """
+    packets = []
+    while len(data) > 0:
+        packet = Packet.decode(data)
+        packets.append(packet)
+        data = data[len(packet):]
+    return packets
+
+
+def test_write_packet_stop():
+    dut = WritePacketStop(id=3)
+
+    packets = [
+        Packet(Header(Flags(syn=True), stream=3, window=1024, seq=100),
+               body=bytes()),
+        Packet(Header(Flags(ack=True, psh=True), stream=3, length=5,
+                      window=770, seq=101, ack=12290),
+               body=b"hello"),
+        # A jumbo packet; more than Not TCP's 255-byte limit.
+        Packet(Header(Flags(ack=True), stream=3, length=1000,
+                      window=0xFFFF, seq=106, ack=0x8001),
+               body=bytes(i % 251 for i in range(1000))),
+        Packet(Header(Flags(fin=True, ack=True), stream=3,
+                      seq=1106, ack=0x8001),
+               body=bytes()),
+    ]
+
+    sim = Simulator(dut)
+    sender = MultiPacketSender(random_delay=True, packet=dut.packet)
+    collector = StreamCollector(random_backpressure=True, stream=dut.outbus)
+
+    want = b"".join(p.encode() for p in packets)
+
+    async def driver(ctx):
+        while not sender.done or not ctx.get(dut.done):
+            await ctx.tick()
+        # Flush the output buffer:
+        while len(collector) < len(want):
+            await ctx.tick()
+
+    sim.add_clock(1e-6)
+    sim.add_process(sender.send(packets))
+    sim.add_process(collector.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    collector.assert_eq(want)
+    assert [p.encode() for p in decode_all(collector.body)] == [
+        p.encode() for p in packets]
+
+
+def test_write_read_round_trip():
+    """
+    Packets written by a WritePacketStop are read by a ReadPacketStop.
+    """
+
+    class WriteRead(Component):
+        packet_in: In(PacketSignature())
+        packet_out: Out(PacketSignature())
+
+        def elaborate(self, platform):
+            m = Module()
+            m.submodules.writer = writer = WritePacketStop(id=5)
+            m.submodules.reader = reader = ReadPacketStop(id=5)
+            connect(m, writer.outbus, reader.inbus)
+            m.d.comb += reader.outbus.ready.eq(1)
+            self.packet_in = writer.packet
+            self.packet_out = reader.packet
+            return m
+
+    dut = WriteRead()
+    data = bytes(i % 256 for i in range(0, 300))
+    p = Packet(
+        Header(Flags(ack=True), stream=5, length=len(data),
+               window=770, seq=4097, ack=12290),
+        body=data)
+
+    sim = Simulator(dut)
+    sender = MultiPacketSender(random_delay=True, packet=dut.packet_in)
+    collector = StreamCollector(random_backpressure=True,
+                                stream=dut.packet_out.data)
+    headers = []
+
+    async def driver(ctx):
+        while not ctx.get(dut.packet_out.header_valid):
+            await ctx.tick()
+        headers.append(Header(
+            Flags.decode(bytes([ctx.get(dut.packet_out.header.flags.as_value())])),
+            stream=ctx.get(dut.packet_out.header.stream),
+            length=ctx.get(dut.packet_out.header.length),
+            window=ctx.get(dut.packet_out.header.window),
+            seq=ctx.get(dut.packet_out.header.seq),
+            ack=ctx.get(dut.packet_out.header.ack)))
+        while len(collector) < len(data):
+            await ctx.tick()
+
+    sim.add_clock(1e-6)
+    sim.add_process(sender.send([p]))
+    sim.add_process(collector.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    assert headers[0].encode() == p.header.encode()
+    collector.assert_eq(data)
+
+
+def test_zero_length_read():
+    """
+    A packet without a body is valid for a cycle.
+    """
+    dut = ReadPacketStop(id=3)
+    packets = [
+        Packet(Header(Flags(syn=True), stream=3, seq=100), body=bytes()),
+        Packet(Header(Flags(), stream=3, length=2, seq=101), body=b"hi"),
+    ]
+
+    sim = Simulator(dut)
+    sender = MultiPacketSender(random_delay=False, stream=dut.inbus)
+    body_collector = StreamCollector(
+        random_backpressure=False, stream=dut.packet.data)
+    bus_collector = StreamCollector(
+        random_backpressure=False, stream=dut.outbus)
+    want = b"".join(p.encode() for p in packets)
+    seqs = []
+
+    async def driver(ctx):
+        last_valid = 0
+        while len(bus_collector) < len(want):
+            valid = ctx.get(dut.packet.header_valid)
+            if valid and not last_valid:
+                seqs.append(ctx.get(dut.packet.header.seq))
+            last_valid = valid
+            await ctx.tick()
+
+    sim.add_clock(1e-6)
+    sim.add_process(sender.send(packets))
+    sim.add_process(body_collector.collect())
+    sim.add_process(bus_collector.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    assert seqs == [100, 101]
+    body_collector.assert_eq(b"hi")
+    bus_collector.assert_eq(want)
+
+
+def test_advertised_window():
+    """
+    A host-side WindowedSender keeps a device's receive buffer from filling,
+    from the window the device advertises.
+    """
+    DEPTH = 64
+
+    class Endpoint(Component):
+        """
+        A stream's receive buffer, with its window and ack written back.
+        """
+        inbus: In(stream.Signature(8))
+        outbus: Out(stream.Signature(8))
+        data: Out(stream.Signature(8))
+        packet: In(PacketSignature())
+        done: Out(1)
+        # Would the buffer stall the bus?
+        stall: Out(1)
+
+        def elaborate(self, platform):
+            m = Module()
+            m.submodules.reader = reader = ReadPacketStop(id=2)
+            m.submodules.buffer = buffer = ReceiveBuffer(depth=DEPTH)
+            m.submodules.writer = writer = WritePacketStop(id=2, advertise=True)
+            connect(m, wiring.flipped(self.inbus), reader.inbus)
+            connect(m, reader.outbus, writer.inbus)
+            connect(m, writer.outbus, wiring.flipped(self.outbus))
+            connect(m, reader.packet, buffer.packet)
+            connect(m, buffer.data, wiring.flipped(self.data))
+            connect(m, wiring.flipped(self.packet), writer.packet)
+            m.d.comb += [
+                writer.window.eq(buffer.window),
+                writer.ack.eq(buffer.ack),
+                self.done.eq(writer.done),
+                self.stall.eq(reader.packet.data.valid &
+                              ~reader.packet.data.ready),
+            ]
+            return m
+
+    dut = Endpoint()
+    data = bytes(i % 253 for i in range(1000))
+    host = WindowedSender(stream=2, seq=0x1234, max_length=24)
+    host.write(data)
+
+    sim = Simulator(dut)
+    collector = StreamCollector(random_backpressure=True, stream=dut.data)
+    stalls = []
+    acks = []
+
+    async def driver(ctx):
+        # The device acknowledges the host's syn, then sends bare acks.
+        ctx.set(dut.packet.header, {
+            "flags": {"syn": 1}, "stream": 2, "seq": 0x7000})
+        tx = Packet(Header(Flags(syn=True), stream=2, seq=0x1233),
+                    body=bytes()).encode()
+        rx = bytearray()
+        cycle = 0
+        while len(collector) < len(data) or host.acked != host.seq:
+            cycle += 1
+            if len(tx) == 0:
+                tx = b"".join(p.encode() for p in host.packets())
+            ctx.set(dut.inbus.valid, len(tx) > 0)
+            if tx:
+                ctx.set(dut.inbus.payload, tx[0])
+            ctx.set(dut.outbus.ready, 1)
+            ctx.set(dut.packet.header_valid, ctx.get(dut.done) and cycle % 16 == 0)
+            if ctx.get(dut.stall):
+                stalls.append(cycle)
+            transfer = tx and ctx.get(dut.inbus.ready)
+            if ctx.get(dut.outbus.valid):
+                rx.append(ctx.get(dut.outbus.payload))
+            await ctx.tick()
+            if transfer:
+                tx = tx[1:]
+            ctx.set(dut.packet.header.flags.syn, 0)
+            # Packets for the host, and the host's own packets, come back;
+            # the sender picks out the device's acknowledgements.
+            while len(rx) >= Header.BYTES:
+                header = Header.decode(bytes(rx))
+                if len(rx) < Header.BYTES + header.length:
+                    break
+                del rx[:Header.BYTES + header.length]
+                if header.flags.ack:
+                    acks.append(header.ack)
+                host.receive(header)
+            assert host.in_flight() <= DEPTH
+
+    sim.add_clock(1e-6)
+    sim.add_process(collector.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    collector.assert_eq(data)
+    assert stalls == []
+    assert host.pending() == 0
+    assert acks[-1] == (0x1234 + len(data)) % 0x10000
+
+
+def test_packetizer():
+    """
+    A session's stream, of no set length, is written as bounded packets.
+    """
+    MAX_LENGTH = 64
+
+    class SessionWriter(Component):
+        session: In(SessionSignature())
+        outbus: Out(stream.Signature(8))
+
+        def elaborate(self, platform):
+            m = Module()
+            m.submodules.packetizer = packetizer = Packetizer(
+                max_length=MAX_LENGTH, idle_cycles=16)
+            m.submodules.writer = writer = WritePacketStop(id=4)
+            connect(m, wiring.flipped(self.session), packetizer.session)
+            connect(m, packetizer.packet, writer.packet)
+            connect(m, writer.outbus, wiring.flipped(self.outbus))
+            m.d.comb += [
+                packetizer.seq.eq(0x100),
+                packetizer.done.eq(writer.done),
+            ]
+            return m
+
+    dut = SessionWriter()
+    data = bytes(i % 251 for i in range(1000))
+    tail = b"tail"
+
+    sim = Simulator(dut)
+    sender = StreamSender(dut.session.data, random_delay=True)
+    collector = PacketCollector(dut.outbus, random_backpressure=True)
+
+    def received():
+        return b"".join(p.body for p in collector.packets)
+
+    async def driver(ctx):
+        ctx.set(dut.session.active, 1)
+        await sender.send_active(data)(ctx)
+        # A partial packet isn't held back for more data:
+        for _ in range(200):
+            await ctx.tick()
+        assert received() == data
+
+        await sender.send_active(tail)(ctx)
+        ctx.set(dut.session.active, 0)
+        while not any(p.header.flags.fin for p in collector.packets):
+            await ctx.tick()
+
+    sim.add_clock(1e-6)
+    sim.add_process(collector.recv())
+    sim.add_testbench(driver)
+    sim.run()
+
+    packets = collector.packets
+    assert received() == data + tail
+    assert all(p.header.stream == 4 for p in packets)
+    assert max(p.header.length for p in packets) == MAX_LENGTH
+    seq = 0x100
+    for p in packets:
+        assert p.header.seq == seq
+        seq += p.header.length
+    assert [p.header.flags.fin for p in packets] == (
+        [False] * (len(packets) - 1) + [True])
@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from amaranth.build.run import LocalBuildProducts
+
+__all__ = ["BuildCache"]
+
+# LUNA tells apart submodules of the same class by their id(), e.g.
+# USBStreamInEndpoint_140273966249744; which differs from run to run.
+_OBJECT_ID = re.compile(r"_\d{10,}\b")
+# Names of cache entries: their keys.
+_KEY = re.compile(r"[0-9a-f]{64}")
+
+# A Fomu build, with a seed sweep, stores some tens of MB.
+DEFAULT_MAX_SIZE = 1 << 30
+
+
+def tool_command(name: str) -> str:
+    """
+    The command to run for a tool; overridable by environment variable,
+    as Amaranth's build scripts do (e.g. NEXTPNR_ICE40 for nextpnr-ice40).
+    """
+    env_var = name.upper().replace("-", "_").replace("+", "X")
+    return os.environ.get(env_var, name)
+
+
+class BuildCache:
+    """
+    Content-addressed cache of build products, for Amaranth platforms.
+
+    Builds from the commands in the build plan (build_{name}.json),
+    one stage per tool. Each stage's key hashes:
+    - the previous stage's key; the first stage's hashes the design
+      sources, i.e. the elaborated RTLIL;
+    - the command line;
+    - the tool's version, as it reports it to --version;
+    - build plan files named on the command line (e.g. the .ys script,
+      or the .pcf).
+    Object ids in names are masked out of the hashed files, so that
+    they don't defeat the cache.
+
+    A stage whose key is in the cache isn't run: the files it wrote last
+    time are copied into the build directory. So a rebuild of an unchanged
+    design runs no tools; and changing only place-and-route options,
+    such as the seed, reuses synthesis.
+
+    Each time a stage is stored, the least recently used entries are
+    removed, until the cache is within max_size; but never an entry this
+    BuildCache has used, so a build doesn't evict its own stages.
+
+    Parameters
+    ----------
+    root:     directory of the cache.
+    verbose:  report each stage's hit or miss to stderr.
+    max_size: bytes the cache may hold; or None, for no limit.
+
+    Attributes
+    ----------
+    hits:   tools whose outputs came from the cache.
+    misses: tools that were run.
+    """
+
+    def __init__(self, root="build/cache", verbose: bool = False,
+                 max_size: int = DEFAULT_MAX_SIZE):
+        self._root = pathlib.Path(root)
+        self._verbose = verbose
+        self._max_size = max_size
+        self._versions = {}
+        self._used = set()
+        self.hits = []
+        self.misses = []
+
+    def build(self, platform, elaboratable, name: str = "top",
+              build_dir="build", do_program: bool = False,
+              program_opts: dict = None, **kwargs):
+        """
+        As platform.build(elaboratable, ...), but through the cache.
+
+        Returns LocalBuildProducts.
+        """
+        plan = platform.prepare(elaboratable, name, **kwargs)
+        products = self.execute(plan, name, build_dir)
+        if do_program:
+            platform.toolchain_program(products, name, **(program_opts or {}))
+        return products
+
+    def execute(self, plan, name: str, build_dir="build"):
+        """
+        Run a build plan (from platform.prepare) in build_dir.
+
+        Returns LocalBuildProducts.
+        """
+        build_dir = plan.extract(build_dir)
+        key = self.source_key(plan, name)
+        for command in self.commands(plan, name):
+            key = self.run(plan, build_dir, key, command)
+        return LocalBuildProducts(build_dir)
+
+    @staticmethod
+    def commands(plan, name: str) -> list[list[str]]:
+        """
+        The commands of a build plan, as tool name and arguments.
+        """
+        return json.loads(plan.files[f"build_{name}.json"])["commands"]
+
+    def source_key(self, plan, name: str) -> str:
+        """
+        Key of a build plan's design sources: the files that no command
+        names directly.
+        """
+        scripts = {f"build_{name}.{ext}" for ext in ("sh", "bat", "json")}
+        named = {arg for command in self.commands(plan, name)
+                 for arg in command}
+        return self._hash(*(
+            self._content(plan, f) for f in sorted(plan.files)
+            if f not in scripts and f not in named))
+
+    def run(self, plan, build_dir, key: str, command: list[str]) -> str:
+        """
+        Run one command of a build plan in build_dir; or copy in its
+        outputs, from the cache.
+
+        key is that of the previous command, or the source_key of the plan.
+        Returns this command's key.
+        """
+        (tool, *args) = command
+        key = self._hash(
+            ("key", key),
+            ("command", json.dumps(command)),
+            ("version", self._version(tool)),
+            *(self._content(plan, f) for f in args if f in plan.files))
+        self._stage(pathlib.Path(build_dir), key, tool, args)
+        return key
+
+    def prune(self, max_size: int) -> list[str]:
+        """
+        Remove the least recently used entries, until the cache holds at
+        most max_size bytes; other than those this BuildCache has used.
+
+        Returns the keys of the entries removed.
+        """
+        if not self._root.is_dir():
+            return []
+        entries = []
+        for entry in self._root.iterdir():
+            if not _KEY.fullmatch(entry.name):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry.iterdir())
+                entries.append((entry.stat().st_mtime_ns, size, entry))
+            except FileNotFoundError:
+                # Removed by another build.
+                pass
+        total = sum(size for (_, size, _) in entries)
+        removed = []
+        for (_, size, entry) in sorted(entries):
+            if total <= max_size:
+                break
+            if entry.name in self._used:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed.append(entry.name)
+        if removed:
+            self._log(f"pruned {len(removed)} entries")
+        return removed
+
+    def clean(self):
+        """
+        Remove the whole cache.
+        """
+        shutil.rmtree(self._root, ignore_errors=True)
+
+    def _stage(self, build_dir: pathlib.Path, key: str, tool: str, args):
+        entry = self._root / key
+        self._used.add(key)
+        try:
+            # Most recently used:
+            os.utime(entry)
+            for f in entry.iterdir():
+                shutil.copyfile(f, build_dir / f.name)
+            self.hits.append(tool)
+            self._log(f"{tool}: cached ({key[:16]})")
+            return
+        except FileNotFoundError:
+            # Not cached; or removed by another build, before we could
+            # copy it all.
+            pass
+
+        self.misses.append(tool)
+        self._log(f"{tool}: building ({key[:16]})")
+        before = self._snapshot(build_dir)
+        subprocess.run([tool_command(tool), *args], cwd=build_dir, check=True)
+        after = self._snapshot(build_dir)
+        outputs = [f for (f, stat) in after.items() if before.get(f) != stat]
+
+        # Fill a temporary entry, then move it into place, so that
+        # concurrent builds never see a partial one.
+        self._root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self._root) as tmp:
+            fill = pathlib.Path(tmp) / key
+            fill.mkdir()
+            for f in outputs:
+                shutil.copyfile(build_dir / f, fill / f)
+            try:
+                fill.rename(entry)
+            except OSError:
+                # Another build got there first; its outputs are as good.
+                pass
+        if self._max_size is not None:
+            self.prune(self._max_size)
+
+    def _version(self, tool: str) -> str:
+        if tool not in self._versions:
+            result = subprocess.run(
+                [tool_command(tool), "--version"],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            self._versions[tool] = result.stdout.decode("utf-8", "replace")
+        return self._versions[tool]
+
+    @staticmethod
+    def _content(plan, f: str):
+        text = plan.files[f]
+        if isinstance(text, str):
+            text = _OBJECT_ID.sub("_<id>", text)
+        return (f, text)
+
+    def _log(self, message: str):
+        if self._verbose:
+            sys.stderr.write(f"build cache: {message}\n")
+
+    @staticmethod
+    def _snapshot(build_dir: pathlib.Path) -> dict:
+        return {
+            e.name: (e.stat().st_mtime_ns, e.stat().st_size)
+            for e in os.scandir(build_dir) if e.is_file()
+        }
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        hasher = hashlib.blake2b(digest_size=32)
+        for (label, content) in parts:
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            for part in (label.encode("utf-8"), content):
+                hasher.update(len(part).to_bytes(8, "little"))
+                hasher.update(part)
+        return hasher.hexdigest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the build cache.")
+    parser.add_argument("--root", default="build/cache",
+                        help="directory of the cache")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--clean", action="store_true",
+                        help="remove the whole cache")
+    action.add_argument("--prune", type=float, metavar="MB",
+                        help="remove the least recently used entries, "
+                             "until the cache is at most MB megabytes")
+    args = parser.parse_args()
+    cache = BuildCache(args.root, verbose=True)
+    if args.clean:
+        cache.clean()
+    else:
+        cache.prune(int(args.prune * 1e6))
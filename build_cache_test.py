@@ -0,0 +1,119 @@
+import os
+import time
+
+import amaranth as am
+from amaranth_boards.fomu_pvt import FomuPVTPlatform
+
+from build_cache import BuildCache
+
+
+class Counter(am.Elaboratable):
+    def __init__(self):
+        self.count = am.Signal(24)
+
+    def elaborate(self, platform):
+        m = am.Module()
+        m.d.sync += self.count.eq(self.count + 1)
+        return m
+
+
+class Blinky(am.Elaboratable):
+    """
+    A small design, quick to build.
+    """
+
+    def __init__(self, bit: int = 20):
+        self._bit = bit
+
+    def elaborate(self, platform):
+        m = am.Module()
+        counter = Counter()
+        # Named as LUNA names some submodules; differently every time.
+        m.submodules[f"Counter_{id(counter)}"] = counter
+        led = platform.request("rgb_led")
+        m.d.comb += led.r.o.eq(counter.count[self._bit])
+        return m
+
+
+def test_build_cache(tmp_path):
+    cache_dir = tmp_path / "cache"
+    build_dir = tmp_path / "build"
+
+    def build(design, **kwargs):
+        cache = BuildCache(cache_dir)
+        products = cache.build(FomuPVTPlatform(), design,
+                               build_dir=build_dir, **kwargs)
+        return (cache, products.get("top.bin"))
+
+    (cache, first) = build(Blinky())
+    assert cache.hits == []
+    assert cache.misses == ["yosys", "nextpnr-ice40", "icepack"]
+
+    # The same again runs nothing:
+    (build_dir / "top.bin").unlink()
+    (cache, again) = build(Blinky())
+    assert cache.misses == []
+    assert again == first
+
+    # A new seed reuses synthesis:
+    (cache, _) = build(Blinky(), nextpnr_opts="--seed 2")
+    assert cache.hits == ["yosys"]
+    assert cache.misses == ["nextpnr-ice40", "icepack"]
+
+    # A new design rebuilds:
+    (cache, changed) = build(Blinky(bit=21))
+    assert cache.hits == []
+    assert changed != first
+
+
+def test_prune(tmp_path):
+    cache_dir = tmp_path / "cache"
+
+    def entry(name: str, size: int, age: float):
+        entry = cache_dir / (name * 64)
+        entry.mkdir(parents=True)
+        (entry / "top.bin").write_bytes(bytes(size))
+        used = time.time() - age
+        os.utime(entry, (used, used))
+
+    entry("a", 100, age=30)
+    entry("b", 100, age=10)
+    entry("c", 100, age=20)
+    # A stage being stored isn't an entry yet:
+    (cache_dir / "tmp_stage").mkdir()
+
+    # Least recently used first:
+    cache = BuildCache(cache_dir)
+    assert cache.prune(250) == ["a" * 64]
+    assert cache.prune(100) == ["c" * 64]
+    assert sorted(os.listdir(cache_dir)) == ["b" * 64, "tmp_stage"]
+
+    cache.clean()
+    assert not cache_dir.exists()
+
+
+def test_build_cache_bound(tmp_path):
+    cache_dir = tmp_path / "cache"
+    build_dir = tmp_path / "build"
+
+    def build(design, **kwargs):
+        cache = BuildCache(cache_dir, **kwargs)
+        cache.build(FomuPVTPlatform(), design, build_dir=build_dir)
+        return cache
+
+    build(Blinky())
+    first = set(os.listdir(cache_dir))
+    build(Blinky(bit=21))
+    second = set(os.listdir(cache_dir)) - first
+
+    # A hit counts as a use:
+    assert build(Blinky()).misses == []
+    total = sum(f.stat().st_size
+                for entry in cache_dir.iterdir() for f in entry.iterdir())
+    removed = BuildCache(cache_dir).prune(total - 1)
+    assert removed and set(removed) <= second
+
+    # A build keeps its own stages, however small the bound:
+    cache = build(Blinky(bit=22), max_size=0)
+    assert cache.misses == ["yosys", "nextpnr-ice40", "icepack"]
+    assert len(os.listdir(cache_dir)) == 3
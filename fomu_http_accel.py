@@ -1,13 +1,160 @@
+import argparse
+import sys
+import tempfile
+
 import amaranth as am
+from amaranth.lib import stream
+from amaranth.lib.cdc import ResetSynchronizer
+from amaranth.lib.fifo import AsyncFIFO
+from amaranth.lib.wiring import Component, In, Out
 from amaranth_boards.fomu_pvt import FomuPVTPlatform
+from build_cache import BuildCache
 from luna.gateware.interface.gateware_phy import GatewarePHY
 from luna.full_devices import USBSerialDevice
 from ntcp_http import NtcpHttpServer
+from seed_sweep import sweep_build
+from usb_bulk import USBBulkDevice
+
+__all__ = ["FomuHttpAccelerator", "CoreDomainServer", "CORE_FREQ",
+           "pll_params"]
+
+# Default frequency of the server's clock, in Hz.
+# The PLL can make 24 MHz from 48 MHz, but the HTTP server's longest path
+# closes timing at about 23 MHz; so 24 MHz fails timing, and 48 MHz is out
+# of reach. 20 MHz leaves some margin.
+CORE_FREQ = 20e6
+
+
+def pll_params(f_in: float, f_out: float) -> dict:
+    """
+    Parameters for an iCE40 SB_PLL40_CORE, in SIMPLE feedback mode,
+    to make f_out from f_in; as icepll would choose them.
+
+    Raises ValueError if f_out can't be made to within 0.1%.
+    """
+    best = None
+    for divr in range(16):
+        f_pfd = f_in / (divr + 1)
+        if not 10e6 <= f_pfd <= 133e6:
+            continue
+        for divf in range(128):
+            f_vco = f_pfd * (divf + 1)
+            if not 533e6 <= f_vco <= 1066e6:
+                continue
+            for divq in range(1, 7):
+                error = abs(f_vco / 2**divq - f_out)
+                if best is None or error < best[0]:
+                    best = (error, divr, divf, divq, f_pfd)
+    if best is None or best[0] > f_out * 1e-3:
+        raise ValueError(f"can't make {f_out / 1e6} MHz from {f_in / 1e6} MHz")
+    (_, divr, divf, divq, f_pfd) = best
+    for (limit, filter_range) in [
+            (17e6, 1), (26e6, 2), (44e6, 3), (66e6, 4), (101e6, 5)]:
+        if f_pfd < limit:
+            break
+    else:
+        filter_range = 6
+    return {
+        "DIVR": divr,
+        "DIVF": divf,
+        "DIVQ": divq,
+        "FILTER_RANGE": filter_range,
+    }
+
+
+class CoreDomainServer(Component):
+    """
+    Runs a server in its own "core" clock domain, with async FIFOs between
+    it and streams in the sync domain.
+
+    The domain must be defined by the design this is in.
+
+    Parameters
+    ----------
+    server: Component with "tx" and "rx" streams of bytes.
+    depth:  depth of each FIFO.
+
+    Attributes
+    ----------
+    tx: Stream(8), out
+        Server output, in the sync domain.
+    rx: Stream(8), in
+        Server input, in the sync domain.
+    """
+
+    tx: Out(stream.Signature(8))
+    rx: In(stream.Signature(8))
+
+    def __init__(self, server, depth: int = 16):
+        super().__init__()
+        self.server = server
+        self._depth = depth
+
+    def elaborate(self, platform):
+        m = am.Module()
+
+        server = m.submodules.server = am.DomainRenamer("core")(self.server)
+        rx = m.submodules.rx_fifo = AsyncFIFO(
+            width=8, depth=self._depth, w_domain="sync", r_domain="core")
+        tx = m.submodules.tx_fifo = AsyncFIFO(
+            width=8, depth=self._depth, w_domain="core", r_domain="sync")
+        m.d.comb += [
+            rx.w_data.eq(self.rx.payload),
+            rx.w_en.eq(self.rx.valid),
+            self.rx.ready.eq(rx.w_rdy),
+
+            server.rx.payload.eq(rx.r_data),
+            server.rx.valid.eq(rx.r_rdy),
+            rx.r_en.eq(server.rx.ready),
+
+            tx.w_data.eq(server.tx.payload),
+            tx.w_en.eq(server.tx.valid),
+            server.tx.ready.eq(tx.w_rdy),
+
+            self.tx.payload.eq(tx.r_data),
+            self.tx.valid.eq(tx.r_rdy),
+            tx.r_en.eq(self.tx.ready),
+        ]
 
-__all__ = ["FomuHttpAccelerator"]
+        return m
 
 
 class FomuHttpAccelerator(am.Elaboratable):
+    """
+    HTTP server on a Fomu, over USB: serial (CDC-ACM), or a pair of
+    vendor-specific bulk endpoints.
+
+    The USB device runs at 12 MHz, in the sync domain. The server runs in
+    its own "core" domain, from the 48 MHz clock input: directly, or through
+    the PLL.
+
+    Parameters
+    ----------
+    core_freq: float
+               Frequency of the server's clock, in Hz; e.g. CORE_FREQ.
+               48 MHz runs from the clock input; other frequencies need the
+               PLL.
+    transport: "acm" or "bulk"
+               How the device presents itself to the host.
+               "acm" is a USB serial port; "bulk" has less overhead,
+               but needs a host that talks to it directly,
+               e.g. not_tcp.usb_host.UsbBulkProxy.
+    """
+
+    TRANSPORTS = {
+        "acm": USBSerialDevice,
+        "bulk": USBBulkDevice,
+    }
+
+    def __init__(self, core_freq: float, transport: str = "acm"):
+        if core_freq != 48e6:
+            # Check early that the PLL can make it.
+            pll_params(48e6, core_freq)
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f"unknown USB transport {transport!r}; "
+                             f"expected one of {list(self.TRANSPORTS)}")
+        self._core_freq = core_freq
+        self._transport = transport
 
     def elaborate(self, platform):
         m = am.Module()
@@ -20,28 +167,51 @@ class FomuHttpAccelerator(am.Elaboratable):
         clk48.clk = platform.request("clk48", dir="i").i
         m.domains.clk48 = clk48
 
+        # The server's own clock:
+        core = am.ClockDomain("core", local=True)
+        m.domains.core = core
+        if self._core_freq == 48e6:
+            m.d.comb += core.clk.eq(clk48.clk)
+        else:
+            lock = am.Signal()
+            params = pll_params(48e6, self._core_freq)
+            m.submodules.pll = am.Instance(
+                "SB_PLL40_CORE",
+                p_FEEDBACK_PATH="SIMPLE",
+                **{f"p_{k}": v for (k, v) in params.items()},
+                i_REFERENCECLK=clk48.clk,
+                i_RESETB=1,
+                i_BYPASS=0,
+                o_PLLOUTGLOBAL=core.clk,
+                o_LOCK=lock,
+            )
+            m.submodules.core_reset = ResetSynchronizer(~lock, domain="core")
+        platform.add_clock_constraint(core.clk, self._core_freq)
+
         rename = am.DomainRenamer({"usb_io": "clk48", "usb": "sync"})
 
         # From the outside in:
         # USB PHY:
         phy = m.submodules.phy = rename(
             GatewarePHY(io=platform.request("usb")))
-        # USB Serial:
-        usb_serial = m.submodules.usb_serial = \
-            rename(USBSerialDevice(bus=phy, idVendor=0x1209, idProduct=0x5411))
-        m.d.comb += usb_serial.connect.eq(1)
+        # USB device, serial or bulk:
+        device = self.TRANSPORTS[self._transport]
+        usb_device = m.submodules.usb_device = \
+            rename(device(bus=phy, idVendor=0x1209, idProduct=0x5411))
+        m.d.comb += usb_device.connect.eq(1)
 
         # Server:
-        server = m.submodules.server = NtcpHttpServer()
+        core_server = m.submodules.server = CoreDomainServer(NtcpHttpServer())
+        server = core_server.server
         m.d.comb += [
-            usb_serial.rx.ready.eq(server.rx.ready),
-            server.rx.payload.eq(usb_serial.rx.payload),
-            server.rx.valid.eq(usb_serial.rx.valid),
+            usb_device.rx.ready.eq(core_server.rx.ready),
+            core_server.rx.payload.eq(usb_device.rx.payload),
+            core_server.rx.valid.eq(usb_device.rx.valid),
 
 
-            server.tx.ready.eq(usb_serial.tx.ready),
-            usb_serial.tx.payload.eq(server.tx.payload),
-            usb_serial.tx.valid.eq(server.tx.valid),
+            core_server.tx.ready.eq(usb_device.tx.ready),
+            usb_device.tx.payload.eq(core_server.tx.payload),
+            usb_device.tx.valid.eq(core_server.tx.valid),
         ]
 
         # LED output:
@@ -56,6 +226,34 @@ class FomuHttpAccelerator(am.Elaboratable):
 
 
 if __name__ == "__main__":
-    FomuPVTPlatform().build(FomuHttpAccelerator(),
-                            do_program=True,
-                            verbose=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--core-mhz", type=float, default=CORE_FREQ / 1e6,
+                        help="frequency of the HTTP server's clock "
+                             f"(default {CORE_FREQ / 1e6:g}: the fastest "
+                             "that reliably meets timing)")
+    parser.add_argument("--transport", default="acm",
+                        choices=FomuHttpAccelerator.TRANSPORTS,
+                        help="USB serial, or vendor-specific bulk endpoints")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="run every tool; don't reuse build products")
+    # The USB clock domain has little timing slack at 48MHz, and not every
+    # placement meets it; so try several seeds, and keep the best.
+    parser.add_argument("--seeds", type=int, default=8,
+                        help="number of nextpnr seeds to try")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="most placements to run at once")
+    args = parser.parse_args()
+    design = FomuHttpAccelerator(core_freq=args.core_mhz * 1e6,
+                                 transport=args.transport)
+    with tempfile.TemporaryDirectory() as scratch:
+        cache = BuildCache(scratch if args.no_cache else "build/cache",
+                           verbose=True)
+        try:
+            sweep_build(FomuPVTPlatform(), design,
+                        seeds=range(1, args.seeds + 1),
+                        cache=cache,
+                        jobs=args.jobs,
+                        do_program=True,
+                        verbose=True)
+        except RuntimeError as e:
+            sys.exit(str(e))
@@ -1,7 +1,94 @@
+import pytest
 
+from amaranth import ClockDomain, Module
+from amaranth.lib import stream, wiring
+from amaranth.lib.wiring import Component, In, Out, connect
+from amaranth.sim import Simulator
 from amaranth_boards.fomu_pvt import FomuPVTPlatform
-from fomu_http_accel import FomuHttpAccelerator
 
+from build_cache import BuildCache
+from fomu_http_accel import (
+    FomuHttpAccelerator, CoreDomainServer, CORE_FREQ, pll_params)
+from ntcp_http import NtcpHttpServer
+from not_tcp.host import Packet, Flag
+from seed_sweep import sweep_build
+from stream_fixtures import StreamSender, StreamCollector
 
-def test_build():
-    FomuPVTPlatform().build(FomuHttpAccelerator(), verbose=True)
+
+@pytest.mark.parametrize("transport", ["acm", "bulk"])
+def test_build(transport, tmp_path):
+    # Built as the main program builds it, but with a sweep of one seed.
+    # Whether the 48MHz USB clock meets timing depends on the seed, which is
+    # why the main program tries several; the others should always meet it.
+    result = sweep_build(
+        FomuPVTPlatform(),
+        FomuHttpAccelerator(core_freq=CORE_FREQ, transport=transport),
+        seeds=[1], cache=BuildCache(tmp_path / "cache"),
+        build_dir=tmp_path / "build")
+    (placement,) = result.placements
+    assert placement.timing["core_clk"].margin >= 1
+    assert placement.timing["cd_sync.clk"].margin >= 1
+    assert (tmp_path / "build" / "top.bin").exists()
+
+
+def test_pll_params():
+    # As from icepll -i 48 -o 24:
+    assert pll_params(48e6, 24e6) == {
+        "DIVR": 0, "DIVF": 15, "DIVQ": 5, "FILTER_RANGE": 4}
+    with pytest.raises(ValueError):
+        FomuHttpAccelerator(core_freq=1e6)
+
+
+def test_unknown_transport():
+    with pytest.raises(ValueError):
+        FomuHttpAccelerator(core_freq=CORE_FREQ, transport="uart")
+
+
+class TwoDomains(Component):
+    """
+    A CoreDomainServer, with its core domain.
+    """
+
+    tx: Out(stream.Signature(8))
+    rx: In(stream.Signature(8))
+
+    def elaborate(self, platform):
+        m = Module()
+        m.domains.core = ClockDomain()
+        m.submodules.server = server = CoreDomainServer(NtcpHttpServer())
+        connect(m, server.tx, wiring.flipped(self.tx))
+        connect(m, wiring.flipped(self.rx), server.rx)
+        return m
+
+
+@pytest.mark.parametrize("core_period", [1 / 24e6, 1 / 48e6, 1 / 9e6])
+def test_core_domain(core_period):
+    dut = TwoDomains()
+    sim = Simulator(dut)
+    sim.add_clock(1 / 12e6)
+    sim.add_clock(core_period, domain="core")
+
+    sender = StreamSender(dut.rx)
+    receiver = StreamCollector(dut.tx)
+    request = Packet(stream_id=1, flags=Flag.START | Flag.END, body=(
+        b"GET /unmapped HTTP/1.0\r\n"
+        b"\r\n"))
+
+    sim.add_process(sender.send_passive(request.to_bytes()))
+    sim.add_process(receiver.collect())
+
+    async def driver(ctx):
+        for i in range(0, 2048):
+            await ctx.tick()
+    sim.add_testbench(driver)
+    sim.run()
+
+    data = receiver.body
+    body = bytes()
+    while True:
+        (packet, data) = Packet.from_bytes(data)
+        assert packet is not None
+        body += packet.body
+        if packet.end:
+            break
+    assert body.startswith(b"HTTP/1.0 404 Not Found")
@@ -20,6 +20,8 @@ class AtoI(Component):
             Reset and await a new input
     error:  Signal(1), out
             Recieved a non-'0'-'9' input.
+    overflow: Signal(1), out
+            The number doesn't fit in width bits; value has wrapped.
     value:  Signal(width), out
     """
 
@@ -28,6 +30,7 @@ class AtoI(Component):
                 "input" : In(stream.Signature(unsigned(8))),
                 "reset" : In(1),
                 "error" : Out(1, init=0),
+                "overflow" : Out(1, init=0),
                 "value" : Out(width, init=0),
             },  **kwargs)
         self._width = width
@@ -35,10 +38,12 @@ class AtoI(Component):
     def elaborate(self, _platform):
         m = Module()
 
-        next = Signal(self._width)
-        shifted = Signal(self._width)
+        # With room for the carry out of the top digit:
+        next = Signal(self._width + 4)
+        shifted = Signal(self._width + 4)
         increment = Signal(self._width)
         error_comb = Signal(1)
+        overflow_comb = Signal(1)
 
         # Ready to get data if we're out of reset.
         m.d.comb += self.input.ready.eq(~self.reset)
@@ -50,18 +55,21 @@ class AtoI(Component):
             # x*10 = x*8+x*2 = x<<3+x<<1
             shifted.eq((self.value << 3) + (self.value << 1)),
             increment.eq(self.input.payload - Const(48)),
-            next.eq(am.Mux(self.input.valid, shifted + increment, self.value))
+            next.eq(am.Mux(self.input.valid, shifted + increment, self.value)),
+            overflow_comb.eq(next[self._width:] != 0),
         ]
 
-        # Error latches, and holds until next reset
+        # Error and overflow latch, and hold until next reset
         with m.If(self.reset):
             m.d.sync += [
                 self.error.eq(0),
+                self.overflow.eq(0),
                 self.value.eq(0),
             ]
         with m.Else():
             m.d.sync += [
                 self.error.eq(self.error | error_comb),
+                self.overflow.eq(self.overflow | overflow_comb),
                 self.value.eq(next),
             ]
 
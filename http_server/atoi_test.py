@@ -91,3 +91,34 @@ def test_ignores_invalid():
         await run_ignores_invalid_case(dut, ctx, "1234", 1234)
         await run_ignores_invalid_case(dut, ctx, "12345", 12345)
     run_driver(driver)
+
+
+def test_overflow():
+    async def driver(dut, ctx):
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+
+        ctx.set(dut.input.valid, 1)
+        for c in "4294967295":
+            ctx.set(dut.input.payload, ord(c))
+            await ctx.tick()
+        assert ctx.get(dut.value) == 2**32 - 1
+        assert ctx.get(dut.overflow) == 0
+
+        # One more digit doesn't fit:
+        ctx.set(dut.input.payload, ord("0"))
+        await ctx.tick()
+        assert ctx.get(dut.overflow) == 1
+        assert ctx.get(dut.error) == 0
+
+        # Overflow is sticky, until reset:
+        ctx.set(dut.input.valid, 0)
+        await ctx.tick()
+        assert ctx.get(dut.overflow) == 1
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        await ctx.tick()
+        assert ctx.get(dut.overflow) == 0
+    run_driver(driver)
@@ -1,10 +1,9 @@
 from amaranth import Module
 from amaranth.lib.wiring import In
 
+from .counter_bank import CounterBank
 from .printer import AbstractPrinter
-from .printer import Printer
-from .printer_seq import PrinterSeq
-from .bcd_counter import BcdCounter
+from .response_formatter import ResponseFormatter, Literal, Stat
 
 class CountBody(AbstractPrinter):
     """
@@ -12,13 +11,12 @@ class CountBody(AbstractPrinter):
 
     Example output might look like (with some formatting):
     ```
-    requests: 0010 
-    ok_responses: 0008
-    error_responses: 0002
+    requests: 10
+    ok_responses: 8
+    error_responses: 2
     ```
-    TODO: Due to bcd_counter adding leading zeros, this can't make valid JSON,
-          as #s with leading zeros are interpreted as Octal. A hex counter 
-          could work, or stripping the leading zeros.
+    The counts are 32-bit counters in a CounterBank, so they don't wrap
+    in practice, and are printed without leading zeros.
 
     Attributes:
     ----------
@@ -47,29 +45,29 @@ class CountBody(AbstractPrinter):
     def elaborate(self, _platform):
         m = Module()
 
-        # PrinterSeq later adds these to their m.submodules.
-        count_req = BcdCounter(4, ascii=True)
-        count_ok = BcdCounter(4, ascii=True)
-        count_error = BcdCounter(4, ascii=True)
-
-        m.submodules.printer = printer = PrinterSeq([
-            Printer("requests: "), count_req, 
-            Printer(" ok_responses: "), count_ok,
-            Printer(" error_responses: "), count_error,
-            Printer("\r\n")
-        ])
+        m.submodules.stats = stats = CounterBank(3)
+        m.submodules.formatter = formatter = ResponseFormatter([
+            Literal("requests: "), Stat(0),
+            Literal(" ok_responses: "), Stat(1),
+            Literal(" error_responses: "), Stat(2),
+            Literal("\r\n"),
+        ], stats=3)
 
         m.d.comb += [
-            self.done.eq(printer.done),
-            self.output.payload.eq(printer.output.payload),
-            self.output.valid.eq(printer.output.valid),
+            self.done.eq(formatter.done),
+            self.output.payload.eq(formatter.output.payload),
+            self.output.valid.eq(formatter.output.valid),
+
+            formatter.output.ready.eq(self.output.ready),
+            formatter.en.eq(self.en),
 
-            printer.output.ready.eq(self.output.ready),
-            printer.en.eq(self.en),
+            stats.read_en.eq(formatter.stat_read.en),
+            stats.read_addr.eq(formatter.stat_read.addr),
+            formatter.stat_read.data.eq(stats.read_data),
 
-            count_req.inc.eq(self.inc_requests),
-            count_ok.inc.eq(self.inc_ok),
-            count_error.inc.eq(self.inc_error),
+            stats.inc[0].eq(self.inc_requests),
+            stats.inc[1].eq(self.inc_ok),
+            stats.inc[2].eq(self.inc_error),
         ]
 
         return m
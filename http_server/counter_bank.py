@@ -0,0 +1,135 @@
+from amaranth import Module, Signal, unsigned, Mux, Array
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import memory
+from amaranth.lib import stream
+
+
+class CounterBank(Component):
+    """
+    A bank of wide counters, stored in a single memory.
+
+    Increments are applied by one read-modify-write incrementer, to one
+    counter per cycle. Increment requests are held until the incrementer gets
+    to their counter, and then applied all at once; up to `max_pending`
+    increments can be held per counter.
+
+    Counters can also be incremented by ID, through the `inc_id` stream;
+    this takes no per-counter logic, so suits large banks.
+
+    Parameters
+    ----------
+    count:       int
+                 Number of counters.
+    width:       int
+                 Width of each counter, in bits.
+    max_pending: int
+                 Number of increments that can be held for each counter.
+    inc_lines:   int
+                 Number of counters (starting from 0) with an `inc` line.
+                 Defaults to all of them.
+
+    Attributes
+    ----------
+    inc:        Signal(inc_lines), in
+                Increment the corresponding counters.
+    inc_id:     Stream(range(count)), in
+                Increment the counter with this ID.
+                Lower priority than `inc`.
+    read_en:    Signal(1), in
+                Read the counter at `read_addr`.
+                Reads take priority over increments.
+    read_addr:  Signal(range(count)), in
+                Counter to read.
+    read_data:  Signal(width), out
+                Value of the counter, the cycle after `read_en`.
+    """
+
+    def __init__(self, count, width=32, max_pending=3, inc_lines=None):
+        if inc_lines is None:
+            inc_lines = count
+        super().__init__({
+            "inc": In(inc_lines),
+            "inc_id": In(stream.Signature(range(count))),
+            "read_en": In(1),
+            "read_addr": In(range(count)),
+            "read_data": Out(width),
+        })
+        self._count = count
+        self._width = width
+        self._max_pending = max_pending
+        self._inc_lines = inc_lines
+
+    def elaborate(self, platform):
+        m = Module()
+
+        m.submodules.counters = counters = memory.Memory(
+            shape=unsigned(self._width), depth=self._count, init=[])
+        read = counters.read_port()
+        write = counters.write_port()
+
+        # Increments that haven't been applied yet:
+        pending = Array(Signal(range(self._max_pending + 1), name=f"pending_{i}")
+                        for i in range(self._inc_lines))
+        any_pending = Signal(1)
+        # The lowest-numbered counter with pending increments:
+        next_id = Signal(range(self._count))
+        for i in reversed(range(self._inc_lines)):
+            with m.If(pending[i] != 0):
+                m.d.comb += [
+                    next_id.eq(i),
+                    any_pending.eq(1),
+                ]
+
+        # Stage 1: read the counter.
+        # Stage 2: write back the incremented value.
+        incrementing = Signal(1)
+        increment_id = Signal(range(self._count))
+        increment_by = Signal(range(self._max_pending + 1))
+
+        # The memory returns the old value when reading and writing the same
+        # address in the same cycle; forward the new value instead.
+        forward = Signal(1)
+        forward_data = Signal(self._width)
+        current = Signal(self._width)
+        m.d.comb += current.eq(Mux(forward, forward_data, read.data))
+
+        m.d.comb += [
+            read.en.eq(1),
+            read.addr.eq(next_id),
+            self.read_data.eq(current),
+        ]
+        start = Signal(1)
+        with m.If(self.read_en):
+            m.d.comb += read.addr.eq(self.read_addr)
+        with m.Elif(any_pending):
+            m.d.comb += start.eq(1)
+            if self._inc_lines > 0:
+                m.d.sync += increment_by.eq(pending[next_id])
+        with m.Else():
+            m.d.comb += [
+                read.addr.eq(self.inc_id.payload),
+                self.inc_id.ready.eq(1),
+            ]
+            m.d.sync += increment_by.eq(1)
+        m.d.sync += [
+            incrementing.eq(start | (self.inc_id.valid & self.inc_id.ready)),
+            increment_id.eq(read.addr),
+        ]
+        for i in range(self._inc_lines):
+            taken = start & (next_id == i)
+            with m.If(taken):
+                m.d.sync += pending[i].eq(self.inc[i])
+            with m.Elif(self.inc[i] & (pending[i] != self._max_pending)):
+                m.d.sync += pending[i].eq(pending[i] + 1)
+
+        m.d.comb += [
+            write.en.eq(incrementing),
+            write.addr.eq(increment_id),
+            write.data.eq(current + increment_by),
+        ]
+        m.d.sync += [
+            forward.eq(write.en & (write.addr == read.addr)),
+            forward_data.eq(write.data),
+        ]
+
+        return m
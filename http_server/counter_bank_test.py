@@ -0,0 +1,131 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .counter_bank import CounterBank
+
+
+def test_counter_bank():
+    count = 5
+    dut = CounterBank(count, width=32)
+    expected = [0] * count
+
+    async def read(ctx, i):
+        ctx.set(dut.read_addr, i)
+        ctx.set(dut.read_en, 1)
+        await ctx.tick()
+        ctx.set(dut.read_en, 0)
+        return ctx.get(dut.read_data)
+
+    async def settle(ctx):
+        for _ in range(count + 2):
+            await ctx.tick()
+
+    async def bench(ctx):
+        for i in range(count):
+            assert await read(ctx, i) == 0
+
+        # Increment all of the counters at once:
+        ctx.set(dut.inc, (1 << count) - 1)
+        await ctx.tick()
+        ctx.set(dut.inc, 0)
+        await settle(ctx)
+        for i in range(count):
+            expected[i] += 1
+            assert await read(ctx, i) == expected[i]
+
+        # Back-to-back increments of the same counter:
+        for _ in range(10):
+            ctx.set(dut.inc, 1 << 2)
+            await ctx.tick()
+        ctx.set(dut.inc, 0)
+        expected[2] += 10
+        await settle(ctx)
+        assert await read(ctx, 2) == expected[2]
+
+        # Bursts to all the counters, which queue up while
+        # the incrementer works through them:
+        for _ in range(3):
+            ctx.set(dut.inc, (1 << count) - 1)
+            await ctx.tick()
+        ctx.set(dut.inc, 0)
+        await settle(ctx)
+        for i in range(count):
+            expected[i] += 3
+            assert await read(ctx, i) == expected[i]
+
+        # Random increments, interleaved with reads:
+        for _ in range(20):
+            inc = random.randrange(1 << count)
+            ctx.set(dut.inc, inc)
+            ctx.set(dut.read_en, random.randint(0, 1))
+            ctx.set(dut.read_addr, random.randrange(count))
+            for i in range(count):
+                if inc & (1 << i):
+                    expected[i] += 1
+            await ctx.tick()
+            ctx.set(dut.inc, 0)
+            ctx.set(dut.read_en, 0)
+            await settle(ctx)
+        for i in range(count):
+            assert await read(ctx, i) == expected[i]
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+
+
+def test_wide_counter():
+    dut = CounterBank(2, width=32)
+
+    async def bench(ctx):
+        for _ in range(300):
+            ctx.set(dut.inc, 0b10)
+            await ctx.tick()
+        ctx.set(dut.inc, 0)
+        await ctx.tick()
+        await ctx.tick()
+        ctx.set(dut.read_addr, 1)
+        ctx.set(dut.read_en, 1)
+        await ctx.tick()
+        # Past any 8-bit or 4-digit boundary:
+        assert ctx.get(dut.read_data) == 300
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+
+
+def test_increment_by_id():
+    count = 200
+    dut = CounterBank(count, width=32, inc_lines=0)
+    increments = [random.randrange(count) for _ in range(100)]
+
+    async def bench(ctx):
+        for i in increments:
+            ctx.set(dut.inc_id.payload, i)
+            ctx.set(dut.inc_id.valid, 1)
+            while True:
+                # Interleave reads, which take priority:
+                ctx.set(dut.read_en, random.randint(0, 1))
+                accepted = ctx.get(dut.inc_id.ready)
+                await ctx.tick()
+                if accepted:
+                    break
+        ctx.set(dut.inc_id.valid, 0)
+        ctx.set(dut.read_en, 0)
+        await ctx.tick()
+        await ctx.tick()
+
+        for i in set(increments):
+            ctx.set(dut.read_addr, i)
+            ctx.set(dut.read_en, 1)
+            await ctx.tick()
+            assert ctx.get(dut.read_data) == increments.count(i)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
@@ -0,0 +1,283 @@
+from amaranth import Module, Signal, Array, Const, unsigned
+from amaranth.lib.wiring import In, Out, Component, Signature
+from amaranth.lib import stream
+from amaranth.lib.data import ArrayLayout
+
+from .atoi import AtoI
+from .capitalizer import Capitalizer
+
+
+def field_attribute(name: str) -> str:
+    """
+    Name of the attribute for a header field, e.g.
+    "Content-Length" -> "content_length".
+    """
+    return name.lower().replace("-", "_")
+
+
+class HeaderExtractor(Component):
+    """
+    Extracts the values of a set of fields from the headers of an HTTP
+    request, in a single pass over the headers.
+
+    Consumes header lines up to and including the blank line that ends them.
+    Header names are matched case-insensitively, against all of the fields at
+    once: input is consumed at one byte per cycle, regardless of how many
+    fields are tracked.
+
+    Parameters
+    ----------
+    number_fields: dict[str, int]
+                   Names of fields with decimal values,
+                   mapped to the number of bits to capture.
+    text_fields:   dict[str, int]
+                   Names of fields with text values,
+                   mapped to the number of bytes to capture.
+
+    Attributes
+    ----------
+    input:    Stream(8), in
+              Data stream to match
+    reset:    Signal(1), in
+              Reset and await new input
+    done:     Signal(1), out
+              Indicates that the blank line ending the headers was seen.
+    fields:   Out(Signature), with an attribute per field, e.g.
+              "Content-Length" is at "fields.content_length".
+              Number fields have:
+                value:  Signal(bits), out
+                valid:  Signal(1), out
+                        High if the field was present and a valid number.
+                invalid: Signal(1), out
+                        High if the field was present, but not a valid
+                        number: empty, not all digits (whitespace within
+                        the value counts), too large for its bits,
+                        or repeated in the headers.
+              Text fields have:
+                value:  ArrayLayout(8, bytes), out
+                        The field's value, from its first occurrence;
+                        leading whitespace is skipped.
+                length: Signal(range(bytes + 1)), out
+                        Number of bytes in the value,
+                        without trailing whitespace.
+                valid:  Signal(1), out
+                        High if the field was present and its value fit.
+    """
+
+    def __init__(self, number_fields: dict[str, int] = {},
+                 text_fields: dict[str, int] = {}):
+        field_members = {}
+        for (name, bits) in number_fields.items():
+            field_members[field_attribute(name)] = Out(Signature({
+                "value": Out(bits),
+                "valid": Out(1),
+                "invalid": Out(1),
+            }))
+        for (name, size) in text_fields.items():
+            field_members[field_attribute(name)] = Out(Signature({
+                "value": Out(ArrayLayout(unsigned(8), size)),
+                "length": Out(range(size + 1)),
+                "valid": Out(1),
+            }))
+        assert len(field_members) == len(number_fields) + len(text_fields), (
+            "duplicate header field names")
+
+        super().__init__({
+            "input": In(stream.Signature(8)),
+            "reset": In(1),
+            "done": Out(1),
+            "fields": Out(Signature(field_members)),
+        })
+        self._number_fields = number_fields
+        self._text_fields = text_fields
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        names = [*self._number_fields.keys(), *self._text_fields.keys()]
+        max_name = max(len(name) for name in names)
+
+        # Case-normalized data:
+        m.submodules.capitalizer = capitalizer = Capitalizer()
+        c = Signal(8)
+        m.d.comb += [
+            capitalizer.input.eq(self.input.payload),
+            c.eq(capitalizer.output),
+        ]
+
+        # Position in the header name; saturates past the longest name.
+        name_idx = Signal(range(max_name + 2))
+        # Fields whose name matches the header name so far:
+        alive = Signal(len(names), init=(1 << len(names)) - 1)
+        # Fields whose name matched the whole header name:
+        hit = Signal(len(names))
+        # The field whose value is being captured (one-hot):
+        current = Signal(len(names))
+        # Fields which have been seen on a complete line:
+        seen = Signal(len(names))
+        # Fields which have been seen on more than one line:
+        repeated = Signal(len(names))
+
+        # Match state after the current byte of the name.
+        # All of the names are compared in parallel, against the same byte.
+        next_alive = Signal(len(names))
+        for i, name in enumerate(names):
+            name_chars = Array(Const(ord(x), 8) for x in name.upper())
+            m.d.comb += [
+                hit[i].eq(alive[i] & (name_idx == len(name))),
+                next_alive[i].eq(
+                    alive[i] & (name_idx < len(name))
+                    & (c == name_chars[name_idx])),
+            ]
+
+        # Capture of the value, for the current field:
+        is_space = (c == ord(' ')) | (c == ord('\t'))
+        capture = Signal(1)
+
+        for i, (name, bits) in enumerate(self._number_fields.items()):
+            field = getattr(self.fields, field_attribute(name))
+            number = m.submodules[f"number_{field_attribute(name)}"] = AtoI(bits)
+            digits = Signal(1)
+            # Whitespace after the digits; trailing, unless more follows.
+            spaced = Signal(1)
+            split = Signal(1)
+            m.d.comb += [
+                number.reset.eq(self.reset),
+                number.input.payload.eq(self.input.payload),
+                number.input.valid.eq(capture & current[i] & ~is_space),
+                field.value.eq(number.value),
+                field.invalid.eq(
+                    (seen[i] & (~digits | number.error | number.overflow | split))
+                    | repeated[i]),
+                field.valid.eq(seen[i] & ~field.invalid),
+            ]
+            with m.If(self.reset):
+                m.d.sync += [
+                    digits.eq(0),
+                    spaced.eq(0),
+                    split.eq(0),
+                ]
+            with m.Elif(number.input.valid):
+                m.d.sync += [
+                    digits.eq(1),
+                    split.eq(split | spaced),
+                ]
+            with m.Elif(capture & current[i]):
+                m.d.sync += spaced.eq(1)
+
+        for j, (name, size) in enumerate(self._text_fields.items()):
+            i = len(self._number_fields) + j
+            field = getattr(self.fields, field_attribute(name))
+            overflow = Signal(1)
+            # Bytes captured, including any trailing whitespace:
+            count = Signal(range(size + 1))
+            m.d.comb += field.valid.eq(seen[i] & ~overflow)
+            with m.If(self.reset):
+                m.d.sync += [
+                    field.length.eq(0),
+                    count.eq(0),
+                    overflow.eq(0),
+                ]
+            with m.Elif(capture & current[i] & ~repeated[i]):
+                with m.If(count < size):
+                    m.d.sync += [
+                        field.value[count].eq(self.input.payload),
+                        count.eq(count + 1),
+                    ]
+                # Whitespace only counts once something follows it.
+                with m.If(~is_space):
+                    with m.If(count < size):
+                        m.d.sync += field.length.eq(count + 1)
+                    with m.Else():
+                        m.d.sync += overflow.eq(1)
+
+        with m.FSM():
+            with m.State("name"):
+                m.next = "name"
+                m.d.comb += self.input.ready.eq(1)
+                with m.If(self.input.valid):
+                    with m.If(c == ord(':')):
+                        m.d.sync += [
+                            current.eq(hit),
+                            repeated.eq(repeated | (hit & seen)),
+                        ]
+                        m.next = "value_start"
+                    with m.Elif(c == ord('\r')):
+                        with m.If(name_idx == 0):
+                            # Blank line: end of headers.
+                            m.next = "end_lf"
+                        with m.Else():
+                            # Not a header line; ignore it.
+                            m.next = "skip_line"
+                    with m.Else():
+                        m.d.sync += alive.eq(next_alive)
+                        with m.If(name_idx <= max_name):
+                            m.d.sync += name_idx.eq(name_idx + 1)
+                with m.If(self.reset):
+                    m.next = "name"
+            with m.State("value_start"):
+                m.next = "value_start"
+                m.d.comb += self.input.ready.eq(1)
+                with m.If(self.input.valid):
+                    with m.If(c == ord('\r')):
+                        m.d.sync += seen.eq(seen | current)
+                        m.next = "skip_line"
+                    with m.Elif(~is_space):
+                        m.d.comb += capture.eq(1)
+                        m.next = "value"
+                with m.If(self.reset):
+                    m.next = "name"
+            with m.State("value"):
+                m.next = "value"
+                m.d.comb += self.input.ready.eq(1)
+                with m.If(self.input.valid):
+                    with m.If(c == ord('\r')):
+                        m.d.sync += seen.eq(seen | current)
+                        m.next = "skip_line"
+                    with m.Else():
+                        m.d.comb += capture.eq(1)
+                with m.If(self.reset):
+                    m.next = "name"
+            with m.State("skip_line"):
+                m.next = "skip_line"
+                m.d.comb += self.input.ready.eq(1)
+                with m.If(self.input.valid & (c == ord('\n'))):
+                    m.d.sync += [
+                        name_idx.eq(0),
+                        alive.eq(alive.init),
+                        current.eq(0),
+                    ]
+                    m.next = "name"
+                with m.If(self.reset):
+                    m.next = "name"
+            with m.State("end_lf"):
+                m.next = "end_lf"
+                m.d.comb += self.input.ready.eq(1)
+                # TODO: #4 - Should error if this isn't \n.
+                with m.If(self.input.valid):
+                    m.next = "done"
+                with m.If(self.reset):
+                    m.next = "name"
+            with m.State("done"):
+                m.next = "done"
+                m.d.comb += self.done.eq(1)
+                with m.If(self.reset):
+                    m.next = "name"
+
+        # Reset takes priority over everything above.
+        # (The state transition is in each state.)
+        with m.If(self.reset):
+            m.d.comb += [
+                self.input.ready.eq(0),
+                self.done.eq(0),
+                capture.eq(0),
+            ]
+            m.d.sync += [
+                name_idx.eq(0),
+                alive.eq(alive.init),
+                current.eq(0),
+                seen.eq(0),
+                repeated.eq(0),
+            ]
+
+        return m
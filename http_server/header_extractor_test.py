@@ -0,0 +1,302 @@
+from amaranth.sim import Simulator
+
+from .header_extractor import HeaderExtractor
+from stream_fixtures import StreamSender
+
+
+def make_extractor():
+    return HeaderExtractor(
+        number_fields={"Content-Length": 16},
+        text_fields={
+            "Connection": 10,
+            "If-None-Match": 16,
+            "Accept-Encoding": 16,
+            "Host": 16,
+        })
+
+
+def get_text(ctx, field) -> str:
+    length = ctx.get(field.length)
+    return bytes(ctx.get(field.value[i]) for i in range(length)).decode("ascii")
+
+
+def run_test(send_headers, check):
+    dut = make_extractor()
+    sender = StreamSender(stream=dut.input)
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    checked = False
+
+    async def driver(ctx):
+        nonlocal checked
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+
+        while not sender.done:
+            assert not ctx.get(dut.done)
+            await ctx.tick()
+        await ctx.tick()
+        check(ctx, dut)
+        checked = True
+
+    sim.add_testbench(driver)
+    sim.add_process(sender.send_passive(map(ord, send_headers)))
+
+    sim.run_until(0.001)
+    assert checked
+
+
+def test_content_length():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.value) == 1234
+
+    run_test("User-Agent: test-agent\r\n"
+             "Content-Length: 1234\r\n"
+             "Accept: */*\r\n"
+             "\r\n", check)
+
+
+def test_case_insensitive():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.value) == 8
+        assert ctx.get(dut.fields.host.valid)
+        # Values are captured as-is.
+        assert get_text(ctx, dut.fields.host) == "Fomu"
+
+    run_test("content-length:8\r\n"
+             "HOST: Fomu\r\n"
+             "\r\n", check)
+
+
+def test_all_fields():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.value) == 6
+        for (field, value) in [
+            (dut.fields.connection, "keep-alive"),
+            (dut.fields.if_none_match, '"abc123"'),
+            (dut.fields.accept_encoding, "gzip, identity"),
+            (dut.fields.host, "fomu.local"),
+        ]:
+            assert ctx.get(field.valid)
+            assert get_text(ctx, field) == value
+
+    run_test("Host: fomu.local\r\n"
+             "Connection: keep-alive\r\n"
+             "If-None-Match: \t\"abc123\"\r\n"
+             "Accept-Encoding: gzip, identity\r\n"
+             "Content-Length: 6\r\n"
+             "\r\n", check)
+
+
+def test_no_fields():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert not ctx.get(dut.fields.connection.valid)
+        assert not ctx.get(dut.fields.host.valid)
+
+    # Nearly-matching header names don't count.
+    run_test("Hos: test\r\n"
+             "Hostname: test\r\n"
+             "Content-Lengthy: 12\r\n"
+             "Content-Type: text/plain\r\n"
+             "Connect: close\r\n"
+             "\r\n", check)
+
+
+def test_no_headers():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert not ctx.get(dut.fields.host.valid)
+
+    run_test("\r\n", check)
+
+
+def test_bad_content_length():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.invalid)
+
+    run_test("Content-Length: 12ab\r\n"
+             "\r\n", check)
+
+
+def test_value_too_long():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.host.valid)
+        assert ctx.get(dut.fields.connection.valid)
+        assert get_text(ctx, dut.fields.connection) == "close"
+
+    run_test("Host: a-host-name-that-does-not-fit\r\n"
+             "Connection: close\r\n"
+             "\r\n", check)
+
+
+def test_one_byte_per_cycle():
+    headers = ("Host: fomu\r\n"
+               "Connection: close\r\n"
+               "X-Unknown: ignored\r\n"
+               "Content-Length: 12\r\n"
+               "\r\n")
+    dut = make_extractor()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    checked = False
+
+    async def driver(ctx):
+        nonlocal checked
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+
+        ctx.set(dut.input.valid, 1)
+        for c in headers:
+            ctx.set(dut.input.payload, ord(c))
+            assert ctx.get(dut.input.ready)
+            await ctx.tick()
+        ctx.set(dut.input.valid, 0)
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.fields.content_length.value) == 12
+        checked = True
+
+    sim.add_testbench(driver)
+    sim.run_until(0.001)
+    assert checked
+
+
+def test_stops_at_end_of_headers():
+    dut = make_extractor()
+    sender = StreamSender(stream=dut.input)
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    checked = False
+
+    async def driver(ctx):
+        nonlocal checked
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+
+        await ctx.tick().until(dut.done)
+        # The body is left in the stream.
+        for _ in range(10):
+            assert not ctx.get(dut.input.ready)
+            await ctx.tick()
+        assert ctx.get(dut.fields.content_length.value) == 3
+        assert get_text(ctx, dut.fields.host) == "one"
+        assert not sender.done
+
+        # Reset parses the next set of headers.
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        assert not ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert not ctx.get(dut.fields.host.valid)
+        await ctx.tick().until(dut.done)
+        assert ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.value) == 45
+        assert get_text(ctx, dut.fields.host) == "two"
+        checked = True
+
+    sim.add_testbench(driver)
+    sim.add_process(sender.send_passive(map(ord, (
+        "Host: one\r\nContent-Length: 3\r\n\r\n"
+        "Host: two\r\nContent-Length: 45\r\n\r\n"))))
+
+    sim.run_until(0.001)
+    assert checked
+
+
+def test_content_length_overflow():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.invalid)
+
+    # 65537 doesn't fit in 16 bits; it isn't taken as 1.
+    run_test("Content-Length: 65537\r\n"
+             "\r\n", check)
+
+
+def test_content_length_repeated():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.invalid)
+
+    # Not taken as 10, or as either value.
+    run_test("Content-Length: 1\r\n"
+             "Content-Length: 0\r\n"
+             "\r\n", check)
+
+
+def test_content_length_whitespace():
+    def check_split(ctx, dut):
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert ctx.get(dut.fields.content_length.invalid)
+
+    # Not taken as 12.
+    run_test("Content-Length: 1 2\r\n"
+             "\r\n", check_split)
+
+    def check_trailing(ctx, dut):
+        assert ctx.get(dut.fields.content_length.valid)
+        assert not ctx.get(dut.fields.content_length.invalid)
+        assert ctx.get(dut.fields.content_length.value) == 12
+
+    # Whitespace around the value is fine.
+    run_test("Content-Length:\t12 \t\r\n"
+             "\r\n", check_trailing)
+
+
+def test_content_length_absent_is_not_invalid():
+    def check(ctx, dut):
+        assert not ctx.get(dut.fields.content_length.valid)
+        assert not ctx.get(dut.fields.content_length.invalid)
+
+    run_test("Host: fomu\r\n"
+             "\r\n", check)
+
+
+def test_text_trailing_whitespace():
+    def check(ctx, dut):
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.fields.connection.valid)
+        assert get_text(ctx, dut.fields.connection) == "close"
+        assert ctx.get(dut.fields.host.valid)
+        assert get_text(ctx, dut.fields.host) == "a \tb"
+
+    run_test("Connection: close \r\n"
+             "Host: a \tb\t \r\n"
+             "\r\n", check)
+
+
+def test_text_trailing_whitespace_past_capacity():
+    def check(ctx, dut):
+        assert ctx.get(dut.fields.connection.valid)
+        assert get_text(ctx, dut.fields.connection) == "close"
+
+    # Past the field's 10 bytes, but only with whitespace.
+    run_test("Connection: close        \r\n"
+             "\r\n", check)
+
+
+def test_text_repeated_keeps_first():
+    def check(ctx, dut):
+        assert ctx.get(dut.fields.connection.valid)
+        assert get_text(ctx, dut.fields.connection) == "close"
+
+    run_test("Connection: close\r\n"
+             "Connection: keep-alive\r\n"
+             "\r\n", check)
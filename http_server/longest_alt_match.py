@@ -0,0 +1,154 @@
+from amaranth import Module, Signal, Array, Const
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+
+from .capitalizer import Capitalizer
+
+
+class LongestAltMatch(Component):
+    """
+    Match a number of alternative strings, up to a delimiter.
+
+    Unlike StringAltMatch, the match is only resolved at the delimiter, and
+    an alternative only matches if the input before the delimiter is exactly
+    that alternative; so alternatives may be prefixes of one another, e.g.
+    "/" | "/style.css" matches all of "/style.css".
+
+    All alternatives are compared at once, one byte per cycle; each byte
+    narrows the set of alternatives still alive. As soon as one alternative
+    is left, `decided` is high and `which` indicates it.
+
+    Parameters
+    ----------
+    alternatives: list[str]
+                  Strings to match. They must not contain delimiters.
+    delimiters:   str
+                  Characters that end the input to match.
+    match_case:   bool, default true
+                  Perform a case-sensitive match.
+                  Case folding is ASCII-only.
+
+    Attributes
+    ----------
+    input:      Stream(8), in
+                Data stream to match. The delimiter is consumed.
+    accepted:   Signal(1), out
+                High if the input up to the delimiter is an alternative.
+    rejected:   Signal(1), out
+                High if the input has been rejected (will never match).
+    decided:    Signal(1), out
+                High if at most one alternative may still match;
+                i.e. if accepted, it will be `which`.
+    which:      Signal(range(len(alternatives))), out
+                If decided, the index of the alternative that may match.
+    reset:      Signal(1), in
+                Reset and await new input.
+    """
+
+    def __init__(self, alternatives: list[str], delimiters: str = " ",
+                 match_case: bool = True):
+        if not match_case:
+            alternatives = [alt.upper() for alt in alternatives]
+        for alt in alternatives:
+            if any(d in alt for d in delimiters):
+                raise ValueError(f"alternative {alt!r} contains a delimiter")
+        if len(set(alternatives)) != len(alternatives):
+            raise ValueError("alternatives must be distinct")
+        super().__init__({
+            "input": In(stream.Signature(8)),
+            "accepted": Out(1),
+            "rejected": Out(1),
+            "decided": Out(1),
+            "which": Out(range(len(alternatives))),
+            "reset": In(1),
+        })
+        self._alternatives = alternatives
+        self._delimiters = delimiters
+        self._match_case = match_case
+
+    def elaborate(self, platform):
+        m = Module()
+
+        n = len(self._alternatives)
+        max_length = max(len(alt) for alt in self._alternatives)
+
+        # Case-normalized data:
+        c = Signal(8)
+        if self._match_case:
+            m.d.comb += c.eq(self.input.payload)
+        else:
+            m.submodules.capitalizer = capitalizer = Capitalizer()
+            m.d.comb += [
+                capitalizer.input.eq(self.input.payload),
+                c.eq(capitalizer.output),
+            ]
+
+        # Position in the input, and the alternatives that it still matches.
+        idx = Signal(range(max_length + 1))
+        alive = Signal(n, init=(1 << n) - 1)
+
+        # Alternatives that continue with this character,
+        # and alternatives that end before it.
+        continues = Signal(n)
+        complete = Signal(n)
+        for (i, alt) in enumerate(self._alternatives):
+            # Pad, so the index is always in range:
+            chars = Array(Const(ord(char), 8) for char in alt + "\0")
+            m.d.comb += [
+                continues[i].eq(alive[i] & (idx < len(alt)) & (c == chars[idx])),
+                complete[i].eq(alive[i] & (idx == len(alt))),
+            ]
+        delimiter = Signal(1)
+        m.d.comb += delimiter.eq(0)
+        for d in self._delimiters:
+            with m.If(c == ord(d)):
+                m.d.comb += delimiter.eq(1)
+
+        # Inline priority encoder:
+        first_alive = Signal(range(n))
+        for i in reversed(range(n)):
+            with m.If(alive[i]):
+                m.d.comb += first_alive.eq(i)
+        # Once accepted, only the accepted alternative is alive.
+        m.d.comb += [
+            self.which.eq(first_alive),
+            # At most one bit set:
+            self.decided.eq((alive & (alive - 1)) == 0),
+        ]
+
+        with m.If(self.reset):
+            m.d.sync += [
+                idx.eq(0),
+                alive.eq(alive.init),
+            ]
+
+        with m.FSM():
+            with m.State("matching"):
+                m.d.comb += self.input.ready.eq(~self.reset)
+                with m.If(self.input.valid & self.input.ready):
+                    with m.If(delimiter):
+                        # At most one alternative is complete at a time,
+                        # and it's alive; so it's `which`.
+                        with m.If(complete.any()):
+                            m.d.sync += alive.eq(complete)
+                            m.next = "accepted"
+                        with m.Else():
+                            m.d.sync += alive.eq(0)
+                            m.next = "rejected"
+                    with m.Else():
+                        m.d.sync += [
+                            alive.eq(continues),
+                            idx.eq(idx + 1),
+                        ]
+                        with m.If(~continues.any()):
+                            m.next = "rejected"
+            with m.State("accepted"):
+                m.d.comb += self.accepted.eq(1)
+                with m.If(self.reset):
+                    m.next = "matching"
+            with m.State("rejected"):
+                m.d.comb += self.rejected.eq(1)
+                with m.If(self.reset):
+                    m.next = "matching"
+
+        return m
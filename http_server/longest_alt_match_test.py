@@ -0,0 +1,123 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .longest_alt_match import LongestAltMatch
+
+
+def run_matches(dut, cases: list[tuple[str, int | None]]):
+    """
+    Runs each input sequence (and a delimiter) into the DUT,
+    and checks which alternative (if any) is accepted.
+    """
+
+    async def run_sequence(ctx, input: str):
+        """
+        Runs the input sequence into the DUT until accepted or rejected.
+
+        Returns which match if the input was accepted;
+        otherwise returns None.
+        """
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        ctx.set(dut.input.valid, 0)
+
+        assert ctx.get(dut.accepted) == 0
+        assert ctx.get(dut.rejected) == 0
+
+        input = input + " "
+        count = 0
+
+        while not (ctx.get(dut.accepted) or ctx.get(dut.rejected)):
+            assert count < len(input), "undecided after delimiter"
+            assert ctx.get(dut.input.ready)
+            valid = random.randint(0, 1)
+            ctx.set(dut.input.valid, valid)
+            ctx.set(dut.input.payload, ord(input[count]))
+            if valid:
+                count += 1
+            await ctx.tick()
+        ctx.set(dut.input.valid, 0)
+
+        # After matching-or-not, this is no longer "ready" for input.
+        assert not ctx.get(dut.input.ready)
+        if ctx.get(dut.accepted):
+            # The delimiter is consumed.
+            assert count == len(input)
+            return ctx.get(dut.which)
+        return None
+
+    async def bench(ctx):
+        for (input, want) in cases:
+            got = await run_sequence(ctx, input)
+            assert got == want, f"input {input!r}: got {got}, want {want}"
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+
+
+def test_prefix():
+    dut = LongestAltMatch(["/", "/style.css", "/style.css.map"])
+    run_matches(dut, [
+        ("/", 0),
+        ("/style.css", 1),
+        ("/style.css.map", 2),
+        ("/stone.css", None),
+        ("/style", None),
+        ("/style.cssx", None),
+        ("", None),
+    ])
+
+
+def test_case():
+    dut = LongestAltMatch(["GET", "POST", "PUT"], match_case=False)
+    run_matches(dut, [
+        ("get", 0),
+        ("Post", 1),
+        ("PUT", 2),
+        ("PATCH", None),
+        ("PUTS", None),
+    ])
+
+
+def test_delimiters():
+    dut = LongestAltMatch(["HTTP/1.0", "HTTP/1.1"], delimiters="\r ")
+    run_matches(dut, [
+        ("HTTP/1.0", 0),
+        ("HTTP/1.1", 1),
+        ("HTTP/1.", None),
+    ])
+
+    try:
+        LongestAltMatch(["a b"])
+        assert False, "accepted an alternative containing a delimiter"
+    except ValueError:
+        pass
+
+
+def test_decided_early():
+    """
+    `which` is reported as soon as one alternative is left,
+    before the delimiter.
+    """
+    dut = LongestAltMatch(["/", "/led", "/style.css"])
+
+    async def bench(ctx):
+        ctx.set(dut.input.valid, 1)
+        decided = []
+        for char in "/st":
+            decided += [(ctx.get(dut.decided), ctx.get(dut.which))]
+            ctx.set(dut.input.payload, ord(char))
+            await ctx.tick()
+        decided += [(ctx.get(dut.decided), ctx.get(dut.which))]
+        assert decided == [(0, 0), (0, 0), (1, 2), (1, 2)], decided
+        assert not ctx.get(dut.accepted)
+        assert not ctx.get(dut.rejected)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
@@ -0,0 +1,167 @@
+from amaranth import Module, Signal, Const
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+
+from .counter_bank import CounterBank
+from .response_formatter import ResponseFormatter, Literal, Stat
+
+
+class MetricsBody(Component):
+    """
+    Measures the latency of sessions; when activated, prints histograms of
+    the latencies in the Prometheus text format.
+
+    Two latencies are measured for each session, in cycles since `start`:
+    until the first byte of the response (`first_byte`), and until the end of
+    the session (`end`). Each is counted in a histogram for the session's
+    series, with power-of-two bucket bounds.
+
+    Parameters
+    ----------
+    labels:  list[str]
+             Prometheus labels for each series, e.g. 'route="/led",status="200"'.
+    buckets: list[int]
+             log2 of the upper bound of each bucket, in cycles; ascending.
+             A final "+Inf" bucket is added.
+
+    Attributes
+    ----------
+    start:      Signal(1), in
+                Pulse when a session starts.
+    first_byte: Signal(1), in
+                Pulse when the first byte of the session's response is sent.
+    end:        Signal(1), in
+                Pulse when the session ends.
+    series:     Signal(range(len(labels))), in
+                Series of the session; sampled with `first_byte`.
+
+    output:     Stream(8), out
+                The data stream to write the message to.
+    en:         Signal(1), in
+                One-shot trigger; start writing the message to output.
+    done:       Signal(1), out
+                High when inactive, i.e. writing is done.
+    """
+
+    METRICS = ["http_first_byte_cycles", "http_session_cycles"]
+
+    def __init__(self, labels, buckets=[8, 10, 12, 14, 16, 18, 20]):
+        super().__init__({
+            "start": In(1),
+            "first_byte": In(1),
+            "end": In(1),
+            "series": In(range(len(labels))),
+            "output": Out(stream.Signature(8)),
+            "en": In(1),
+            "done": Out(1, init=1),
+        })
+        self._labels = labels
+        self._buckets = buckets
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Including +Inf:
+        n_buckets = len(self._buckets) + 1
+        n_series = len(self._labels)
+
+        def stat_id(metric, series, bucket):
+            return (metric * n_series + series) * n_buckets + bucket
+
+        n_stats = stat_id(len(self.METRICS), 0, 0)
+
+        program = []
+        for (metric, name) in enumerate(self.METRICS):
+            program.append(Literal(f"# TYPE {name} histogram\n"))
+            for (series, labels) in enumerate(self._labels):
+                for bucket in range(n_buckets):
+                    le = (str(1 << self._buckets[bucket])
+                          if bucket < len(self._buckets) else "+Inf")
+                    program += [
+                        Literal(f"{name}_bucket{{"), Literal(labels),
+                        Literal(f',le="{le}"}} '),
+                        Stat(stat_id(metric, series, bucket)), Literal("\n"),
+                    ]
+                # The count is the same as the +Inf bucket.
+                program += [
+                    Literal(f"{name}_count{{"), Literal(labels), Literal("} "),
+                    Stat(stat_id(metric, series, n_buckets - 1)), Literal("\n"),
+                ]
+
+        m.submodules.stats = stats = CounterBank(n_stats, inc_lines=0)
+        m.submodules.formatter = formatter = ResponseFormatter(
+            program, stats=n_stats)
+        m.d.comb += [
+            stats.read_en.eq(formatter.stat_read.en),
+            stats.read_addr.eq(formatter.stat_read.addr),
+            formatter.stat_read.data.eq(stats.read_data),
+
+            self.done.eq(formatter.done),
+            self.output.payload.eq(formatter.output.payload),
+            self.output.valid.eq(formatter.output.valid),
+            formatter.output.ready.eq(self.output.ready),
+            formatter.en.eq(self.en),
+        ]
+
+        # Cycles since the start of the session;
+        # saturates past the last bucket.
+        saturate = (1 << self._buckets[-1]) + 1
+        cycles = Signal(range(saturate + 1))
+        with m.If(self.start):
+            m.d.sync += cycles.eq(1)
+        with m.Elif(cycles != saturate):
+            m.d.sync += cycles.eq(cycles + 1)
+
+        # Bucket of the current latency:
+        bucket = Signal(range(n_buckets))
+        m.d.comb += bucket.eq(n_buckets - 1)
+        for (i, bound) in reversed(list(enumerate(self._buckets))):
+            with m.If(cycles <= (1 << bound)):
+                m.d.comb += bucket.eq(i)
+
+        # Observations waiting to be recorded, one per metric.
+        # Recording an observation increments its bucket and every bucket
+        # above it, since Prometheus buckets are cumulative.
+        series = Signal(range(n_series))
+        pending = Signal(len(self.METRICS))
+        next_stat = [Signal(range(n_stats), name=f"next_stat_{metric}")
+                     for metric in range(len(self.METRICS))]
+        last_stat = [Signal(range(n_stats), name=f"last_stat_{metric}")
+                     for metric in range(len(self.METRICS))]
+        observe = [self.first_byte, self.end]
+        for (metric, observed) in enumerate(observe):
+            # The series is sampled with the first byte;
+            # later observations use the sampled value.
+            observed_series = series if metric > 0 else self.series
+            base = Signal(range(n_stats), name=f"base_{metric}")
+            m.d.comb += base.eq(
+                Const(stat_id(metric, 0, 0)) + observed_series * n_buckets)
+            with m.If(observed):
+                m.d.sync += [
+                    pending[metric].eq(1),
+                    next_stat[metric].eq(base + bucket),
+                    last_stat[metric].eq(base + n_buckets - 1),
+                ]
+        with m.If(self.first_byte):
+            m.d.sync += series.eq(self.series)
+
+        # Record one metric's observation at a time.
+        recording = Signal(range(len(self.METRICS)))
+        with m.If(pending[0]):
+            m.d.comb += recording.eq(0)
+        with m.Else():
+            m.d.comb += recording.eq(1)
+        for metric in range(len(self.METRICS)):
+            with m.If(recording == metric):
+                m.d.comb += [
+                    stats.inc_id.payload.eq(next_stat[metric]),
+                    stats.inc_id.valid.eq(pending[metric]),
+                ]
+                with m.If(stats.inc_id.valid & stats.inc_id.ready
+                          & ~observe[metric]):
+                    with m.If(next_stat[metric] == last_stat[metric]):
+                        m.d.sync += pending[metric].eq(0)
+                    with m.Else():
+                        m.d.sync += next_stat[metric].eq(next_stat[metric] + 1)
+
+        return m
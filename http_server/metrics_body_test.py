@@ -0,0 +1,64 @@
+from amaranth.sim import Simulator
+
+from .metrics_body import MetricsBody
+from stream_fixtures import StreamCollector
+
+def test_metrics_body():
+    dut = MetricsBody(['route="/a"', 'route="/b"'], buckets=[2, 4])
+    expected = "".join([
+        "# TYPE http_first_byte_cycles histogram\n",
+        'http_first_byte_cycles_bucket{route="/a",le="4"} 0\n',
+        'http_first_byte_cycles_bucket{route="/a",le="16"} 0\n',
+        'http_first_byte_cycles_bucket{route="/a",le="+Inf"} 0\n',
+        'http_first_byte_cycles_count{route="/a"} 0\n',
+        'http_first_byte_cycles_bucket{route="/b",le="4"} 1\n',
+        'http_first_byte_cycles_bucket{route="/b",le="16"} 2\n',
+        'http_first_byte_cycles_bucket{route="/b",le="+Inf"} 2\n',
+        'http_first_byte_cycles_count{route="/b"} 2\n',
+        "# TYPE http_session_cycles histogram\n",
+        'http_session_cycles_bucket{route="/a",le="4"} 0\n',
+        'http_session_cycles_bucket{route="/a",le="16"} 0\n',
+        'http_session_cycles_bucket{route="/a",le="+Inf"} 0\n',
+        'http_session_cycles_count{route="/a"} 0\n',
+        'http_session_cycles_bucket{route="/b",le="4"} 0\n',
+        'http_session_cycles_bucket{route="/b",le="16"} 1\n',
+        'http_session_cycles_bucket{route="/b",le="+Inf"} 2\n',
+        'http_session_cycles_count{route="/b"} 2\n',
+    ])
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    collector = StreamCollector(stream=dut.output)
+    sim.add_process(collector.collect())
+
+    async def pulse(ctx, signal):
+        ctx.set(signal, 1)
+        await ctx.tick()
+        ctx.set(signal, 0)
+
+    async def session(ctx, first_byte, end):
+        await pulse(ctx, dut.start)
+        await ctx.tick().repeat(first_byte)
+        await pulse(ctx, dut.first_byte)
+        await ctx.tick().repeat(end)
+        await pulse(ctx, dut.end)
+        await ctx.tick().repeat(10)
+
+    async def driver(ctx):
+        ctx.set(dut.series, 1)
+        # First byte within 4 cycles, end within 16:
+        await session(ctx, 1, 8)
+        # First byte within 16 cycles, end after more than 16:
+        await session(ctx, 8, 20)
+
+        ctx.set(dut.en, 1)
+        await ctx.tick()
+        ctx.set(dut.en, 0)
+        while ctx.get(dut.done) != 0:
+            await ctx.tick()
+
+    sim.add_testbench(driver)
+    sim.run_until(0.002)
+
+    collector.assert_eq(expected)
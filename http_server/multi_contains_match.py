@@ -0,0 +1,178 @@
+from amaranth import Module, Signal, Const, Cat, Mux, unsigned
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+from amaranth.lib import memory
+from amaranth.utils import ceil_log2
+
+from .capitalizer import Capitalizer
+
+
+def compile_patterns(patterns: list[str]):
+    """
+    Compiles patterns into an Aho-Corasick automaton, as a DFA.
+
+    Characters that appear in no pattern are all equivalent, so the DFA runs
+    on character classes: class 0 for "any other character", and one class
+    for each character that appears in a pattern.
+
+    Returns
+    -------
+    classes:     dict[int, int]
+                 Class of each character that appears in a pattern.
+    transitions: list[list[int]]
+                 Next state, by state and class. State 0 is the start state.
+    outputs:     list[int]
+                 Bitmask of the patterns that end on entering each state.
+    """
+    classes = {}
+    for pattern in patterns:
+        for char in pattern:
+            classes.setdefault(ord(char), len(classes) + 1)
+    n_classes = len(classes) + 1
+
+    # Trie:
+    goto = [{}]
+    outputs = [0]
+    for (i, pattern) in enumerate(patterns):
+        state = 0
+        for char in pattern:
+            cls = classes[ord(char)]
+            if cls not in goto[state]:
+                goto.append({})
+                outputs.append(0)
+                goto[state][cls] = len(goto) - 1
+            state = goto[state][cls]
+        outputs[state] |= 1 << i
+
+    # Breadth-first, so each state's failure state is complete before it.
+    transitions = [[0] * n_classes for _ in goto]
+    fail = [0] * len(goto)
+    queue = []
+    for cls in range(n_classes):
+        if cls in goto[0]:
+            transitions[0][cls] = goto[0][cls]
+            queue.append(goto[0][cls])
+    while queue:
+        state = queue.pop(0)
+        outputs[state] |= outputs[fail[state]]
+        for cls in range(n_classes):
+            if cls in goto[state]:
+                child = goto[state][cls]
+                fail[child] = transitions[fail[state]][cls]
+                transitions[state][cls] = child
+                queue.append(child)
+            else:
+                transitions[state][cls] = transitions[fail[state]][cls]
+
+    return (classes, transitions, outputs)
+
+
+class MultiContainsMatch(Component):
+    """
+    Matches a set of literal strings in a stream.
+
+    Looks to see which of the strings the stream contains, even if it doesn't
+    start with them: like StringContainsMatch, for many strings at once.
+
+    The strings are compiled into a single Aho-Corasick automaton, with its
+    state table in a memory; so the cost is that of the state table, rather
+    than of a shift register and comparators per string. Consumes one byte per
+    cycle.
+
+    Parameters
+    ----------
+    patterns:   list[str]
+                Strings to match.
+    match_case: bool, default true
+                Perform a case-sensitive match.
+                Case folding is ASCII-only.
+
+    Attributes
+    ----------
+    input:      Stream(8), in
+                Data stream to match.
+    reset:      Signal(1), in
+                Reset and await new input.
+    matches:    Signal(len(patterns)), out
+                Patterns that end with the most recently consumed byte;
+                valid the cycle after it is consumed, until the next byte.
+    accepted:   Signal(len(patterns)), out
+                Patterns that have been matched since reset.
+    """
+
+    def __init__(self, patterns: list[str], match_case: bool = True):
+        if len(patterns) == 0 or not all(patterns):
+            raise ValueError("patterns must be non-empty strings")
+        super().__init__({
+            "input": In(stream.Signature(8)),
+            "reset": In(1),
+            "matches": Out(len(patterns)),
+            "accepted": Out(len(patterns)),
+        })
+        if not match_case:
+            patterns = [pattern.upper() for pattern in patterns]
+        (self._classes, self._transitions, self._outputs) = compile_patterns(patterns)
+        self._match_case = match_case
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        n_states = len(self._transitions)
+        n_classes = len(self._classes) + 1
+        class_bits = max(ceil_log2(n_classes), 1)
+        state_bits = max(ceil_log2(n_states), 1)
+
+        # Case-normalized data:
+        c = Signal(8)
+        if self._match_case:
+            m.d.comb += c.eq(self.input.payload)
+        else:
+            m.submodules.capitalizer = capitalizer = Capitalizer()
+            m.d.comb += [
+                    capitalizer.input.eq(self.input.payload),
+                    c.eq(capitalizer.output),
+            ]
+
+        char_class = Signal(class_bits)
+        with m.Switch(c):
+            for (char, cls) in self._classes.items():
+                with m.Case(char):
+                    m.d.comb += char_class.eq(cls)
+
+        # State table, addressed by {state, class}.
+        init = []
+        for state in range(n_states):
+            init += self._transitions[state] + [0] * ((1 << class_bits) - n_classes)
+        m.submodules.table = table = memory.Memory(
+            shape=unsigned(state_bits), depth=len(init), init=init)
+        step = table.read_port()
+
+        # The read port's data register holds the current state.
+        # It can't be reset, so hold the state at 0 until the first byte.
+        restart = Signal(1, init=1)
+        state = Signal(state_bits)
+        m.d.comb += [
+            state.eq(Mux(restart, Const(0), step.data)),
+            self.input.ready.eq(~self.reset),
+            step.addr.eq(Cat(char_class, state)),
+            step.en.eq(self.input.valid & self.input.ready),
+        ]
+        with m.If(self.reset):
+            m.d.sync += restart.eq(1)
+        with m.Elif(step.en):
+            m.d.sync += restart.eq(0)
+
+        with m.Switch(state):
+            for (s, mask) in enumerate(self._outputs):
+                if mask != 0:
+                    with m.Case(s):
+                        m.d.comb += self.matches.eq(mask)
+
+        latched = Signal(len(self.accepted))
+        m.d.comb += self.accepted.eq(latched | self.matches)
+        with m.If(self.reset):
+            m.d.sync += latched.eq(0)
+        with m.Else():
+            m.d.sync += latched.eq(self.accepted)
+
+        return m
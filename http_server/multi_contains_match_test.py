@@ -0,0 +1,121 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .multi_contains_match import MultiContainsMatch, compile_patterns
+
+
+def reference_matches(patterns, text):
+    """
+    Patterns ending at each position of text.
+    """
+    return [
+        sum(1 << i for (i, p) in enumerate(patterns) if text[:end].endswith(p))
+        for end in range(1, len(text) + 1)
+    ]
+
+
+def run_match(dut, text, stall=False):
+    """
+    Feed text into dut, and return the `matches` after each byte
+    and the final `accepted`.
+    """
+    result = {}
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    async def driver(ctx):
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        assert ctx.get(dut.accepted) == 0
+
+        matches = []
+        for char in text:
+            if stall and random.randint(0, 1):
+                await ctx.tick()
+            ctx.set(dut.input.payload, ord(char))
+            ctx.set(dut.input.valid, 1)
+            assert ctx.get(dut.input.ready)
+            await ctx.tick()
+            ctx.set(dut.input.valid, 0)
+            matches.append(ctx.get(dut.matches))
+        result["matches"] = matches
+        result["accepted"] = ctx.get(dut.accepted)
+
+    sim.add_testbench(driver)
+    sim.run()
+    return (result["matches"], result["accepted"])
+
+
+def test_compile():
+    (classes, transitions, outputs) = compile_patterns(["he", "she", "his", "hers"])
+    # Start state, plus one per trie node:
+    assert len(transitions) == 10
+    assert len(classes) == 5
+    # "she" also ends "he":
+    state = 0
+    for char in "she":
+        state = transitions[state][classes[ord(char)]]
+    assert outputs[state] == 0b0011
+
+
+def test_overlapping_patterns():
+    patterns = ["he", "she", "his", "hers"]
+    dut = MultiContainsMatch(patterns)
+    text = "ushers"
+    (matches, accepted) = run_match(dut, text)
+    assert matches == reference_matches(patterns, text)
+    assert accepted == 0b1011
+
+
+def test_random_text():
+    random.seed(37)
+    patterns = ["GET", "POST", "/led", "/count", "/coffee", "HTTP/1.0", "ET /"]
+    alphabet = "GETPOS /ledcountfHTP1.0x"
+    dut = MultiContainsMatch(patterns)
+    text = "".join(random.choice(alphabet) for _ in range(300))
+    text += "GET /coffee HTTP/1.0"
+    (matches, accepted) = run_match(dut, text, stall=True)
+    expected = reference_matches(patterns, text)
+    assert matches == expected
+    accepted_any = 0
+    for mask in expected:
+        accepted_any |= mask
+    assert accepted == accepted_any
+
+
+def test_case_insensitive():
+    dut = MultiContainsMatch(["Content-Length", "connection"], match_case=False)
+    (_, accepted) = run_match(dut, "CONNECTION: close\r\ncontent-length: 3")
+    assert accepted == 0b11
+
+
+def test_reset():
+    dut = MultiContainsMatch(["ab"])
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    async def send(ctx, char):
+        ctx.set(dut.input.payload, ord(char))
+        ctx.set(dut.input.valid, 1)
+        await ctx.tick()
+        ctx.set(dut.input.valid, 0)
+
+    async def driver(ctx):
+        await send(ctx, "a")
+        await send(ctx, "b")
+        assert ctx.get(dut.accepted) == 1
+
+        # Reset clears the partial match, as well as the accepted flags.
+        await send(ctx, "a")
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        assert ctx.get(dut.accepted) == 0
+        await send(ctx, "b")
+        assert ctx.get(dut.accepted) == 0
+        assert ctx.get(dut.matches) == 0
+
+    sim.add_testbench(driver)
+    sim.run()
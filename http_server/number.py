@@ -1,17 +1,24 @@
-from amaranth import Module, Signal, unsigned, Const, Assert
+from amaranth import Module, Signal, unsigned, Const, Assert, Cat, Mux
 from amaranth.lib.wiring import In, Out, Component
 from amaranth.lib import stream
-from amaranth.lib import memory
+from amaranth.lib.data import ArrayLayout
 
 
 class Number(Component):
     """
     When activated, ASCII-prints an unsigned integer to its output.
 
+    The number is converted to decimal with the double-dabble
+    (shift-and-add-3) algorithm, one bit per cycle; so converting takes
+    `width` cycles, but only needs a small adder per decimal digit.
+
     Parameters
     ----------
-    width:  int
-            Width of the number in bits.
+    width:       int
+                 Width of the number in bits.
+    fixed_width: bool
+                 If true, print leading zeros, so every number has the same
+                 number of digits. Otherwise, print no leading zeros.
 
     Attributes
     ----------
@@ -26,7 +33,7 @@ class Number(Component):
     """
     # TODO: Make "output, en, done" a Signature.
 
-    def __init__(self, width):
+    def __init__(self, width, fixed_width=False):
         super().__init__({
             "input": In(width),
             "output": Out(stream.Signature(unsigned(8))),
@@ -34,41 +41,46 @@ class Number(Component):
             "done": Out(1, init=1),
         })
         self._width = width
+        self._fixed_width = fixed_width
+
+    @staticmethod
+    def digits(width):
+        """
+        Number of decimal digits needed for an unsigned number of `width` bits.
+        """
+        return max(len(str((1 << width) - 1)), 1)
 
     def elaborate(self, platform):
         m = Module()
 
-        # For a value up to (2**width)-1, we may need up to
-        #   log10((2**width)-1)
-        # digits.
-        # Wikipedia reminds us:
-        #   log_b(x**d) == d log_b(x)
-        # In this case:
-        #   log_10(2**w) == w * log_10(2)
-        import math
-        max_chars = math.ceil(self._width * math.log10(2)) + 1
-        # We add 1 for "safety" (in case I messed up the math there).
+        digits = self.digits(self._width)
 
         # Internal signals:
-        accumulator = Signal(self._width)
-        mod10 = Signal(self._width)
-        div10 = Signal(self._width)
-        m.d.comb += [
-            mod10.eq(accumulator % Const(10)),
-            div10.eq(accumulator // Const(10)),
-        ]
-        count = Signal(math.ceil(math.log2(max_chars)) + 1)
+        # The binary number, shifted out MSB-first:
+        binary = Signal(self._width)
+        # The BCD number, shifted in LSB-first:
+        bcd = Signal(ArrayLayout(unsigned(4), digits))
+        # Bits left to convert:
+        bits = Signal(range(self._width + 1))
+        # Digit to print:
+        count = Signal(range(digits))
+
+        # Add 3 to each digit that's 5 or more,
+        # so that it carries into the next digit when shifted.
+        adjusted = Signal(ArrayLayout(unsigned(4), digits))
+        for i in range(digits):
+            m.d.comb += adjusted[i].eq(
+                Mux(bcd[i] >= 5, bcd[i] + 3, bcd[i]))
 
-        m.submodules.buffer = buffer = memory.Memory(
-            shape=unsigned(8), depth=max_chars, init=[])
-        write = buffer.write_port()
-        read = buffer.read_port(domain="comb")
+        # Most significant nonzero digit (or zero):
+        first = Signal(range(digits))
+        for i in range(digits):
+            with m.If(bcd[i] != 0):
+                m.d.comb += first.eq(i)
 
         m.d.comb += [
-            write.data.eq(mod10),
-            write.addr.eq(count),
-            write.en.eq(Const(0)),
             self.output.valid.eq(Const(0)),
+            self.output.payload.eq(bcd[count] + Const(ord('0'))),
         ]
 
         m.d.sync += [
@@ -78,47 +90,34 @@ class Number(Component):
         with m.FSM():
             with m.State("idle"):
                 with m.If(self.en):
-                    # At the next clock edge (transition to decimate),
+                    # At the next clock edge (transition to convert),
+                    # latch the input.
                     m.d.sync += [
-                        Assert(count == 0, "at idle count is not zero"),
-                        # Latch the input into the accumulator:
-                        accumulator.eq(self.input),
+                        binary.eq(self.input),
+                        bcd.eq(0),
+                        bits.eq(self._width),
                     ]
-                    m.next = "decimate"
+                    m.next = "convert"
                 with m.Else():
                     m.next = "idle"
                     m.d.sync += [
                         self.done.eq(Const(1)),
                     ]
-            with m.State("decimate"):
-                # Store one digit in memory.
-                # We latched the most recent value into the accumulator,
-                # so the mod10 signal is equal to "the current digit"
-                # at the end of this cycle.
-                # Store that digit.
-                # The write port is synchronous to "sync",
-                # so we can use .comb here.
-                m.d.comb += [write.en.eq(Const(1)), ]
-
-                with m.If(div10 != 0):
-                    # We have more digits to process.
+            with m.State("convert"):
+                with m.If(bits != 0):
+                    # Shift one bit from the binary number into the BCD number.
                     m.d.sync += [
-                        accumulator.eq(div10),
-                        count.eq(count + 1),
+                        binary.eq(binary << 1),
+                        bcd.eq(Cat(binary[-1], adjusted.as_value())),
+                        bits.eq(bits - 1),
                     ]
-                    m.next = "decimate"
+                    m.next = "convert"
                 with m.Else():
+                    m.d.sync += count.eq(
+                        Const(digits - 1) if self._fixed_width else first)
                     m.next = "print"
             with m.State("print"):
-                # Read one digit from memory into the output stream.
-                # The read port is asynchronous;
-                # but the output stream is synchronous to the sync domain.
-                # So we set up all the reads combinatorially here.
-                m.d.comb += [
-                    read.addr.eq(count),
-                    self.output.payload.eq(read.data + Const(ord('0'))),
-                    self.output.valid.eq(Const(1)),
-                ]
+                m.d.comb += self.output.valid.eq(Const(1))
 
                 # Decrement count, on the next clock cycle,
                 # if we are able to consume this cycle.
@@ -79,3 +79,43 @@ def test_number():
     sim.add_testbench(bench)
 
     sim.run()
+
+
+def collect_number(dut, values):
+    """
+    Prints each of the values with the dut; returns the printed strings.
+    """
+    outputs = []
+
+    async def bench(ctx):
+        ctx.set(dut.output.ready, 1)
+        for i in values:
+            assert ctx.get(dut.done)
+            ctx.set(dut.input, i)
+            ctx.set(dut.en, 1)
+            await ctx.tick()
+            ctx.set(dut.en, 0)
+            buf = ""
+            while not ctx.get(dut.done):
+                if ctx.get(dut.output.valid):
+                    buf += chr(ctx.get(dut.output.payload))
+                await ctx.tick()
+            outputs.append(buf)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+    return outputs
+
+
+def test_number_32():
+    values = [0, 1, 10, 99, 100, 0xffffffff] + [
+        random.randrange(1 << 32) for _ in range(20)]
+    assert collect_number(Number(32), values) == [str(i) for i in values]
+
+
+def test_number_fixed_width():
+    values = [0, 7, 1234, 0xffff]
+    assert collect_number(Number(16, fixed_width=True), values) == [
+        f"{i:05}" for i in values]
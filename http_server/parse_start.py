@@ -1,9 +1,8 @@
-from amaranth import Module
+from amaranth import Module, Signal
 from amaranth.lib.wiring import In, Out, Component
 from amaranth.lib import stream
 
-from .string_contains_match import StringContainsMatch
-import stream_utils
+from .multi_contains_match import MultiContainsMatch
 
 
 class ParseStart(Component):
@@ -56,89 +55,81 @@ class ParseStart(Component):
     def elaborate(self, _platform):
         m = Module()
 
-        resets = []
-
-        # TODO: #4 - Evaluate using StringMatch instead of StringContainsMatch. Here and below.
-        #            Check https://en.wikipedia.org/wiki/HTTP_request_smuggling cases.
-        method_stream = stream.Signature(8).create()
-        get_matcher = m.submodules.get_matcher = StringContainsMatch("GET")
-        resets.append(get_matcher.reset)
-        m.d.comb += self.method[self.METHOD_GET].eq(get_matcher.accepted)
-
-        post_matcher = m.submodules.post_matcher = StringContainsMatch("POST")
-        resets.append(post_matcher.reset)
-        m.d.comb += self.method[self.METHOD_POST].eq(post_matcher.accepted)
-
-        brew_matcher = m.submodules.brew_matcher = StringContainsMatch("BREW")
-        resets.append(brew_matcher.reset)
-        m.d.comb += self.method[self.METHOD_BREW].eq(brew_matcher.accepted)
-
-        any_method_match = stream_utils.tree_or(
-            m, [get_matcher.accepted, post_matcher.accepted, brew_matcher.accepted])
-        m.d.comb += self.method[0].eq(~any_method_match)
-
-        stream_utils.fanout_stream(
-            m, method_stream, [get_matcher.input, post_matcher.input, brew_matcher.input])
-
-        path_stream = stream.Signature(8).create()
-        path_streams = []
-        path_match = []
-        for i, path in enumerate(self._paths):
-            matcher = m.submodules[f"path_matchers_{i}"] = StringContainsMatch(
-                path)
-            path_streams.append(matcher.input)
-            resets.append(matcher.reset)
-            m.d.comb += self.path[i+1].eq(matcher.accepted)
-            path_match.append(matcher.accepted)
-        stream_utils.fanout_stream(m, path_stream, path_streams)
-        any_path_match = stream_utils.tree_or(m, path_match)
-        m.d.comb += self.path[0].eq(~any_path_match)
-
+        # TODO: #4 - Evaluate matching at the start of each field, rather than
+        #            anywhere in it. Check
+        #            https://en.wikipedia.org/wiki/HTTP_request_smuggling cases.
         # TODO: #4 - If we want to get out of the stone age, should match more than HTTP/1.0
         #            That being said, silicon is kind of like a stone, right?
-        protocol_match = m.submodules.protocol_match = StringContainsMatch(
-            "HTTP/1.0")
-        m.d.comb += self.protocol[self.PROTOCOL_NO_MATCH].eq(
-            ~protocol_match.accepted)
-        m.d.comb += self.protocol[self.PROTOCOL_HTTP1_0].eq(
-            protocol_match.accepted)
+        # All of the fields' patterns share one matcher. None of the patterns
+        # contain a space, so no match spans fields; so a field's matches are
+        # those seen while matching it.
+        methods = ["GET", "POST", "BREW"]
+        protocols = ["HTTP/1.0"]
+        for path in self._paths:
+            if " " in path:
+                raise ValueError(f"path {path!r} contains a space")
+        matcher = m.submodules.matcher = MultiContainsMatch(
+            methods + self._paths + protocols)
+        resets = [matcher.reset]
+
+        def field(offset, patterns):
+            # Matches of this field's patterns, and a register of the ones
+            # seen while matching the field.
+            matches = matcher.matches[offset:offset + len(patterns)]
+            seen = Signal(len(patterns))
+            return (matches, seen)
+        (method_matches, method_seen) = field(0, methods)
+        (path_matches, path_seen) = field(len(methods), self._paths)
+        (protocol_matches, protocol_seen) = field(
+            len(methods) + len(self._paths), protocols)
+
+        # Fields' outputs are offset by one, for the "no match" bit:
+        m.d.comb += [
+            self.method[1:].eq(method_seen),
+            self.method[self.METHOD_NO_MATCH].eq(~method_seen.any()),
+            self.path[1:].eq(path_seen),
+            self.path[0].eq(~path_seen.any()),
+            self.protocol[1:].eq(protocol_seen),
+            self.protocol[self.PROTOCOL_NO_MATCH].eq(~protocol_seen.any()),
+        ]
+
+        def match(seen, matches):
+            # Forward input to the matcher, and collect its matches.
+            m.d.comb += [
+                matcher.input.valid.eq(self.input.valid),
+                matcher.input.payload.eq(self.input.payload),
+                self.input.ready.eq(matcher.input.ready),
+            ]
+            m.d.sync += seen.eq(seen | matches)
 
         with m.FSM():
             with m.State("reset"):
                 for r in resets:
                     m.d.sync += r.eq(1)
-                m.d.sync += self.done.eq(0)
+                m.d.sync += [
+                    self.done.eq(0),
+                    method_seen.eq(0),
+                    path_seen.eq(0),
+                    protocol_seen.eq(0),
+                ]
                 m.next = "match_method"
             with m.State("match_method"):
                 m.next = "match_method"
                 for r in resets:
                     m.d.sync += r.eq(0)
-                m.d.comb += [
-                    method_stream.valid.eq(self.input.valid),
-                    method_stream.payload.eq(self.input.payload),
-                    self.input.ready.eq(method_stream.ready),
-                ]
+                match(method_seen, method_matches)
                 with m.If(self.input.valid & (self.input.payload == ord(' '))):
                     m.d.comb += self.input.ready.eq(1)
                     m.next = "match_path"
             with m.State("match_path"):
                 m.next = "match_path"
-                m.d.comb += [
-                    path_stream.valid.eq(self.input.valid),
-                    path_stream.payload.eq(self.input.payload),
-                    self.input.ready.eq(path_stream.ready),
-                ]
+                match(path_seen, path_matches)
                 with m.If(self.input.valid & (self.input.payload == ord(' '))):
                     m.d.comb += self.input.ready.eq(1)
                     m.next = "match_protocol"
             with m.State("match_protocol"):
                 m.next = "match_protocol"
-                # connect results in warning about combinatorial signals
-                m.d.comb += [
-                    protocol_match.input.valid.eq(self.input.valid),
-                    protocol_match.input.payload.eq(self.input.payload),
-                    self.input.ready.eq(protocol_match.input.ready),
-                ]
+                match(protocol_seen, protocol_matches)
                 with m.If(self.input.valid & (self.input.payload == ord('\r'))):
                     m.d.comb += self.input.ready.eq(1)
                     m.next = "match_end"
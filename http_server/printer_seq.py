@@ -4,9 +4,22 @@ from amaranth.lib.wiring import connect
 from .printer import AbstractPrinter
 from .stream_mux import StreamMux
 
+from stream_utils import tree_and
+
 class PrinterSeq(AbstractPrinter):
     """
-    When activated, activates sub-printers in sequence.
+    When activated, prints the output of sub-printers in sequence.
+
+    All of the sub-printers are enabled at once, so each one is ready with
+    its first byte (and holding it) before its turn. The output is taken from
+    the first sub-printer that is not yet done; so the next sub-printer takes
+    over as soon as the previous one is done, without a dead cycle for
+    printers whose `done` rises the cycle after their last byte (e.g. Printer).
+
+    Parameters
+    ----------
+    sequence: list[AbstractPrinter]
+              Printers to print from, in order.
 
     AbstractPrinter Attributes
     ----------
@@ -19,37 +32,33 @@ class PrinterSeq(AbstractPrinter):
     """
 
     def __init__(self, sequence):
+        if len(sequence) == 0:
+            raise ValueError("sequence must not be empty")
         self._sequence = sequence
         super().__init__()
 
     def elaborate(self, _platform):
         m = Module()
 
-
         m.submodules.output_mux = output_mux = StreamMux(mux_width=len(self._sequence), stream_width=8)
         m.d.comb += [
             self.output.payload.eq(output_mux.out.payload),
             self.output.valid.eq(output_mux.out.valid),
-            output_mux.out.ready.eq(self.output.valid),
+            output_mux.out.ready.eq(self.output.ready),
         ]
 
-        # Sequence is done when the final sequence is done.
-        m.d.comb += [
-            self.done.eq(self._sequence[-1].done),
-        ]
-        for i in range(0, len(self._sequence)):
-            # Broadcast en to all of the printers in the sequence
-            m.d.comb += self._sequence[i].en.eq(self.en)
-
-            # Point the output mux to the next item in the sequence as the
-            # previous ones finish
-            m.submodules += self._sequence[i]
-            connect(m, self._sequence[i].output, output_mux.input[i])
-            if i == 0:
-                with m.If(~self._sequence[1].done):
-                    m.d.comb += output_mux.select.eq(0)
-            else:
-                with m.If(self._sequence[i-1].done & ~self._sequence[i].done):
-                    m.d.comb += output_mux.select.eq(i),
+        for (i, printer) in enumerate(self._sequence):
+            m.submodules[f"printer_{i}"] = printer
+            connect(m, printer.output, output_mux.input[i])
+            # Start all of the printers at once.
+            m.d.comb += printer.en.eq(self.en)
+
+        # Output from the first printer that isn't done.
+        for i in reversed(range(len(self._sequence))):
+            with m.If(~self._sequence[i].done):
+                m.d.comb += output_mux.select.eq(i)
+
+        # The sequence is done when all of its printers are done.
+        m.d.comb += self.done.eq(tree_and(m, [printer.done for printer in self._sequence]))
 
         return m
@@ -30,7 +30,90 @@ def test_simple_sequence():
         sim.run_until(0.001)
 
     collector.assert_eq(expected)
-    
+
+
+def test_one_byte_per_cycle():
+    """
+    With the output always ready, the sequence prints a byte every cycle,
+    including across segment boundaries.
+    """
+    segments = ["GET", " ", "/", "count", "\r\n"]
+    dut = PrinterSeq([Printer(segment) for segment in segments])
+    expected = "".join(segments)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    async def driver(ctx):
+        ctx.set(dut.output.ready, 1)
+        for _ in range(2):
+            ctx.set(dut.en, 1)
+            await ctx.tick()
+            ctx.set(dut.en, 0)
+            received = ""
+            cycle = 0
+            first = last = None
+            while ctx.get(dut.done) == 0:
+                if ctx.get(dut.output.valid):
+                    received += chr(ctx.get(dut.output.payload))
+                    if first is None:
+                        first = cycle
+                    last = cycle
+                cycle += 1
+                await ctx.tick()
+            assert received == expected
+            # From the first byte to the last:
+            assert last - first + 1 == len(expected), (first, last)
+
+    sim.add_testbench(driver)
+    sim.run_until(0.001)
+
+
+def test_backpressure():
+    dut = PrinterSeq([Printer("Hello"), Printer(", "), Printer("world!")])
+    expected = "Hello, world!" * 3
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    collector = StreamCollector(stream=dut.output, random_backpressure=True)
+    sim.add_process(collector.collect())
+
+    async def driver(ctx):
+        for _ in range(3):
+            ctx.set(dut.en, 1)
+            await ctx.tick()
+            ctx.set(dut.en, 0)
+            while ctx.get(dut.done) == 0:
+                await ctx.tick()
+
+    sim.add_testbench(driver)
+    sim.run_until(0.001)
+
+    collector.assert_eq(expected)
+
+
+def test_single_printer():
+    dut = PrinterSeq([Printer("Hello!")])
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    collector = StreamCollector(stream=dut.output)
+    sim.add_process(collector.collect())
+
+    async def driver(ctx):
+        ctx.set(dut.en, 1)
+        await ctx.tick()
+        ctx.set(dut.en, 0)
+        while ctx.get(dut.done) == 0:
+            await ctx.tick()
+
+    sim.add_testbench(driver)
+    sim.run_until(0.001)
+
+    collector.assert_eq("Hello!")
+
 
 # TODO: When #28 is merged, delete.
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+from amaranth import Module, Signal, unsigned, Array, Const, Mux
+from amaranth.lib.wiring import In, Out, Component, Signature
+from amaranth.lib import stream
+from amaranth.lib import memory
+from amaranth.lib.data import ArrayLayout, StructLayout
+from amaranth.utils import ceil_log2
+
+from .bcd_counter import BcdCounter
+from .number import Number
+from .response_rom import ResponseRom
+from .stream_mux import StreamMux
+
+
+class Literal:
+    """
+    Instruction: print a constant string.
+    """
+
+    def __init__(self, text):
+        if isinstance(text, str):
+            text = text.encode("utf-8")
+        self.text = text
+
+
+class Decimal:
+    """
+    Instruction: print a register as an unsigned decimal number.
+    """
+
+    def __init__(self, register: int):
+        self.register = register
+
+
+class Hex:
+    """
+    Instruction: print a register as a fixed-width, lowercase hex number.
+    """
+
+    def __init__(self, register: int):
+        self.register = register
+
+
+class Counter:
+    """
+    Instruction: print a counter as a fixed-width decimal number.
+    """
+
+    def __init__(self, counter: int):
+        self.counter = counter
+
+
+class Stat:
+    """
+    Instruction: print a statistics counter as a decimal number.
+    """
+
+    def __init__(self, stat: int):
+        self.stat = stat
+
+
+class ResponseFormatter(Component):
+    """
+    When activated, prints a templated message to its output.
+
+    The template is a program of instructions
+    (Literal, Decimal, Hex, Counter, Stat),
+    stored in a ROM and run by a single sequencer. Each kind of instruction
+    has one shared datapath, however many times the program uses it.
+
+    Parameters
+    ----------
+    program:        list[Literal | Decimal | Hex | Counter | Stat]
+                    Instructions to run, in order, when enabled.
+    registers:      int
+                    Number of input registers.
+    width:          int
+                    Width of each input register, in bits.
+    counters:       int
+                    Number of counters.
+    counter_digits: int
+                    Number of decimal digits in each counter.
+    stats:          int
+                    Number of statistics counters, read through `stat_read`.
+    stat_width:     int
+                    Width of each statistics counter, in bits.
+
+    Attributes
+    ----------
+    output:     Stream(8), out
+                The data stream to write the message to.
+    en:         Signal(1), in
+                One-shot trigger; start writing the message to output.
+    done:       Signal(1), out
+                High when inactive, i.e. writing is done.
+    registers:  ArrayLayout(width, registers), in
+                Values for the Decimal and Hex instructions.
+                Present if registers > 0.
+    inc:        Signal(counters), in
+                Increment the corresponding counter.
+                Present if counters > 0.
+    stat_read:  Out(Signature), with members:
+                  en:   Signal(1), out
+                  addr: Signal(range(stats)), out
+                  data: Signal(stat_width), in
+                Read port for the statistics counters, e.g. of a
+                CounterBank: `data` is expected the cycle after `en`.
+                Present if stats > 0.
+    """
+
+    OP_END = 0
+    OP_LITERAL = 1
+    OP_DECIMAL = 2
+    OP_HEX = 3
+    OP_COUNTER = 4
+    OP_STAT = 5
+
+    def __init__(self, program, registers=0, width=16,
+                 counters=0, counter_digits=4, stats=0, stat_width=32):
+        self._literals = []
+        self._instructions = []
+        for instruction in program:
+            if isinstance(instruction, Literal):
+                if instruction.text not in self._literals:
+                    self._literals.append(instruction.text)
+                self._instructions.append(
+                    (self.OP_LITERAL, self._literals.index(instruction.text)))
+            elif isinstance(instruction, (Decimal, Hex)):
+                if not 0 <= instruction.register < registers:
+                    raise ValueError(
+                        f"register {instruction.register} out of range")
+                op = self.OP_DECIMAL if isinstance(instruction, Decimal) else self.OP_HEX
+                self._instructions.append((op, instruction.register))
+            elif isinstance(instruction, Counter):
+                if not 0 <= instruction.counter < counters:
+                    raise ValueError(
+                        f"counter {instruction.counter} out of range")
+                self._instructions.append((self.OP_COUNTER, instruction.counter))
+            elif isinstance(instruction, Stat):
+                if not 0 <= instruction.stat < stats:
+                    raise ValueError(
+                        f"stat {instruction.stat} out of range")
+                self._instructions.append((self.OP_STAT, instruction.stat))
+            else:
+                raise ValueError(f"unknown instruction {instruction}")
+        self._instructions.append((self.OP_END, 0))
+
+        self._registers = registers
+        self._width = width
+        self._counters = counters
+        self._counter_digits = counter_digits
+        self._stats = stats
+        self._stat_width = stat_width
+
+        members = {
+            "output": Out(stream.Signature(unsigned(8))),
+            "en": In(1),
+            "done": Out(1, init=1),
+        }
+        if registers > 0:
+            members["registers"] = In(ArrayLayout(unsigned(width), registers))
+        if counters > 0:
+            members["inc"] = In(counters)
+        if stats > 0:
+            members["stat_read"] = Out(Signature({
+                "en": Out(1),
+                "addr": Out(range(stats)),
+                "data": In(stat_width),
+            }))
+        super().__init__(members)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        ops = {op for (op, _) in self._instructions}
+
+        # Output sources, in StreamMux order:
+        sources = []
+        if self.OP_LITERAL in ops:
+            SOURCE_LITERAL = len(sources)
+            literals = m.submodules.literals = ResponseRom(self._literals)
+            sources.append(literals)
+        counters = []
+        if self._counters > 0:
+            SOURCE_COUNTER = len(sources)
+            for i in range(self._counters):
+                counter = m.submodules[f"counter_{i}"] = BcdCounter(
+                    self._counter_digits, ascii=True)
+                m.d.comb += counter.inc.eq(self.inc[i])
+                counters.append(counter)
+                sources.append(counter)
+        # Registers and statistics share a decimal printer.
+        if self.OP_DECIMAL in ops or self.OP_STAT in ops:
+            SOURCE_DECIMAL = len(sources)
+            number_width = max(
+                self._width if self.OP_DECIMAL in ops else 0,
+                self._stat_width if self.OP_STAT in ops else 0)
+            number = m.submodules.number = Number(number_width)
+            sources.append(number)
+        # The hex printer is inline, below.
+        SOURCE_HEX = len(sources)
+        mux = m.submodules.mux = StreamMux(
+            mux_width=len(sources) + 1, stream_width=8)
+        for (i, source) in enumerate(sources):
+            m.d.comb += [
+                mux.input[i].payload.eq(source.output.payload),
+                mux.input[i].valid.eq(source.output.valid),
+                source.output.ready.eq(mux.input[i].ready),
+            ]
+        m.d.comb += [
+            self.output.payload.eq(mux.out.payload),
+            self.output.valid.eq(mux.out.valid),
+            mux.out.ready.eq(self.output.ready),
+        ]
+        sources_done = Array([source.done for source in sources] + [Const(1)])
+
+        if self._registers > 0:
+            registers = Array(self.registers[i] for i in range(self._registers))
+
+        # Program ROM.
+        # This has a synchronous read port, so it can be block RAM:
+        # `pc` only changes when leaving "fetch", and no state goes straight
+        # back to "fetch", so the instruction is ready when it's needed.
+        arg_width = max(ceil_log2(max(arg for (_, arg) in self._instructions) + 1), 1)
+        instruction_layout = StructLayout({
+            "op": unsigned(3),
+            "arg": unsigned(arg_width),
+        })
+        m.submodules.program = program = memory.Memory(
+            shape=instruction_layout, depth=len(self._instructions),
+            init=[{"op": op, "arg": arg} for (op, arg) in self._instructions])
+        fetch = program.read_port()
+        pc = Signal(range(len(self._instructions)))
+        m.d.comb += fetch.addr.eq(pc)
+        instruction = fetch.data
+
+        # Hex printer:
+        hex_digits = (self._width + 3) // 4
+        hex_value = Signal(4 * hex_digits)
+        hex_count = Signal(range(hex_digits))
+        nibble = hex_value[-4:]
+        hex_output = mux.input[SOURCE_HEX]
+        m.d.comb += hex_output.payload.eq(
+            Mux(nibble < 10, nibble + ord('0'), nibble - 10 + ord('a')))
+
+        with m.FSM():
+            with m.State("idle"):
+                m.d.comb += self.done.eq(1)
+                m.next = "idle"
+                with m.If(self.en):
+                    m.d.comb += self.done.eq(0)
+                    m.next = "fetch"
+            with m.State("fetch"):
+                m.d.comb += self.done.eq(0)
+                m.next = "emit"
+                m.d.sync += pc.eq(pc + 1)
+                with m.Switch(instruction.op):
+                    with m.Case(self.OP_END):
+                        m.d.sync += pc.eq(0)
+                        m.next = "idle"
+                    if self.OP_LITERAL in ops:
+                        with m.Case(self.OP_LITERAL):
+                            m.d.comb += [
+                                literals.select.eq(instruction.arg),
+                                literals.en.eq(1),
+                            ]
+                            m.d.sync += mux.select.eq(SOURCE_LITERAL)
+                    if self.OP_DECIMAL in ops:
+                        with m.Case(self.OP_DECIMAL):
+                            m.d.comb += [
+                                number.input.eq(registers[instruction.arg]),
+                                number.en.eq(1),
+                            ]
+                            m.d.sync += mux.select.eq(SOURCE_DECIMAL)
+                    if self.OP_HEX in ops:
+                        with m.Case(self.OP_HEX):
+                            m.d.sync += [
+                                hex_value.eq(registers[instruction.arg]),
+                                hex_count.eq(hex_digits - 1),
+                                mux.select.eq(SOURCE_HEX),
+                            ]
+                            m.next = "hex"
+                    if self.OP_COUNTER in ops:
+                        with m.Case(self.OP_COUNTER):
+                            with m.Switch(instruction.arg):
+                                for (i, counter) in enumerate(counters):
+                                    with m.Case(i):
+                                        m.d.comb += counter.en.eq(1)
+                            m.d.sync += mux.select.eq(
+                                SOURCE_COUNTER + instruction.arg)
+                    if self.OP_STAT in ops:
+                        with m.Case(self.OP_STAT):
+                            m.d.comb += [
+                                self.stat_read.addr.eq(instruction.arg),
+                                self.stat_read.en.eq(1),
+                            ]
+                            m.next = "stat"
+            if self.OP_STAT in ops:
+                with m.State("stat"):
+                    # The counter's value is available from the read port.
+                    m.d.comb += [
+                        self.done.eq(0),
+                        number.input.eq(self.stat_read.data),
+                        number.en.eq(1),
+                    ]
+                    m.d.sync += mux.select.eq(SOURCE_DECIMAL)
+                    m.next = "emit"
+            with m.State("emit"):
+                m.d.comb += self.done.eq(0)
+                m.next = "emit"
+                with m.If(sources_done[mux.select]):
+                    m.next = "fetch"
+            with m.State("hex"):
+                m.next = "hex"
+                m.d.comb += [
+                    self.done.eq(0),
+                    hex_output.valid.eq(1),
+                ]
+                with m.If(hex_output.ready):
+                    with m.If(hex_count == 0):
+                        m.next = "fetch"
+                    with m.Else():
+                        m.d.sync += [
+                            hex_value.eq(hex_value << 4),
+                            hex_count.eq(hex_count - 1),
+                        ]
+
+        return m
@@ -0,0 +1,95 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .response_formatter import ResponseFormatter, Literal, Decimal, Hex, Counter
+
+
+def run_formatter(dut, setup, runs=1, random_ready=False):
+    """
+    Runs the formatter `runs` times, after `setup(ctx)`.
+    Returns the output of each run.
+    """
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    outputs = []
+
+    async def bench(ctx):
+        await setup(ctx)
+        for _ in range(runs):
+            assert ctx.get(dut.done)
+            buf = b""
+            ctx.set(dut.en, 1)
+            ctx.set(dut.output.ready, 1)
+            while True:
+                if ctx.get(dut.output.valid) and ctx.get(dut.output.ready):
+                    buf += bytes([ctx.get(dut.output.payload)])
+                await ctx.tick()
+                ctx.set(dut.en, 0)
+                if random_ready:
+                    ctx.set(dut.output.ready, random.randint(0, 1))
+                if ctx.get(dut.done):
+                    break
+            outputs.append(buf.decode("utf-8"))
+
+    sim.add_testbench(bench)
+    sim.run()
+    return outputs
+
+
+def test_literals():
+    dut = ResponseFormatter([Literal("Hello"), Literal(", "),
+                             Literal("world!"), Literal(", ")])
+
+    async def setup(ctx):
+        pass
+
+    assert run_formatter(dut, setup, runs=2, random_ready=True) == [
+        "Hello, world!, "] * 2
+
+
+def test_registers():
+    dut = ResponseFormatter([
+        Literal('{"red": '), Decimal(0),
+        Literal(', "green": '), Decimal(1),
+        Literal(', "rgb": "'), Hex(2), Literal('"}'),
+    ], registers=3, width=12)
+
+    async def setup(ctx):
+        ctx.set(dut.registers[0], 255)
+        ctx.set(dut.registers[1], 0)
+        ctx.set(dut.registers[2], 0xA0F)
+
+    assert run_formatter(dut, setup, random_ready=True) == [
+        '{"red": 255, "green": 0, "rgb": "a0f"}']
+
+
+def test_counters():
+    dut = ResponseFormatter([
+        Literal("a="), Counter(0), Literal(" b="), Counter(1),
+    ], counters=2, counter_digits=3)
+
+    async def setup(ctx):
+        ctx.set(dut.inc, 0b11)
+        await ctx.tick()
+        ctx.set(dut.inc, 0b01)
+        for _ in range(11):
+            await ctx.tick()
+        ctx.set(dut.inc, 0)
+
+    assert run_formatter(dut, setup, random_ready=True) == ["a=012 b=001"]
+
+
+def test_bad_program():
+    for (program, kwargs) in [
+        ([Decimal(0)], {}),
+        ([Hex(2)], {"registers": 2}),
+        ([Counter(1)], {"counters": 1}),
+        (["literal"], {}),
+    ]:
+        try:
+            ResponseFormatter(program, **kwargs)
+        except ValueError:
+            pass
+        else:
+            assert False, f"expected ValueError for {program}"
@@ -0,0 +1,117 @@
+from amaranth import Module, Signal, unsigned, Array, Const
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+from amaranth.lib import memory
+
+
+class ResponseRom(Component):
+    """
+    When activated, prints one of a set of constant messages to its output.
+
+    All of the messages are packed into a single memory,
+    which can be inferred as block RAM;
+    a table of (start, length) selects the message to print.
+
+    Parameters
+    ----------
+    messages: list[str | bytes]
+        The messages to print, indexed by `select`.
+
+    Attributes
+    ----------
+    output: Stream(8), out
+            The data stream to write the message to.
+    select: Signal(range(len(messages))), in
+            Which message to print; sampled on `en`.
+    en:     Signal(1), in
+            One-shot trigger; start writing the message to output.
+    done:   Signal(1), out
+            High when inactive, i.e. writing is done.
+    """
+
+    def __init__(self, messages):
+        encoded = []
+        for message in messages:
+            if isinstance(message, str):
+                message = message.encode("utf-8")
+            elif not isinstance(message, bytes):
+                raise ValueError("messages must be strings or byte arrays")
+            if len(message) == 0:
+                raise ValueError("messages must not be empty")
+            encoded.append(message)
+        if len(encoded) == 0:
+            raise ValueError("must have at least one message")
+
+        self._contents = b"".join(encoded)
+        self._starts = []
+        self._ends = []
+        offset = 0
+        for message in encoded:
+            self._starts.append(offset)
+            offset += len(message)
+            self._ends.append(offset - 1)
+
+        super().__init__({
+            "output": Out(stream.Signature(unsigned(8))),
+            "select": In(range(len(encoded))),
+            "en": In(1),
+            "done": Out(1, init=1),
+        })
+
+    def elaborate(self, platform):
+        m = Module()
+
+        depth = len(self._contents)
+        m.submodules.rom = rom = memory.Memory(
+            shape=unsigned(8), depth=depth, init=self._contents)
+        # A synchronous read port, so the memory can be block RAM.
+        # The read data holds while the port is disabled,
+        # i.e. while the output is stalled.
+        read = rom.read_port()
+
+        starts = Array(Const(start, range(depth)) for start in self._starts)
+        ends = Array(Const(end, range(depth)) for end in self._ends)
+
+        addr = Signal(range(depth))
+        end = Signal(range(depth))
+
+        m.d.comb += [
+            read.addr.eq(addr),
+            read.en.eq(0),
+            self.output.payload.eq(read.data),
+        ]
+
+        with m.FSM():
+            with m.State("idle"):
+                m.d.comb += self.done.eq(1)
+                m.next = "idle"
+                with m.If(self.en):
+                    # Fetch the first byte; it's available in "running".
+                    m.d.comb += [
+                        self.done.eq(0),
+                        read.addr.eq(starts[self.select]),
+                        read.en.eq(1),
+                    ]
+                    m.d.sync += [
+                        addr.eq(starts[self.select]),
+                        end.eq(ends[self.select]),
+                    ]
+                    m.next = "running"
+            with m.State("running"):
+                m.d.comb += [
+                    self.done.eq(0),
+                    self.output.valid.eq(1),
+                ]
+                m.next = "running"
+                with m.If(self.output.ready):
+                    with m.If(addr == end):
+                        m.next = "idle"
+                    with m.Else():
+                        # Fetch the next byte.
+                        m.d.comb += [
+                            read.addr.eq(addr + 1),
+                            read.en.eq(1),
+                        ]
+                        m.d.sync += addr.eq(addr + 1)
+
+        return m
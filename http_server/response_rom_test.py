@@ -0,0 +1,71 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .response_rom import ResponseRom
+
+messages = ["Hello world!", "a", "Goodbye 👋\r\n"]
+
+
+def test_response_rom():
+    dut = ResponseRom(messages)
+
+    async def bench(ctx):
+        # Randomized testing:
+        for _ in range(20):
+            select = random.randrange(len(messages))
+            await bench_backpressure(ctx, select)
+
+    async def bench_backpressure(ctx, select):
+        assert ctx.get(dut.done)
+        assert ctx.get(dut.output.valid) == 0
+
+        buf = b""
+        ctx.set(dut.select, select)
+        ctx.set(dut.en, 1)
+        while True:
+            if ctx.get(dut.output.valid) and ctx.get(dut.output.ready):
+                # A byte will be transferred this cycle.
+                buf += bytes([ctx.get(dut.output.payload)])
+
+            await ctx.tick()
+            ctx.set(dut.en, 0)
+            # The selection is only sampled at the start.
+            ctx.set(dut.select, random.randrange(len(messages)))
+            ctx.set(dut.output.ready, random.randint(0, 1))
+
+            if ctx.get(dut.done):
+                break
+        expected = messages[select].encode("utf-8")
+        assert buf == expected, (buf, expected)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+
+    sim.run()
+
+
+def test_one_byte_per_cycle():
+    dut = ResponseRom(messages)
+
+    async def bench(ctx):
+        ctx.set(dut.output.ready, 1)
+        for select in range(len(messages)):
+            ctx.set(dut.select, select)
+            ctx.set(dut.en, 1)
+            await ctx.tick()
+            ctx.set(dut.en, 0)
+
+            buf = b""
+            while ctx.get(dut.output.valid):
+                buf += bytes([ctx.get(dut.output.payload)])
+                await ctx.tick()
+            assert buf == messages[select].encode("utf-8")
+            assert ctx.get(dut.done)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+
+    sim.run()
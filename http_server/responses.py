@@ -0,0 +1,34 @@
+"""
+Static HTTP responses, shared by the HTTP servers.
+"""
+
+# Responses, by ID:
+RESPONSE_OK = 0
+RESPONSE_404 = 1
+RESPONSE_405 = 2
+RESPONSE_TEAPOT = 3
+RESPONSE_400 = 4
+
+
+def format_response(status: str, body: str) -> str:
+    """
+    A complete response: the status line, our headers, and the body.
+    """
+    return "\r\n".join([
+        status,
+        "Host: Fomu",
+        "Content-Type: text/plain; charset=utf-8",
+        "",
+        body]) + "\r\n"
+
+
+# Indexed by RESPONSE_* ID:
+STATIC_RESPONSES = [
+    format_response(status, body) for (status, body) in [
+        ("HTTP/1.0 200 OK", '👍'),
+        ("HTTP/1.0 404 Not Found", '👎'),
+        ("HTTP/1.0 405 Method Not Allowed", '🛑'),
+        ("HTTP/1.0 418 I'm a teapot", "short and stout"),
+        ("HTTP/1.0 400 Bad Request", '🚫'),
+    ]
+]
@@ -9,6 +9,9 @@ class SimpleLedBody(Component):
     Expects the body to be formated as: "rrggbb\r\n"
       where rr, gg, and bb are two-digit hex values (0-9A-F)
 
+    If the body is framed by its length (e.g. Content-Length) instead,
+    the trailing "\r\n" may be omitted; "end" indicates the end of the body.
+
     If the body is well-formed, after the whole body has been
     consumed, will latch the outputs and set accepted.
 
@@ -23,6 +26,9 @@ class SimpleLedBody(Component):
                 Data stream to match.
     reset:      Signal(1), in
                 Reset and await new input.
+    end:        Signal(1), in
+                The body has ended. Only needed for bodies that lack the
+                trailing "\r\n".
 
     accepted:   Signal(1), out
                 High if the string has been matched.
@@ -42,6 +48,7 @@ class SimpleLedBody(Component):
 
     input: In(stream.Signature(8))
     reset: In(1)
+    end: In(1)
 
     accepted: Out(1)
     rejected: Out(1)
@@ -105,9 +112,17 @@ class SimpleLedBody(Component):
                         m.next = "matched"
                     with m.Else():
                         m.next = "error"
+                with m.Elif(self.end):
+                    with m.If(idx == 6):
+                        m.next = "matched"
+                    with m.Else():
+                        m.next = "error"
             with m.State("error"):
                 m.next = "error"
-                m.d.comb += self.input.ready.eq(0)
+                m.d.comb += [
+                    self.input.ready.eq(0),
+                    self.rejected.eq(1),
+                ]
                 with m.If(self.reset):
                     m.next = "reset"
             with m.State("matched"):
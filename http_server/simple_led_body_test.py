@@ -95,3 +95,49 @@ def test_invalid_hex():
     sim.add_process(sender.send_passive(map(ord, "test")))
 
     sim.run_until(0.0001)
+
+
+def run_framed_body(body: str):
+    """
+    Sends the body, then signals its end.
+    Returns (accepted, rejected, (red, green, blue)).
+    """
+    dut = SimpleLedBody()
+    sender = StreamSender(stream=dut.input)
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    result = None
+
+    async def driver(ctx):
+        nonlocal result
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+
+        while not sender.done:
+            await ctx.tick()
+        ctx.set(dut.end, 1)
+        await ctx.tick().until(dut.accepted | dut.rejected)
+        result = (ctx.get(dut.accepted), ctx.get(dut.rejected),
+                  (ctx.get(dut.red), ctx.get(dut.green), ctx.get(dut.blue)))
+
+    sim.add_testbench(driver)
+    sim.add_process(sender.send_passive(map(ord, body)))
+
+    sim.run_until(0.0001)
+    assert result is not None
+    return result
+
+
+def test_framed_body():
+    assert run_framed_body("1A3B5C") == (1, 0, (0x1A, 0x3B, 0x5C))
+
+
+def test_framed_body_with_crlf():
+    assert run_framed_body("1A3B5C\r\n") == (1, 0, (0x1A, 0x3B, 0x5C))
+
+
+def test_short_framed_body():
+    (accepted, rejected, _) = run_framed_body("1A3")
+    assert not accepted
+    assert rejected
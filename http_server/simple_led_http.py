@@ -1,15 +1,20 @@
-from amaranth import Module
+from amaranth import Module, Array, Signal
 from amaranth.lib.wiring import In, Out, Component, connect
+from amaranth.lib.fifo import SyncFIFOBuffered
 
 from .count_body import CountBody
+from .header_extractor import HeaderExtractor
+from .metrics_body import MetricsBody
 from .parse_start import ParseStart
-from .printer import Printer
+from .response_rom import ResponseRom
+from .responses import (RESPONSE_OK, RESPONSE_404, RESPONSE_405,
+                        RESPONSE_TEAPOT, RESPONSE_400, STATIC_RESPONSES)
 from .simple_led_body import SimpleLedBody
 from .stream_demux import StreamDemux
 from .stream_mux import StreamMux
-from .string_contains_match import StringContainsMatch
 
 import session
+from stream_utils import LimitForwarder, tree_and
 
 
 class SimpleLedHttp(Component):
@@ -24,6 +29,28 @@ class SimpleLedHttp(Component):
     A GET from /count will return the number of requests and
     responses.
 
+    A GET from /metrics will return histograms of request latency, in the
+    Prometheus text format: the cycles from the start of each session to the
+    first byte of its response, and to its end, by route and status.
+
+    If a request has a Content-Length header, exactly that many bytes of body
+    are passed to the request's handler (or discarded). Otherwise, the body of
+    a POST to /led is delimited by its trailing "\r\n".
+    A request whose Content-Length isn't a valid number (or is repeated)
+    gets a 400 Bad Request, and ends the session.
+
+    Requests may be pipelined: the parser and the responder are decoupled by
+    a small in-order queue of pending responses, so the parser moves on to
+    request N+1 while response N is still being written. Another request may
+    follow one with a Content-Length, or a POST to /led, unless it has a
+    "Connection: close" header; any other request is the last one in its
+    session, and the remainder of the session's input is discarded.
+
+    Parameters
+    ----------
+    queue_depth: int
+        Number of parsed requests that may be awaiting a response.
+
     Attributes
     ----------
     session: BidiSessionSignature
@@ -40,27 +67,54 @@ class SimpleLedHttp(Component):
     green: Out(8)
     blue: Out(8)
 
+    def __init__(self, queue_depth=4):
+        super().__init__()
+        self._queue_depth = queue_depth
+
     def elaborate(self, _platform):
         m = Module()
 
         ## Input parsers
-        parser_demux = m.submodules.parser_demux = StreamDemux(mux_width=4, stream_width=8)
+        parser_demux = m.submodules.parser_demux = StreamDemux(mux_width=5, stream_width=8)
         connect(m, self.session.inbound.data, parser_demux.input)
 
         MATCHED_LED_PATH = 1 # start_matcher path match is in the order the paths are connected.
         MATCHED_COUNT_PATH = 2
         MATCHED_COFFEE_PATH = 3
-        start_matcher = m.submodules.start_matcher = ParseStart(["/led", "/count", "/coffee"])
+        MATCHED_METRICS_PATH = 4
+        start_matcher = m.submodules.start_matcher = ParseStart(
+            ["/led", "/count", "/coffee", "/metrics"])
         HTTP_PARSER_START = 0
         connect(m, start_matcher.input, parser_demux.outs[HTTP_PARSER_START])
 
         HTTP_PARSER_HEADERS = 1
-        skip_headers = m.submodules.end_of_header_matcher = StringContainsMatch("\r\n\r\n")
-        connect(m, skip_headers.input, parser_demux.outs[HTTP_PARSER_HEADERS])
+        # "Connection: close" is the only Connection value we care about,
+        # so we only need to capture (up to) that many bytes of it.
+        header_parser = m.submodules.header_parser = HeaderExtractor(
+            number_fields={"Content-Length": 16},
+            text_fields={"Connection": len("close")})
+        connect(m, header_parser.input, parser_demux.outs[HTTP_PARSER_HEADERS])
+        content_length = header_parser.fields.content_length
+        connection = header_parser.fields.connection
+        connection_close = Signal(1)
+        m.d.comb += connection_close.eq(
+            connection.valid & (connection.length == len("close"))
+            # Case-insensitive, for letters:
+            & tree_and(m, [(connection.value[i] | 0x20) == ord(c)
+                        for i, c in enumerate("close")]))
 
-        HTTP_PARSER_LED_BODY = 2
+        # Body with a Content-Length:
+        HTTP_PARSER_BODY = 2
+        body_limiter = m.submodules.body_limiter = LimitForwarder(
+            width=8, max_count=2**16)
+        connect(m, body_limiter.inbound, parser_demux.outs[HTTP_PARSER_BODY])
+        m.d.comb += body_limiter.count.eq(content_length.value)
+
+        # Body without a Content-Length, for the LED handler:
+        HTTP_PARSER_LED_BODY = 3
+        # The LED handler's input is connected in the parser states below.
         led_body_handler = m.submodules.led_body_handler = SimpleLedBody()
-        connect(m, led_body_handler.input, parser_demux.outs[HTTP_PARSER_LED_BODY])
+        led_body_input = parser_demux.outs[HTTP_PARSER_LED_BODY]
         m.d.comb += [
                 self.red.eq(led_body_handler.red),
                 self.green.eq(led_body_handler.green),
@@ -68,190 +122,310 @@ class SimpleLedHttp(Component):
                 ]
 
         # Last parser is just a sink
-        HTTP_PARSER_SINK = 3
+        HTTP_PARSER_SINK = 4
         m.d.comb += parser_demux.outs[HTTP_PARSER_SINK].ready.eq(1)
 
         ## Responders
-        response_mux = m.submodules.response_mux = StreamMux(mux_width=5, stream_width=8)
+        response_mux = m.submodules.response_mux = StreamMux(mux_width=3, stream_width=8)
         connect(m, response_mux.out, self.session.outbound.data)
+
+        # Static responses, indexed by RESPONSE_* ID; then the headers of the
+        # metrics response, whose body is all generated: Prometheus text
+        # exposition format, with nothing before it.
+        ROM_METRICS_HEADERS = len(STATIC_RESPONSES)
+        metrics_headers = "\r\n".join([
+            "HTTP/1.0 200 OK",
+            "Host: Fomu",
+            "Content-Type: text/plain; version=0.0.4",
+            "", ""])
+        response_rom = m.submodules.response_rom = ResponseRom(
+            STATIC_RESPONSES + [metrics_headers])
+        RESPONDER_ROM = 0
+        connect(m, response_rom.output, response_mux.input[RESPONDER_ROM])
+
+        # The count response is the OK response followed by a generated body;
+        # the metrics response, the metrics headers followed by one.
+        RESPONSE_COUNT = len(STATIC_RESPONSES)
         count_body = m.submodules.count_body = CountBody()
+        RESPONDER_COUNT = 1
+        connect(m, count_body.output, response_mux.input[RESPONDER_COUNT])
 
-        ok_response = "\r\n".join(
-                ["HTTP/1.0 200 OK",
-                    "Host: Fomu",
-                    "Content-Type: text/plain; charset=utf-8",
-                    "",
-                    '👍']) + "\r\n"
-        ok_response = ok_response.encode("utf-8")
-        ok_printer = m.submodules.ok_printer = Printer(ok_response)
-        RESPONSE_OK = 0
-        connect(m, ok_printer.output, response_mux.input[RESPONSE_OK])
-        send_ok = [
-                response_mux.select.eq(RESPONSE_OK),
-                parser_demux.select.eq(HTTP_PARSER_SINK),
-                ok_printer.en.eq(1),
-                count_body.inc_ok.eq(1),
-        ]
+        RESPONSE_METRICS = RESPONSE_COUNT + 1
+        # Metrics series, indexed by RESPONSE_* ID:
+        metrics_body = m.submodules.metrics_body = MetricsBody([
+            'route="/led",status="200"',
+            'route="*",status="404"',
+            'route="*",status="405"',
+            'route="/coffee",status="418"',
+            'route="*",status="400"',
+            'route="/count",status="200"',
+            'route="/metrics",status="200"',
+        ])
+        RESPONDER_METRICS = 2
+        connect(m, metrics_body.output, response_mux.input[RESPONDER_METRICS])
 
-        not_found_response = "\r\n".join(
-                ["HTTP/1.0 404 Not Found",
-                    "Host: Fomu",
-                    "Content-Type: text/plain; charset=utf-8",
-                    "",
-                    '👎']) + "\r\n"
-        not_found_response = not_found_response.encode("utf-8")
-        not_found_printer = m.submodules.not_found_printer = Printer(not_found_response)
-        RESPONSE_404 = 1
-        connect(m, not_found_printer.output, response_mux.input[RESPONSE_404])
-        send_404 = [
-                response_mux.select.eq(RESPONSE_404),
-                parser_demux.select.eq(HTTP_PARSER_SINK),
-                not_found_printer.en.eq(1),
-                count_body.inc_error.eq(1),
-        ]
+        # Bodies that follow the OK header, by RESPONDER_* ID:
+        bodies = {
+            RESPONDER_COUNT: (RESPONSE_COUNT, count_body),
+            RESPONDER_METRICS: (RESPONSE_METRICS, metrics_body),
+        }
 
-        not_allowed_response = "\r\n".join(
-                ["HTTP/1.0 405 Method Not Allowed",
-                    "Host: Fomu",
-                    "Content-Type: text/plain; charset=utf-8",
-                    "",
-                    '🛑']) + "\r\n"
-        not_allowed_response = not_allowed_response.encode("utf-8")
-        not_allowed_printer = m.submodules.not_allowed_printer = Printer(not_allowed_response)
-        RESPONSE_405 = 2
-        connect(m, not_allowed_printer.output, response_mux.input[RESPONSE_405])
-        send_405 = [
-                response_mux.select.eq(RESPONSE_405),
-                parser_demux.select.eq(HTTP_PARSER_SINK),
-                not_allowed_printer.en.eq(1),
-                count_body.inc_error.eq(1),
-        ]
+        # Indexed by response_mux.select:
+        responder_done = Array([response_rom.done, count_body.done, metrics_body.done])
 
-        teapot_response = "\r\n".join(
-                ["HTTP/1.0 418 I'm a teapot",
-                    "Host: Fomu",
-                    "Content-Type: text/plain; charset=utf-8",
-                    "",
-                    "short and stout"]) + "\r\n"
-        teapot_response = teapot_response.encode("utf-8")
-        teapot_printer = m.submodules.teapot_printer = Printer(teapot_response)
-        RESPONSE_TEAPOT = 3
-        connect(m, teapot_printer.output, response_mux.input[RESPONSE_TEAPOT])
-        send_teapot = [
-                response_mux.select.eq(RESPONSE_TEAPOT),
-                parser_demux.select.eq(HTTP_PARSER_SINK),
-                teapot_printer.en.eq(1),
-                count_body.inc_error.eq(1),
-        ]
+        ## Response queue
+        # Each entry is the RESPONSE_* ID of a parsed request,
+        # in the order the requests were received.
+        response_queue = m.submodules.response_queue = SyncFIFOBuffered(
+            width=3, depth=self._queue_depth)
+        # Response to queue for the request being parsed,
+        # and whether any more requests may follow it in this session.
+        pending_response = Signal(3)
+        last_request = Signal(1)
+        # Whether this session has queued any response yet.
+        served = Signal(1)
 
-        RESPONSE_COUNT = 4
-        connect(m, count_body.output, response_mux.input[RESPONSE_COUNT])
-        send_count = [
-                response_mux.select.eq(RESPONSE_COUNT),
+        def send(response, last):
+            return [
+                pending_response.eq(response),
+                last_request.eq(last),
                 parser_demux.select.eq(HTTP_PARSER_SINK),
-                count_body.en.eq(1),
-        ]
+            ]
+        send_404 = send(RESPONSE_404, last=1)
 
-        with m.FSM():
-            with m.State("reset"):
+        # Which response a request gets, once its start line and headers are
+        # parsed; and whether its body goes to the LED handler.
+        route_response = Signal(3)
+        route_led = Signal(1)
+        with m.If(start_matcher.path[MATCHED_LED_PATH]):
+            with m.If(start_matcher.method[start_matcher.METHOD_POST]):
                 m.d.comb += [
-                    start_matcher.reset.eq(1),
-                    skip_headers.reset.eq(1),
+                    route_response.eq(RESPONSE_OK),
+                    route_led.eq(1),
                 ]
+            with m.Else():
+                m.d.comb += route_response.eq(RESPONSE_405)
+        with m.Elif(start_matcher.path[MATCHED_COUNT_PATH]):
+            with m.If(start_matcher.method[start_matcher.METHOD_GET]):
+                m.d.comb += route_response.eq(RESPONSE_COUNT)
+            with m.Else():
+                m.d.comb += route_response.eq(RESPONSE_405)
+        with m.Elif(start_matcher.path[MATCHED_METRICS_PATH]):
+            with m.If(start_matcher.method[start_matcher.METHOD_GET]):
+                m.d.comb += route_response.eq(RESPONSE_METRICS)
+            with m.Else():
+                m.d.comb += route_response.eq(RESPONSE_405)
+        with m.Elif(start_matcher.path[MATCHED_COFFEE_PATH]):
+            with m.If(start_matcher.method[start_matcher.METHOD_GET]
+                      | start_matcher.method[start_matcher.METHOD_BREW]):
+                m.d.comb += route_response.eq(RESPONSE_TEAPOT)
+            with m.Else():
+                m.d.comb += route_response.eq(RESPONSE_405)
+        with m.Else():
+            m.d.comb += route_response.eq(RESPONSE_404)
+        body_to_led = Signal(1)
+
+        # Responder: write out queued responses, in order.
+        current_response = Signal(3)
+        responses_idle = Signal(1)
+        with m.FSM(name="responder") as responder:
+            with m.State("idle"):
+                m.next = "idle"
+                m.d.comb += response_queue.r_stream.ready.eq(1)
+                with m.If(response_queue.r_stream.valid):
+                    m.next = "writing"
+                    response = response_queue.r_stream.payload
+                    m.d.sync += current_response.eq(response)
+                    m.d.comb += [
+                        count_body.inc_requests.eq(1),
+                        response_rom.en.eq(1),
+                    ]
+                    m.d.sync += response_mux.select.eq(RESPONDER_ROM)
+                    # The count response leads with the OK response.
+                    with m.If((response == RESPONSE_OK) | (response == RESPONSE_COUNT)):
+                        m.d.comb += [
+                            response_rom.select.eq(RESPONSE_OK),
+                            count_body.inc_ok.eq(1),
+                        ]
+                    with m.Elif(response == RESPONSE_METRICS):
+                        m.d.comb += [
+                            response_rom.select.eq(ROM_METRICS_HEADERS),
+                            count_body.inc_ok.eq(1),
+                        ]
+                    with m.Else():
+                        m.d.comb += [
+                            response_rom.select.eq(response),
+                            count_body.inc_error.eq(1),
+                        ]
+            with m.State("writing"):
+                m.next = "writing"
+                m.d.sync += [body.en.eq(0) for (_, body) in bodies.values()]
+                with m.If(responder_done[response_mux.select]):
+                    m.next = "idle"
+                    with m.If(response_mux.select == RESPONDER_ROM):
+                        with m.Switch(current_response):
+                            for (responder_id, (response, body)) in bodies.items():
+                                with m.Case(response):
+                                    # Registered, since the body's done
+                                    # feeds back into this decision.
+                                    m.next = "writing"
+                                    m.d.sync += [
+                                        response_mux.select.eq(responder_id),
+                                        body.en.eq(1),
+                                    ]
+        m.d.comb += responses_idle.eq(
+            responder.ongoing("idle") & (response_queue.level == 0))
+
+        # Latency measurement: the first response byte of each session is
+        # counted in the series of its response.
+        first_sent = Signal(1)
+        with m.If(metrics_body.start):
+            m.d.sync += first_sent.eq(0)
+        with m.If(response_mux.out.valid & response_mux.out.ready & ~first_sent):
+            m.d.sync += first_sent.eq(1)
+            m.d.comb += [
+                metrics_body.first_byte.eq(1),
+                metrics_body.series.eq(current_response),
+            ]
+
+        # Parser: parse requests, and queue a response to each.
+        resets = [
+            start_matcher.reset,
+            header_parser.reset,
+            led_body_handler.reset,
+        ]
+        with m.FSM(name="parser"):
+            with m.State("reset"):
+                m.d.comb += [r.eq(1) for r in resets]
                 m.next = "idle"
             with m.State("idle"):
-                m.d.comb += [
-                    start_matcher.reset.eq(0),
-                    skip_headers.reset.eq(0),
-                ]
                 m.d.sync += [
                     parser_demux.select.eq(HTTP_PARSER_START),
-                    response_mux.select.eq(RESPONSE_OK),
+                    served.eq(0),
                 ]
                 m.next = "idle"
                 with m.If(self.session.inbound.active):
                     m.next = "parsing_start"
-                    m.d.sync += [
-                        self.session.outbound.active.eq(1),
-                        count_body.inc_requests.eq(1),
-                    ]
+                    m.d.sync += self.session.outbound.active.eq(1)
+                    m.d.comb += metrics_body.start.eq(1)
             with m.State("parsing_start"):
                 m.next = "parsing_start"
-                m.d.sync += count_body.inc_requests.eq(0)
                 # start line matched successfully
                 with m.If(start_matcher.done):
                     m.next = "parsing_header"
                     m.d.sync += parser_demux.select.eq(HTTP_PARSER_HEADERS)
+                with m.Elif(~self.session.inbound.active
+                            & ~self.session.inbound.data.valid):
+                    with m.If(served):
+                        # No more pipelined requests.
+                        m.next = "draining"
+                        m.d.sync += parser_demux.select.eq(HTTP_PARSER_SINK)
+                    with m.Else():
+                        m.next = "queueing"
+                        m.d.sync += send_404
             with m.State("parsing_header"):
                 m.next = "parsing_header"
-                with m.If(skip_headers.accepted):
-                    with m.If(start_matcher.path[MATCHED_LED_PATH]):
-                        with m.If(start_matcher.method[start_matcher.METHOD_POST]):
-                            m.next = "parsing_led_body"
-                            m.d.sync += parser_demux.select.eq(HTTP_PARSER_LED_BODY)
-                        with m.Else():
-                            m.next = "writing"
-                            m.d.sync += send_405
-                    with m.Elif(start_matcher.path[MATCHED_COUNT_PATH]):
-                        with m.If(start_matcher.method[start_matcher.METHOD_GET]):
-                            m.next = "writing_count_ok"
-                            m.d.sync += send_ok
-                        with m.Else():
-                            m.next = "writing"
-                            m.d.sync += send_405
-                    with m.Elif(start_matcher.path[MATCHED_COFFEE_PATH]):
-                        with m.If(start_matcher.method[start_matcher.METHOD_GET] 
-                                  | start_matcher.method[start_matcher.METHOD_BREW]): 
-                            m.next = "writing"
-                            m.d.sync += send_teapot
-                        with m.Else():
-                            m.next = "writing"
-                            m.d.sync += send_405
+                with m.If(header_parser.done):
+                    with m.If(content_length.invalid):
+                        # We can't tell where the body ends; rather than
+                        # guess, refuse it and end the session.
+                        m.next = "queueing"
+                        m.d.sync += send(RESPONSE_400, last=1)
+                    with m.Elif(content_length.valid):
+                        # Forward exactly the body to its handler.
+                        m.next = "parsing_body"
+                        m.d.comb += body_limiter.start.eq(1)
+                        m.d.sync += [
+                            pending_response.eq(route_response),
+                            body_to_led.eq(route_led),
+                            parser_demux.select.eq(HTTP_PARSER_BODY),
+                        ]
+                    with m.Elif(route_led):
+                        m.next = "parsing_led_body"
+                        m.d.sync += parser_demux.select.eq(HTTP_PARSER_LED_BODY)
                     with m.Else():
-                        m.next = "writing"
-                        m.d.sync += send_404
+                        # We can't tell where the body ends,
+                        # so this is the last request.
+                        m.next = "queueing"
+                        m.d.sync += send(route_response, last=1)
                 with m.Elif(~self.session.inbound.active):
-                    m.next = "writing"
-                    # TODO: #4 - Should send a different error code besides 404 if the
-                    #            headers fail to parse before end-of-session.
-                    m.d.sync += send_404
+                    with m.If(served):
+                        # Trailing data after the last request; not a request.
+                        m.next = "draining"
+                        m.d.sync += parser_demux.select.eq(HTTP_PARSER_SINK)
+                    with m.Else():
+                        m.next = "queueing"
+                        # TODO: #4 - Should send a different error code besides 404 if the
+                        #            headers fail to parse before end-of-session.
+                        m.d.sync += send_404
+            with m.State("parsing_body"):
+                m.next = "parsing_body"
+                led_body_done = led_body_handler.accepted | led_body_handler.rejected
+                with m.If(body_to_led & ~led_body_done):
+                    m.d.comb += [
+                        led_body_handler.input.payload.eq(body_limiter.outbound.payload),
+                        led_body_handler.input.valid.eq(body_limiter.outbound.valid),
+                        body_limiter.outbound.ready.eq(led_body_handler.input.ready),
+                    ]
+                with m.Else():
+                    # Discard the (rest of the) body.
+                    m.d.comb += body_limiter.outbound.ready.eq(1)
+                with m.If(body_limiter.done):
+                    with m.If(~body_to_led):
+                        m.next = "queueing"
+                        m.d.sync += send(pending_response, last=connection_close)
+                    with m.Else():
+                        m.d.comb += led_body_handler.end.eq(1)
+                        with m.If(led_body_handler.accepted):
+                            m.next = "queueing"
+                            m.d.sync += send(RESPONSE_OK, last=connection_close)
+                        with m.Elif(led_body_handler.rejected):
+                            m.next = "queueing"
+                            m.d.sync += send(RESPONSE_404, last=connection_close)
             with m.State("parsing_led_body"): # TODO: #4 - Make body parsing state more generic.
                 m.next = "parsing_led_body"
+                m.d.comb += [
+                    led_body_handler.input.payload.eq(led_body_input.payload),
+                    led_body_handler.input.valid.eq(led_body_input.valid),
+                    led_body_input.ready.eq(led_body_handler.input.ready),
+                ]
                 with m.If(led_body_handler.accepted):
-                    m.next = "writing"
-                    m.d.sync += send_ok
+                    m.next = "queueing"
+                    # The body ends at its "\r\n", so another request may follow.
+                    m.d.sync += send(RESPONSE_OK, last=connection_close)
                 with m.Elif(led_body_handler.rejected):
-                    m.next = "writing"
+                    m.next = "queueing"
                     # TODO: #4 - Should send a different error code besides 404 if the
                     #            body fails to parse before end-of-session.
                     m.d.sync += send_404
-            with m.State("writing_count_ok"):
-                m.next = "writing_count_ok"
-                m.d.sync += [
-                    ok_printer.en.eq(0),
-                    count_body.inc_ok.eq(0)
-                ]
-                with m.If(ok_printer.done):
-                    m.d.sync += send_count
-                    m.next = "writing"
-            with m.State("writing"):
-                m.next = "writing"
-                m.d.sync += [
-                        ok_printer.en.eq(0),
-                        not_found_printer.en.eq(0),
-                        not_allowed_printer.en.eq(0),
-                        teapot_printer.en.eq(0),
-                        count_body.en.eq(0),
-                        self.session.outbound.active.eq(1),
-                        count_body.inc_ok.eq(0),
-                        count_body.inc_error.eq(0),
+            with m.State("queueing"):
+                m.next = "queueing"
+                # Hold off the input until the response is queued.
+                m.d.comb += [
+                    parser_demux.outs[HTTP_PARSER_SINK].ready.eq(0),
+                    response_queue.w_stream.payload.eq(pending_response),
+                    response_queue.w_stream.valid.eq(1),
                 ]
-                with m.If(  ((response_mux.select == RESPONSE_OK) & ok_printer.done)
-                          | ((response_mux.select == RESPONSE_404) & not_found_printer.done)
-                          | ((response_mux.select == RESPONSE_405) & not_allowed_printer.done)
-                          | ((response_mux.select == RESPONSE_COUNT) & count_body.done)
-                          | ((response_mux.select == RESPONSE_TEAPOT) & teapot_printer.done)):
+                with m.If(response_queue.w_stream.ready):
+                    m.d.sync += served.eq(1)
+                    with m.If(last_request):
+                        m.next = "draining"
+                    with m.Else():
+                        m.next = "next_request"
+            with m.State("next_request"):
+                m.d.comb += [r.eq(1) for r in resets]
+                m.d.comb += parser_demux.outs[HTTP_PARSER_SINK].ready.eq(0)
+                m.next = "restart"
+            with m.State("restart"):
+                # Let the matchers come out of reset before looking at them.
+                m.d.comb += parser_demux.outs[HTTP_PARSER_SINK].ready.eq(0)
+                m.d.sync += parser_demux.select.eq(HTTP_PARSER_START)
+                m.next = "parsing_start"
+            with m.State("draining"):
+                m.next = "draining"
+                with m.If(responses_idle):
                     m.d.sync += self.session.outbound.active.eq(0)
+                    m.d.comb += metrics_body.end.eq(self.session.outbound.active)
                     # Can finish writing before all the input is collected,
                     # since a bad request migh trigger an early 404. Wait
                     # until the input is done before returning to the reset
@@ -1,5 +1,6 @@
 import sys
 
+import pytest
 from amaranth.sim import Simulator
 
 from .simple_led_http import SimpleLedHttp
@@ -23,7 +24,10 @@ def test_ok_handling():
                        "\r\n"
                        "👍\r\n")
 
+    finished = False
+
     async def driver(ctx):
+        nonlocal finished
         ctx.set(dut.session.inbound.active, 1)
         await ctx.tick().until(dut.session.outbound.active)
 
@@ -35,7 +39,8 @@ def test_ok_handling():
             if ctx.get(in_stream.ready):
                 idx += 1
             await ctx.tick()
-        # After all input data is read, deassert inbound session
+        # After all input data is read, deassert valid and the inbound session
+        ctx.set(in_stream.valid, 0)
         ctx.set(dut.session.inbound.active, 0)
         # Keep driving clock until the outbound session is deasserted
         await ctx.tick().until(~dut.session.outbound.active)
@@ -47,6 +52,7 @@ def test_ok_handling():
 
         # Add some nice margins for our vcd
         await ctx.tick()
+        finished = True
 
     sim.add_testbench(driver)
 
@@ -59,6 +65,7 @@ def test_ok_handling():
     sim.run_until(0.0005)
 
     # Now that the test is done:
+    assert finished
     collector.assert_eq(expected_output)
 
 def test_404_handling():
@@ -197,7 +204,7 @@ def test_count_handling():
                        "Content-Type: text/plain; charset=utf-8\r\n"
                        "\r\n"
                        "👍\r\n"
-                       "requests: 0003 ok_responses: 0002 error_responses: 0001\r\n")
+                       "requests: 3 ok_responses: 2 error_responses: 1\r\n")
 
     async def driver(ctx):
 
@@ -287,3 +294,298 @@ def test_coffee_handling():
 
     # Now that the test is done:
     collector.assert_eq(expected_output)
+
+def test_pipelined_requests():
+    dut = SimpleLedHttp()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    def led_input(color):
+        return ("POST /led HTTP/1.0\r\n"
+                "Host: test\r\n"
+                "\r\n"
+                f"{color}\r\n")
+    count_input = ("GET /count HTTP/1.0\r\n"
+                   "Host: test\r\n"
+                   "\r\n")
+    # Back-to-back requests in a single session:
+    input = (led_input("123456") + led_input("ABCDEF") + led_input("654321")
+             + count_input)
+    ok_output = ("HTTP/1.0 200 OK\r\n"
+                 "Host: Fomu\r\n"
+                 "Content-Type: text/plain; charset=utf-8\r\n"
+                 "\r\n"
+                 "👍\r\n")
+    expected_output = (4 * ok_output
+                       + "requests: 4 ok_responses: 4 error_responses: 0\r\n")
+
+    overlapped = False
+
+    async def driver(ctx):
+        nonlocal overlapped
+        ctx.set(dut.session.inbound.active, 1)
+        await ctx.tick().until(dut.session.outbound.active)
+
+        in_stream = dut.session.inbound.data
+        ctx.set(in_stream.valid, 1)
+        idx = 0
+        while idx < len(input):
+            ctx.set(in_stream.payload, ord(input[idx]))
+            if ctx.get(in_stream.ready):
+                idx += 1
+            # Responses are written while later requests are parsed.
+            overlapped |= bool(ctx.get(dut.session.outbound.data.valid))
+            await ctx.tick()
+        ctx.set(in_stream.valid, 0)
+        ctx.set(dut.session.inbound.active, 0)
+        await ctx.tick().until(~dut.session.outbound.active)
+        assert not ctx.get(dut.session.outbound.data.valid)
+
+        assert ctx.get(dut.red) == 0x65
+        assert ctx.get(dut.green) == 0x43
+        assert ctx.get(dut.blue) == 0x21
+
+        await ctx.tick()
+
+    sim.add_testbench(driver)
+
+    collector = StreamCollector(stream=dut.session.outbound.data)
+    sim.add_process(collector.collect())
+
+    sim.run_until(0.001)
+
+    collector.assert_eq(expected_output)
+    assert overlapped
+
+
+def test_content_length_framing():
+    dut = SimpleLedHttp()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    input = ("POST /led HTTP/1.0\r\n"
+             "Content-Length: 6\r\n"
+             "\r\n"
+             "123456"
+             # The body isn't parsed for a request line:
+             "GET /coffee HTTP/1.0\r\n"
+             "content-length: 23\r\n"
+             "\r\n"
+             "GET /count HTTP/1.0\r\n\r\n"
+             "POST /led HTTP/1.0\r\n"
+             "Content-Length: 8\r\n"
+             "\r\n"
+             "ABCDEF\r\n"
+             # Without a Content-Length, this is the last request.
+             "GET /nowhere HTTP/1.0\r\n"
+             "\r\n"
+             "GET /count HTTP/1.0\r\n\r\n")
+    expected_output = ("HTTP/1.0 200 OK\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "👍\r\n"
+                       "HTTP/1.0 418 I'm a teapot\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "short and stout\r\n"
+                       "HTTP/1.0 200 OK\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "👍\r\n"
+                       "HTTP/1.0 404 Not Found\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "👎\r\n")
+
+    async def driver(ctx):
+        ctx.set(dut.session.inbound.active, 1)
+        await ctx.tick().until(dut.session.outbound.active)
+
+        in_stream = dut.session.inbound.data
+        ctx.set(in_stream.valid, 1)
+        idx = 0
+        while idx < len(input):
+            ctx.set(in_stream.payload, ord(input[idx]))
+            if ctx.get(in_stream.ready):
+                idx += 1
+            await ctx.tick()
+        ctx.set(in_stream.valid, 0)
+        ctx.set(dut.session.inbound.active, 0)
+        await ctx.tick().until(~dut.session.outbound.active)
+
+        assert ctx.get(dut.red) == 0xAB
+        assert ctx.get(dut.green) == 0xCD
+        assert ctx.get(dut.blue) == 0xEF
+
+    sim.add_testbench(driver)
+
+    collector = StreamCollector(stream=dut.session.outbound.data)
+    sim.add_process(collector.collect())
+
+    sim.run_until(0.001)
+
+    collector.assert_eq(expected_output)
+
+
+
+@pytest.mark.parametrize("content_length", [
+    # Would wrap to 1 in 16 bits:
+    "Content-Length: 65537\r\n",
+    # Would be read as 10:
+    "Content-Length: 1\r\nContent-Length: 0\r\n",
+    # Would be read as 12:
+    "Content-Length: 1 2\r\n",
+])
+def test_invalid_content_length(content_length):
+    dut = SimpleLedHttp()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    input = ("POST /led HTTP/1.0\r\n"
+             + content_length +
+             "\r\n"
+             "1"
+             # Smuggled into the body, if its length were misread:
+             "GET /coffee HTTP/1.0\r\n"
+             "\r\n")
+    expected_output = ("HTTP/1.0 400 Bad Request\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "🚫\r\n")
+
+    async def driver(ctx):
+        ctx.set(dut.session.inbound.active, 1)
+        await ctx.tick().until(dut.session.outbound.active)
+
+        in_stream = dut.session.inbound.data
+        ctx.set(in_stream.valid, 1)
+        idx = 0
+        while idx < len(input):
+            ctx.set(in_stream.payload, ord(input[idx]))
+            if ctx.get(in_stream.ready):
+                idx += 1
+            await ctx.tick()
+        ctx.set(in_stream.valid, 0)
+        ctx.set(dut.session.inbound.active, 0)
+        await ctx.tick().until(~dut.session.outbound.active)
+
+    sim.add_testbench(driver)
+
+    collector = StreamCollector(stream=dut.session.outbound.data)
+    sim.add_process(collector.collect())
+
+    sim.run_until(0.001)
+
+    collector.assert_eq(expected_output)
+
+
+@pytest.mark.parametrize("connection", ["Close", "close \t"])
+def test_connection_close(connection):
+    dut = SimpleLedHttp()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    input = ("POST /led HTTP/1.0\r\n"
+             "Content-Length: 6\r\n"
+             f"Connection: {connection}\r\n"
+             "\r\n"
+             "123456"
+             # After "Connection: close", the rest is discarded.
+             "POST /led HTTP/1.0\r\n"
+             "Content-Length: 6\r\n"
+             "\r\n"
+             "ABCDEF")
+    expected_output = ("HTTP/1.0 200 OK\r\n"
+                       "Host: Fomu\r\n"
+                       "Content-Type: text/plain; charset=utf-8\r\n"
+                       "\r\n"
+                       "👍\r\n")
+
+    async def driver(ctx):
+        ctx.set(dut.session.inbound.active, 1)
+        await ctx.tick().until(dut.session.outbound.active)
+
+        in_stream = dut.session.inbound.data
+        ctx.set(in_stream.valid, 1)
+        idx = 0
+        while idx < len(input):
+            ctx.set(in_stream.payload, ord(input[idx]))
+            if ctx.get(in_stream.ready):
+                idx += 1
+            await ctx.tick()
+        ctx.set(in_stream.valid, 0)
+        ctx.set(dut.session.inbound.active, 0)
+        await ctx.tick().until(~dut.session.outbound.active)
+
+        assert ctx.get(dut.red) == 0x12
+        assert ctx.get(dut.green) == 0x34
+        assert ctx.get(dut.blue) == 0x56
+
+    sim.add_testbench(driver)
+
+    collector = StreamCollector(stream=dut.session.outbound.data)
+    sim.add_process(collector.collect())
+
+    sim.run_until(0.001)
+
+    collector.assert_eq(expected_output)
+
+def test_metrics_handling():
+    dut = SimpleLedHttp()
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+
+    coffee_input = ("GET /coffee HTTP/1.0\r\n"
+                    "\r\n")
+    metrics_input = ("GET /metrics HTTP/1.0\r\n"
+                     "\r\n")
+
+    async def driver(ctx):
+
+        async def send_data(data):
+            ctx.set(dut.session.inbound.active, 1)
+            await ctx.tick().until(dut.session.outbound.active)
+            in_stream = dut.session.inbound.data
+            ctx.set(in_stream.valid, 1)
+            idx = 0
+            while idx < len(data):
+                ctx.set(in_stream.payload, ord(data[idx]))
+                if ctx.get(in_stream.ready):
+                    idx += 1
+                await ctx.tick()
+            ctx.set(dut.session.inbound.active, 0)
+            ctx.set(in_stream.valid, 0)
+            await ctx.tick().until(~dut.session.outbound.active)
+
+        await send_data(coffee_input)
+        await send_data(metrics_input)
+
+    sim.add_testbench(driver)
+
+    collector = StreamCollector(stream=dut.session.outbound.data)
+    sim.add_process(collector.collect())
+
+    sim.run_until(0.05)
+
+    body = collector.body.decode("utf-8")
+    (teapot, metrics) = body.split("HTTP/1.0 200 OK\r\n", 1)
+    assert teapot.startswith("HTTP/1.0 418 I'm a teapot\r\n")
+    (headers, metrics) = metrics.split("\r\n\r\n", 1)
+    assert headers.splitlines() == [
+        "Host: Fomu", "Content-Type: text/plain; version=0.0.4"]
+    # The body is all metrics:
+    assert metrics.startswith("# TYPE http_first_byte_cycles histogram\n")
+    lines = metrics.splitlines()
+    assert lines[-1] == 'http_session_cycles_count{route="/metrics",status="200"} 0'
+    # The teapot session is over:
+    assert 'http_first_byte_cycles_count{route="/coffee",status="418"} 1' in lines
+    assert 'http_session_cycles_count{route="/coffee",status="418"} 1' in lines
+    assert 'http_first_byte_cycles_bucket{route="/coffee",status="418",le="256"} 1' in lines
+    # The metrics session has started its response, but not finished it:
+    assert 'http_first_byte_cycles_count{route="/metrics",status="200"} 1' in lines
+    assert 'http_first_byte_cycles_count{route="/led",status="200"} 0' in lines
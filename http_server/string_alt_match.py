@@ -13,6 +13,7 @@ class StringAltMatch(Component):
 
     WARNING: Shortest-match means that prefix matches don't work;
     "/" | "/style.css" will match "/" without consuming the 's'.
+    Use LongestAltMatch for delimited alternatives that may be prefixes.
 
     Parameters
     ----------
@@ -64,7 +64,8 @@ def test_match():
         # assert (m == 0) and (m is not None)
 
         _m = await run_sequence(ctx, "/style.css")
-        # TODO: Incomplete implementation, does not have prefix matches
+        # TODO: Incomplete implementation, does not have prefix matches;
+        # see LongestAltMatch.
         # assert (m == 1) and (m is not None)
 
         # m = await run_sequence(ctx, "/stone.css")
@@ -0,0 +1,81 @@
+from amaranth import Module, Signal, Const, Mux
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+
+from .widen import wide_layout
+
+
+class WideAtoI(Component):
+    """
+    Converts ASCII digit inputs to a positive integer output,
+    several digits per cycle.
+
+    Like AtoI, for a stream of `lanes` bytes at a time (see Widen).
+    Each lane's digit is accumulated in turn, in a chain of
+    multiply-by-ten-and-add stages, within the cycle.
+
+    Parameters
+    ----------
+    width: int
+           Number of output bits.
+    lanes: int
+           Bytes per input word.
+
+    Attributes
+    ----------
+    input:  Stream(wide_layout(lanes)), in
+            Datastream of characters to convert
+    reset:  Signal(1), in
+            Reset and await a new input
+    error:  Signal(1), out
+            Recieved a non-'0'-'9' input.
+    value:  Signal(width), out
+    """
+
+    def __init__(self, width: int, lanes: int):
+        super().__init__({
+            "input": In(stream.Signature(wide_layout(lanes))),
+            "reset": In(1),
+            "error": Out(1, init=0),
+            "value": Out(width, init=0),
+        })
+        self._width = width
+        self._lanes = lanes
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        # Ready to get data if we're out of reset.
+        m.d.comb += self.input.ready.eq(~self.reset)
+
+        value = self.value
+        error = Const(0, 1)
+        for j in range(self._lanes):
+            c = self.input.payload.data[j]
+            valid = self.input.valid & self.input.payload.mask[j]
+
+            lane_error = Signal(1, name=f"error_{j}")
+            next = Signal(self._width, name=f"value_{j}")
+            m.d.comb += [
+                lane_error.eq(valid & ((c < ord('0')) | (c > ord('9')))),
+                # x*10 = x*8+x*2 = x<<3+x<<1
+                next.eq(Mux(valid,
+                            (value << 3) + (value << 1) + (c - ord('0')),
+                            value)),
+            ]
+            value = next
+            error = error | lane_error
+
+        # Error latches, and holds until next reset
+        with m.If(self.reset):
+            m.d.sync += [
+                self.error.eq(0),
+                self.value.eq(0),
+            ]
+        with m.Else():
+            m.d.sync += [
+                self.error.eq(self.error | error),
+                self.value.eq(value),
+            ]
+
+        return m
@@ -0,0 +1,38 @@
+from amaranth.sim import Simulator
+
+from .wide_atoi import WideAtoI
+from stream_fixtures import WideStreamSender
+
+
+def run_atoi(lanes: int, input: str):
+    dut = WideAtoI(32, lanes)
+    sender = WideStreamSender(dut.input, lanes, random_delay=True,
+                              random_partial=True)
+    result = []
+
+    async def bench(ctx):
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        await sender.send_active(input)(ctx)
+        result.append((ctx.get(dut.value), ctx.get(dut.error)))
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+    return result[0]
+
+
+def test_simple():
+    for lanes in [2, 4]:
+        for input in ["1", "12", "123", "1234", "12345", "4294967295"]:
+            assert run_atoi(lanes, input) == (int(input), 0), input
+
+
+def test_error():
+    for lanes in [2, 4]:
+        (_, error) = run_atoi(lanes, "12A4")
+        assert error
+        (_, error) = run_atoi(lanes, "12/")
+        assert error
@@ -0,0 +1,106 @@
+from amaranth import Module, Signal
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+
+from .capitalizer import Capitalizer
+from .widen import wide_layout
+
+
+class WideStringContainsMatch(Component):
+    """
+    Matches a literal string in a stream, several bytes per cycle.
+
+    Like StringContainsMatch, for a stream of `lanes` bytes at a time (see
+    Widen): looks to see if the stream contains the substring, even if it
+    doesn't start with it. The string is compared at every lane, against
+    that lane and the bytes before it; so the cost is a comparator per byte
+    of the string, per lane.
+
+    Returns "accepted" upon match.
+
+    Parameters
+    ----------
+    message:    str
+                String to match.
+    lanes:      int
+                Bytes per input word.
+    match_case: bool, default true
+                Perform a case-sensitive match.
+                Case folding is ASCII-only.
+
+    Attributes
+    ----------
+    input:      Stream(wide_layout(lanes)), in
+                Data stream to match.
+    accepted:   Signal(1), out
+                High if the string has been matched.
+    reset:      Signal(1), in
+                Reset and await new input.
+    """
+
+    def __init__(self, message: str, lanes: int, match_case: bool = True):
+        super().__init__({
+            "input": In(stream.Signature(wide_layout(lanes))),
+            "accepted": Out(1),
+            "reset": In(1),
+        })
+
+        if not match_case:
+            message = message.upper()
+        self._message = list(map(ord, message))
+        self._lanes = lanes
+        self._match_case = match_case
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        lanes = self._lanes
+        message = self._message
+        length = len(message)
+
+        m.d.comb += self.input.ready.eq(~self.reset)
+
+        # Case-normalized data:
+        chars = []
+        for j in range(lanes):
+            c = Signal(8, name=f"c_{j}")
+            if self._match_case:
+                m.d.comb += c.eq(self.input.payload.data[j])
+            else:
+                m.submodules[f"capitalizer_{j}"] = capitalizer = Capitalizer()
+                m.d.comb += [
+                    capitalizer.input.eq(self.input.payload.data[j]),
+                    c.eq(capitalizer.output),
+                ]
+            chars.append(c)
+
+        # The most recent bytes before this word, most recent first.
+        history = [Signal(8, name=f"history_{i}") for i in range(length - 1)]
+
+        # Does the string end at lane j?
+        matched = Signal(lanes)
+        for j in range(lanes):
+            # The bytes ending at lane j, most recent first:
+            window = (list(reversed(chars[:j + 1])) + history)[:length]
+            match_j = self.input.payload.mask[j]
+            for k in range(length):
+                match_j = match_j & (window[k] == message[length - 1 - k])
+            m.d.comb += matched[j].eq(match_j)
+
+        latched_accept = Signal(1)
+        m.d.comb += self.accepted.eq(
+            latched_accept | (self.input.valid & matched.any()))
+
+        with m.If(self.reset):
+            m.d.sync += latched_accept.eq(0)
+            m.d.sync += [h.eq(0) for h in history]
+        with m.Elif(self.input.valid):
+            m.d.sync += latched_accept.eq(self.accepted)
+            # Shift in however many lanes are valid.
+            with m.Switch(self.input.payload.mask):
+                for n in range(1, lanes + 1):
+                    with m.Case((1 << n) - 1):
+                        shifted = (list(reversed(chars[:n])) + history)[:length - 1]
+                        m.d.sync += [h.eq(s) for (h, s) in zip(history, shifted)]
+
+        return m
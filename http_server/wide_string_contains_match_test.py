@@ -0,0 +1,50 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .wide_string_contains_match import WideStringContainsMatch
+from stream_fixtures import WideStreamSender
+
+
+def run_contains(message: str, lanes: int, input: str, match_case: bool = True):
+    dut = WideStringContainsMatch(message, lanes, match_case=match_case)
+    sender = WideStreamSender(dut.input, lanes, random_delay=True,
+                              random_partial=True)
+    result = []
+
+    async def bench(ctx):
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        await sender.send_active(input)(ctx)
+        result.append(ctx.get(dut.accepted))
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+    return result[0]
+
+
+def test_contains():
+    for lanes in [2, 4]:
+        for _ in range(4):
+            assert run_contains("\r\n\r\n", lanes, "GET / HTTP/1.0\r\nHost: x\r\n\r\n")
+            assert run_contains("\r\n\r\n", lanes, "\r\n\r\n")
+            assert run_contains("\r\n\r\n", lanes, "\r\n\r\nmore")
+            assert not run_contains("\r\n\r\n", lanes, "GET / HTTP/1.0\r\nHost: x\r\n")
+            assert not run_contains("\r\n\r\n", lanes, "\r\n\r")
+
+
+def test_case():
+    assert run_contains("host:", 4, "Content-Length: 3\r\nHOST: x", match_case=False)
+    assert not run_contains("host:", 4, "Content-Length: 3\r\nHOST: x")
+
+
+def test_random():
+    message = "abca"
+    for lanes in [2, 4]:
+        for _ in range(10):
+            input = "".join(random.choice("abc") for _ in range(12))
+            want = message in input
+            assert run_contains(message, lanes, input) == want, input
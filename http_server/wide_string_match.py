@@ -0,0 +1,123 @@
+from amaranth import Module, Signal, Array
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream
+
+from .capitalizer import Capitalizer
+from .widen import wide_layout
+
+
+class WideStringMatch(Component):
+    """
+    Matches a literal string in a stream, several bytes per cycle.
+
+    Like StringMatch, for a stream of `lanes` bytes at a time (see Widen).
+    Returns "accepted" or "rejected" immediately upon match.
+
+    A word is consumed whole; if the string ends before the end of the word,
+    `end` indicates the lane of the last byte of the string, so the following
+    lanes can be passed on.
+
+    Parameters
+    ----------
+    message:    str
+                String to match.
+    lanes:      int
+                Bytes per input word.
+    match_case: bool, default true
+                Perform a case-sensitive match.
+                Case folding is ASCII-only.
+
+    Attributes
+    ----------
+    input:      Stream(wide_layout(lanes)), in
+                Data stream to match.
+    accepted:   Signal(1), out
+                High if the string has been matched.
+    end:        Signal(range(lanes)), out
+                If accepted, the lane of the last byte of the string in the
+                last word consumed.
+    rejected:   Signal(1), out
+                High if the input has been rejected (will never match).
+    reset:      Signal(1), in
+                Reset and await new input.
+    """
+
+    def __init__(self, message: str, lanes: int, match_case: bool = True):
+        super().__init__({
+            "input": In(stream.Signature(wide_layout(lanes))),
+            "accepted": Out(1),
+            "end": Out(range(lanes)),
+            "rejected": Out(1),
+            "reset": In(1),
+        })
+
+        if not match_case:
+            message = message.upper()
+        self._message = message
+        self._lanes = lanes
+        self._match_case = match_case
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        lanes = self._lanes
+        length = len(self._message)
+        # Pad, so every lane's index is in range:
+        message = Array(map(ord, self._message + "\0" * lanes))
+
+        # Position in the message of lane 0.
+        idx = Signal(range(length + 1))
+
+        # Case-normalized data:
+        chars = []
+        for j in range(lanes):
+            c = Signal(8, name=f"c_{j}")
+            if self._match_case:
+                m.d.comb += c.eq(self.input.payload.data[j])
+            else:
+                m.submodules[f"capitalizer_{j}"] = capitalizer = Capitalizer()
+                m.d.comb += [
+                    capitalizer.input.eq(self.input.payload.data[j]),
+                    c.eq(capitalizer.output),
+                ]
+            chars.append(c)
+
+        # Lanes that hold a byte of the string, but the wrong one:
+        mismatch = Signal(lanes)
+        for j in range(lanes):
+            m.d.comb += mismatch[j].eq(
+                self.input.payload.mask[j] & (idx + j < length)
+                & (chars[j] != message[idx + j]))
+        # Valid lanes are contiguous, so this is the number of bytes:
+        count = Signal(range(lanes + 1))
+        m.d.comb += count.eq(sum(self.input.payload.mask[j] for j in range(lanes)))
+
+        end = Signal(range(lanes))
+
+        with m.FSM():
+            with m.State("matching"):
+                m.d.comb += self.input.ready.eq(~self.reset)
+                with m.If(self.input.valid & self.input.ready):
+                    with m.If(mismatch.any()):
+                        m.next = "rejected"
+                    with m.Elif(idx + count >= length):
+                        m.d.sync += end.eq(length - 1 - idx)
+                        m.next = "accepted"
+                    with m.Else():
+                        m.d.sync += idx.eq(idx + count)
+            with m.State("accepted"):
+                m.d.comb += [
+                    self.accepted.eq(1),
+                    self.end.eq(end),
+                ]
+                with m.If(self.reset):
+                    m.next = "matching"
+            with m.State("rejected"):
+                m.d.comb += self.rejected.eq(1)
+                with m.If(self.reset):
+                    m.next = "matching"
+
+        with m.If(self.reset):
+            m.d.sync += idx.eq(0)
+
+        return m
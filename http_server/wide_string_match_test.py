@@ -0,0 +1,104 @@
+from amaranth.sim import Simulator
+
+from .wide_string_match import WideStringMatch
+from stream_fixtures import WideStreamSender
+
+
+def run_cases(message: str, lanes: int, cases: list[tuple[str, bool]],
+              match_case: bool = True):
+    """
+    Runs each input (followed by padding) into the DUT, in random partial
+    words, until accepted or rejected; and checks the result.
+    """
+    dut = WideStringMatch(message, lanes, match_case=match_case)
+    sender = WideStreamSender(dut.input, lanes, random_partial=True)
+
+    async def run_sequence(ctx, input: str):
+        ctx.set(dut.reset, 1)
+        await ctx.tick()
+        ctx.set(dut.reset, 0)
+        assert not ctx.get(dut.accepted)
+        assert not ctx.get(dut.rejected)
+
+        words = sender.words((input + "    ").encode("utf-8"))
+        consumed = 0
+        for word in words:
+            if ctx.get(dut.accepted) or ctx.get(dut.rejected):
+                break
+            assert ctx.get(dut.input.ready)
+            for (j, datum) in enumerate(word):
+                ctx.set(dut.input.payload.data[j], datum)
+            ctx.set(dut.input.payload.mask, (1 << len(word)) - 1)
+            ctx.set(dut.input.valid, 1)
+            await ctx.tick()
+            consumed += len(word)
+            last = word
+        ctx.set(dut.input.valid, 0)
+
+        # After matching-or-not, this is no longer "ready" for input.
+        assert not ctx.get(dut.input.ready)
+        if ctx.get(dut.accepted):
+            # The string ends at `end` of the last word.
+            end = consumed - len(last) + ctx.get(dut.end) + 1
+            assert end == len(message), (end, input)
+            return True
+        assert ctx.get(dut.rejected)
+        return False
+
+    async def bench(ctx):
+        for (input, want) in cases:
+            got = await run_sequence(ctx, input)
+            assert got == want, f"input {input!r}: got {got}, want {want}"
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
+
+
+def test_match_sensitive():
+    for lanes in [2, 4]:
+        run_cases("Hello", lanes, [
+            ("Hello", True),
+            ("Hello world", True),
+            ("hello", False),
+            ("Help", False),
+            ("Hell", False),
+            ("ello", False),
+        ] * 4)
+
+
+def test_match_insensitive():
+    for lanes in [2, 4]:
+        run_cases("Hello", lanes, [
+            ("Hello", True),
+            ("hELLO", True),
+            ("Help", False),
+        ] * 4, match_case=False)
+
+
+def test_throughput():
+    """
+    Consumes a full word every cycle.
+    """
+    message = "GET /index.html HTTP/1.0"
+    dut = WideStringMatch(message, 4)
+
+    async def bench(ctx):
+        ctx.set(dut.input.valid, 1)
+        ctx.set(dut.input.payload.mask, 0xF)
+        cycles = 0
+        for i in range(0, len(message), 4):
+            for (j, datum) in enumerate(message[i:i + 4].encode("utf-8")):
+                ctx.set(dut.input.payload.data[j], datum)
+            assert ctx.get(dut.input.ready)
+            await ctx.tick()
+            cycles += 1
+        assert ctx.get(dut.accepted)
+        assert ctx.get(dut.end) == 3
+        assert cycles == len(message) // 4
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
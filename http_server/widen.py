@@ -0,0 +1,99 @@
+from amaranth import Module, Signal, Cat
+from amaranth.lib.wiring import In, Out, Component
+from amaranth.lib import stream, data
+
+
+def wide_layout(lanes: int) -> data.StructLayout:
+    """
+    Layout of a multi-byte stream payload.
+
+    `data` holds up to `lanes` bytes, in stream order from lane 0;
+    `mask` has a bit set for each lane that holds a byte.
+    Valid lanes are always contiguous from lane 0: only the low bits
+    of `mask` are set.
+    """
+    return data.StructLayout({
+        "data": data.ArrayLayout(8, lanes),
+        "mask": lanes,
+    })
+
+
+class Widen(Component):
+    """
+    Converts a byte stream to a stream of `lanes` bytes at a time.
+
+    Bytes are packed into a word as they arrive; a full word is output as soon
+    as its last byte arrives. If the input has no byte in a cycle, a partially
+    filled word is output, rather than holding its bytes until more arrive;
+    the mask indicates which lanes are filled.
+
+    The output is registered, so the conversion adds a cycle of latency.
+
+    Widen and the Wide* matchers are building blocks only: no server is
+    built on them yet. The transports (serial and USB) deliver at most a
+    byte per cycle, and SimpleLedHttp keeps up with that at one byte per
+    cycle; a wide parser only pays off behind a faster transport, or
+    shared between sessions.
+
+    Parameters
+    ----------
+    lanes: int
+           Bytes per output word.
+
+    Attributes
+    ----------
+    input:  Stream(8), in
+    output: Stream(wide_layout(lanes)), out
+    """
+
+    def __init__(self, lanes: int):
+        if lanes < 1:
+            raise ValueError("lanes must be positive")
+        super().__init__({
+            "input": In(stream.Signature(8)),
+            "output": Out(stream.Signature(wide_layout(lanes))),
+        })
+        self._lanes = lanes
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        lanes = self._lanes
+        # Bytes held for the next word:
+        held = [Signal(8, name=f"held_{i}") for i in range(lanes - 1)]
+        count = Signal(range(lanes))
+
+        # A word can be output if the output register is empty, or will be.
+        out_free = Signal(1)
+        m.d.comb += [
+            out_free.eq(~self.output.valid | self.output.ready),
+            self.input.ready.eq(out_free),
+        ]
+        with m.If(self.output.ready):
+            m.d.sync += self.output.valid.eq(0)
+
+        with m.If(self.input.valid & self.input.ready):
+            with m.If(count == lanes - 1):
+                # This byte fills the word.
+                m.d.sync += [
+                    self.output.payload.data.eq(Cat(*held, self.input.payload)),
+                    self.output.payload.mask.eq((1 << lanes) - 1),
+                    self.output.valid.eq(1),
+                    count.eq(0),
+                ]
+            with m.Else():
+                with m.Switch(count):
+                    for i in range(lanes - 1):
+                        with m.Case(i):
+                            m.d.sync += held[i].eq(self.input.payload)
+                m.d.sync += count.eq(count + 1)
+        with m.Elif((count != 0) & out_free):
+            # No byte this cycle; flush what we have.
+            m.d.sync += [
+                self.output.payload.data.eq(Cat(*held, 0)),
+                self.output.payload.mask.eq((1 << count) - 1),
+                self.output.valid.eq(1),
+                count.eq(0),
+            ]
+
+        return m
@@ -0,0 +1,79 @@
+import random
+
+from amaranth.sim import Simulator
+
+from .widen import Widen
+from stream_fixtures import StreamSender
+
+
+def run_widen(lanes: int, data: bytes, random_delay: bool, random_backpressure: bool):
+    dut = Widen(lanes)
+    sender = StreamSender(dut.input, random_delay=random_delay)
+    words = []
+
+    async def collector(ctx):
+        ready = 1
+        async for clk_edge, rst_value, valid, payload in ctx.tick().sample(
+                dut.output.valid, dut.output.payload):
+            if rst_value or (not clk_edge):
+                continue
+            if ready and valid:
+                mask = payload.mask
+                # Valid lanes are contiguous from lane 0.
+                assert mask != 0 and (mask & (mask + 1)) == 0, mask
+                words.append(bytes(payload.data[j] for j in range(lanes)
+                                   if mask & (1 << j)))
+            ready = (not random_backpressure) or random.randint(0, 1)
+            ctx.set(dut.output.ready, ready)
+
+    async def driver(ctx):
+        ctx.set(dut.output.ready, 1)
+        await sender.send_active(data)(ctx)
+        await ctx.tick().repeat(lanes + 4)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_process(collector)
+    sim.add_testbench(driver)
+    sim.run()
+
+    assert b"".join(words) == data
+    return words
+
+
+def test_full_words():
+    data = bytes(range(32))
+    for lanes in [1, 2, 4]:
+        words = run_widen(lanes, data, random_delay=False, random_backpressure=False)
+        assert all(len(word) == lanes for word in words), words
+
+
+def test_random():
+    data = bytes(random.randint(0, 255) for _ in range(100))
+    for lanes in [2, 4]:
+        run_widen(lanes, data, random_delay=True, random_backpressure=True)
+
+
+def test_throughput():
+    """
+    The output keeps up with a byte per cycle of input.
+    """
+    dut = Widen(4)
+
+    async def bench(ctx):
+        ctx.set(dut.output.ready, 1)
+        ctx.set(dut.input.valid, 1)
+        words = []
+        for i in range(16):
+            assert ctx.get(dut.input.ready)
+            ctx.set(dut.input.payload, i)
+            await ctx.tick()
+            if ctx.get(dut.output.valid):
+                assert ctx.get(dut.output.payload.mask) == 0xF
+                words.append([ctx.get(dut.output.payload.data[j]) for j in range(4)])
+        assert words == [list(range(i, i + 4)) for i in range(0, 16, 4)], words
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(bench)
+    sim.run()
@@ -0,0 +1,481 @@
+from amaranth import Module, Signal, Const, Array, Cat, Mux, unsigned
+from amaranth.lib.wiring import Component, In, Out
+from amaranth.lib import stream, data, memory
+from amaranth.utils import ceil_log2
+
+from not_tcp.not_tcp import Flags
+from http_server.multi_contains_match import compile_patterns
+from http_server.response_rom import ResponseRom
+from http_server.responses import (RESPONSE_OK, RESPONSE_404, RESPONSE_405,
+                                   RESPONSE_TEAPOT, RESPONSE_400,
+                                   STATIC_RESPONSES)
+
+
+class MultiSessionHttpServer(Component):
+    """
+    A serial-to-HTTP server for many concurrent sessions, with one parser.
+
+    NtcpHttpServer serves one Not TCP stream with a SimpleLedHttp; serving
+    more streams that way takes a copy of every matcher per stream. Instead,
+    this server keeps the whole parse state of a session in a small context
+    record: the request phase, the state of a shared matcher automaton,
+    the fields matched so far, and the partial LED body. A context table in
+    memory holds a record for each session.
+
+    The table is read while a packet's header arrives, so the record is
+    loaded by the time the packet body starts; and the record is written
+    back as the next packet's header starts. Switching sessions between
+    packets costs no cycles beyond the packet header.
+
+    Each session carries one HTTP/1.0 request; the response is written as a
+    single packet as soon as the request has been parsed, and the rest of the
+    session's input is discarded. It serves the same LED and coffee routes as
+    SimpleLedHttp:
+
+    - POST to /led, with a body of "rrggbb\\r\\n" (the trailing "\\r\\n" may
+      be omitted if the session ends after the body).
+    - GET or BREW to /coffee.
+
+    Headers are skipped, other than Content-Length. If a request has one,
+    its body ends after that many bytes, or at its delimiter if that's
+    sooner. As for SimpleLedHttp, a Content-Length that isn't a valid
+    number (or is repeated) gets a 400 Bad Request.
+
+    Parameters
+    ----------
+    sessions: int
+        Number of sessions. Stream IDs 0 through sessions-1 are served;
+        packets for other streams are discarded.
+
+    Attributes
+    ----------
+    tx:     Stream(8), out
+    rx:     Stream(8), in
+            Not TCP packet streams, to and from the host.
+
+    red:    Signal(8), out
+    green:  Signal(8), out
+    blue:   Signal(8), out
+            r/g/b values to send to LEDs.
+    """
+
+    tx: Out(stream.Signature(8))
+    rx: In(stream.Signature(8))
+
+    red: Out(8)
+    green: Out(8)
+    blue: Out(8)
+
+    # Request phases:
+    PHASE_METHOD = 0
+    PHASE_PATH = 1
+    PHASE_PROTOCOL = 2
+    PHASE_HEADERS = 3
+    PHASE_LENGTH = 4
+    PHASE_BODY = 5
+    PHASE_DONE = 6
+
+    METHODS = ["GET", "POST", "BREW"]
+    PATHS = ["/led", "/coffee"]
+    END_OF_HEADERS = "\r\n\r\n"
+    # Matched against upper-cased headers:
+    CONTENT_LENGTH = "\nCONTENT-LENGTH:"
+    # Bits of a Content-Length:
+    LENGTH_BITS = 16
+
+    # Digits in an LED body:
+    LED_DIGITS = 6
+
+    def __init__(self, sessions=16):
+        if sessions < 1 or sessions > 256:
+            raise ValueError("sessions must be between 1 and 256")
+        super().__init__()
+        self._sessions = sessions
+
+        (self._classes, self._transitions, self._outputs) = compile_patterns(
+            self.METHODS + self.PATHS
+            + [self.END_OF_HEADERS, self.CONTENT_LENGTH])
+        state_bits = max(ceil_log2(len(self._transitions)), 1)
+
+        self._context = data.StructLayout({
+            "phase": range(self.PHASE_DONE + 1),
+            "matcher": state_bits,
+            "method": len(self.METHODS),
+            "path": len(self.PATHS),
+            # Hex digits of the LED body seen so far; one more once its
+            # "\r" has been seen.
+            "digits": range(self.LED_DIGITS + 2),
+            "value": 4 * self.LED_DIGITS,
+            # Content-Length: whether the request has one, and the bytes of
+            # body remaining; and, while it's parsed, whether it has digits,
+            # whether whitespace has followed them, and whether it's invalid.
+            "has_length": 1,
+            "length": self.LENGTH_BITS,
+            "length_digits": 1,
+            "length_spaced": 1,
+            "bad_length": 1,
+            "response": range(len(STATIC_RESPONSES)),
+            "responded": 1,
+        })
+
+        self._responses = [r.encode("utf-8") for r in STATIC_RESPONSES]
+        for response in self._responses:
+            # Each response is sent as a single packet.
+            assert len(response) < 256
+
+    def elaborate(self, platform):
+        m = Module()
+
+        ## Context table, indexed by stream ID.
+        m.submodules.contexts = contexts = memory.Memory(
+            shape=self._context, depth=self._sessions, init=[])
+        save = contexts.write_port()
+        restore = contexts.read_port(transparent_for=(save,))
+
+        # Context of the session being parsed:
+        ctx = Signal(self._context)
+        # ...after this cycle's input, if any:
+        step = Signal(self._context)
+        # ...and after the end of the session, if it ends this cycle:
+        next = Signal(self._context)
+        # A byte is parsed this cycle:
+        parse = Signal(1)
+        c = self.rx.payload
+        # The session ends this cycle:
+        ending = Signal(1)
+        # Load a context into `ctx` instead of stepping it:
+        load = Signal(1)
+        load_ctx = Signal(self._context)
+
+        ## Matcher automaton: finds methods, paths, and the end of the headers.
+        n_states = len(self._transitions)
+        n_classes = len(self._classes) + 1
+        class_bits = max(ceil_log2(n_classes), 1)
+        state_bits = len(ctx.matcher)
+        # Header names are matched case-insensitively:
+        folded = Signal(8)
+        m.d.comb += folded.eq(c)
+        with m.If((ctx.phase == self.PHASE_HEADERS)
+                  & (c >= ord('a')) & (c <= ord('z'))):
+            m.d.comb += folded.eq(c - 0x20)
+        char_class = Signal(class_bits)
+        with m.Switch(folded):
+            for (char, cls) in self._classes.items():
+                with m.Case(char):
+                    m.d.comb += char_class.eq(cls)
+        init = []
+        for state in range(n_states):
+            init += self._transitions[state] + [0] * ((1 << class_bits) - n_classes)
+        m.submodules.table = table = memory.Memory(
+            shape=unsigned(state_bits), depth=len(init), init=init)
+        matcher_step = table.read_port()
+        # The read port's data register holds the matcher state, unless
+        # a context has been loaded since the last step.
+        loaded = Signal(1, init=1)
+        matcher_state = Signal(state_bits)
+        m.d.comb += [
+            matcher_state.eq(Mux(loaded, ctx.matcher, matcher_step.data)),
+            matcher_step.addr.eq(Cat(char_class, matcher_state)),
+            matcher_step.en.eq(parse),
+        ]
+        with m.If(load):
+            m.d.sync += loaded.eq(1)
+        with m.Elif(parse):
+            m.d.sync += loaded.eq(0)
+
+        # Patterns that end with the last byte parsed:
+        matches = Signal(len(self.METHODS) + len(self.PATHS) + 2)
+        with m.Switch(matcher_state):
+            for (s, mask) in enumerate(self._outputs):
+                if mask != 0:
+                    with m.Case(s):
+                        m.d.comb += matches.eq(mask)
+        method_matches = matches[:len(self.METHODS)]
+        path_matches = matches[len(self.METHODS):-2]
+        end_of_headers = matches[-2]
+        content_length = matches[-1]
+
+        ## Parser: one byte (or end-of-headers) at a time.
+        def method(name):
+            return ctx.method[self.METHODS.index(name)]
+
+        def path(name):
+            return ctx.path[self.PATHS.index(name)]
+
+        def done(response):
+            return [
+                step.phase.eq(self.PHASE_DONE),
+                step.response.eq(response),
+            ]
+
+        # The LED body has been accepted.
+        led_accept = Signal(1)
+
+        hex_numeric = (c >= ord('0')) & (c <= ord('9'))
+        is_space = (c == ord(' ')) | (c == ord('\t'))
+        # Content-Length with the next digit, with room for a carry:
+        next_length = Signal(self.LENGTH_BITS + 4)
+        m.d.comb += next_length.eq(
+            (ctx.length << 3) + (ctx.length << 1) + (c - ord('0'))[:4])
+        # The last byte of a body with a Content-Length is parsed:
+        body_end = Signal(1)
+        hex_alpha = (c >= ord('A')) & (c <= ord('F'))
+        nibble = Mux(hex_numeric, c - ord('0'), c - ord('A') + 0xA)
+
+        m.d.comb += [
+            step.eq(ctx),
+            step.matcher.eq(matcher_state),
+        ]
+        with m.Switch(ctx.phase):
+            with m.Case(self.PHASE_METHOD):
+                m.d.comb += step.method.eq(ctx.method | method_matches)
+                with m.If(parse & (c == ord(' '))):
+                    m.d.comb += step.phase.eq(self.PHASE_PATH)
+            with m.Case(self.PHASE_PATH):
+                m.d.comb += step.path.eq(ctx.path | path_matches)
+                with m.If(parse & (c == ord(' '))):
+                    m.d.comb += step.phase.eq(self.PHASE_PROTOCOL)
+            with m.Case(self.PHASE_PROTOCOL):
+                with m.If(parse & (c == ord('\n'))):
+                    m.d.comb += step.phase.eq(self.PHASE_HEADERS)
+            with m.Case(self.PHASE_HEADERS):
+                # Doesn't take input while routing, below;
+                # or as a Content-Length starts.
+                with m.If(end_of_headers):
+                    with m.If(ctx.bad_length):
+                        m.d.comb += done(RESPONSE_400)
+                    with m.Elif(path("/led")):
+                        with m.If(~method("POST")):
+                            m.d.comb += done(RESPONSE_405)
+                        with m.Elif(ctx.has_length & (ctx.length == 0)):
+                            # An empty body.
+                            m.d.comb += done(RESPONSE_404)
+                        with m.Else():
+                            m.d.comb += step.phase.eq(self.PHASE_BODY)
+                    with m.Elif(path("/coffee")):
+                        with m.If(method("GET") | method("BREW")):
+                            m.d.comb += done(RESPONSE_TEAPOT)
+                        with m.Else():
+                            m.d.comb += done(RESPONSE_405)
+                    with m.Else():
+                        m.d.comb += done(RESPONSE_404)
+                with m.Elif(content_length):
+                    m.d.comb += [
+                        step.phase.eq(self.PHASE_LENGTH),
+                        step.has_length.eq(1),
+                        step.length.eq(0),
+                        step.length_digits.eq(0),
+                        step.length_spaced.eq(0),
+                        # Repeated:
+                        step.bad_length.eq(ctx.bad_length | ctx.has_length),
+                    ]
+            with m.Case(self.PHASE_LENGTH):
+                with m.If(parse):
+                    with m.If(c == ord('\r')):
+                        m.d.comb += [
+                            step.phase.eq(self.PHASE_HEADERS),
+                            step.bad_length.eq(
+                                ctx.bad_length | ~ctx.length_digits),
+                        ]
+                    with m.Elif(is_space):
+                        m.d.comb += step.length_spaced.eq(ctx.length_digits)
+                    with m.Elif(hex_numeric & ~ctx.length_spaced):
+                        m.d.comb += [
+                            step.length.eq(next_length),
+                            step.length_digits.eq(1),
+                            step.bad_length.eq(
+                                ctx.bad_length
+                                | (next_length[self.LENGTH_BITS:] != 0)),
+                        ]
+                    with m.Else():
+                        m.d.comb += step.bad_length.eq(1)
+            with m.Case(self.PHASE_BODY):
+                with m.If(parse & ctx.has_length):
+                    m.d.comb += [
+                        step.length.eq(ctx.length - 1),
+                        body_end.eq(ctx.length == 1),
+                    ]
+                with m.If(parse):
+                    with m.If(ctx.digits < self.LED_DIGITS):
+                        with m.If(hex_numeric | hex_alpha):
+                            m.d.comb += [
+                                step.digits.eq(ctx.digits + 1),
+                                step.value.eq(Cat(nibble[:4], ctx.value)),
+                            ]
+                        with m.Else():
+                            m.d.comb += done(RESPONSE_404)
+                    with m.Elif(ctx.digits == self.LED_DIGITS):
+                        with m.If(c == ord('\r')):
+                            m.d.comb += step.digits.eq(ctx.digits + 1)
+                        with m.Else():
+                            m.d.comb += done(RESPONSE_404)
+                    with m.Else():
+                        with m.If(c == ord('\n')):
+                            m.d.comb += [
+                                done(RESPONSE_OK),
+                                led_accept.eq(1),
+                            ]
+                        with m.Else():
+                            m.d.comb += done(RESPONSE_404)
+
+        # At the end of the session, or of a body with a Content-Length,
+        # a request that hasn't been completed is either a complete LED body
+        # without its "\r\n", or an error.
+        m.d.comb += next.eq(step)
+        with m.If((ending | body_end) & (step.phase != self.PHASE_DONE)):
+            with m.If((step.phase == self.PHASE_BODY)
+                      & (step.digits >= self.LED_DIGITS)):
+                m.d.comb += [
+                    next.phase.eq(self.PHASE_DONE),
+                    next.response.eq(RESPONSE_OK),
+                    led_accept.eq(1),
+                ]
+            with m.Else():
+                m.d.comb += [
+                    next.phase.eq(self.PHASE_DONE),
+                    next.response.eq(RESPONSE_404),
+                ]
+
+        with m.If(load):
+            m.d.sync += ctx.eq(load_ctx)
+        with m.Else():
+            m.d.sync += ctx.eq(next)
+        with m.If(led_accept):
+            m.d.sync += [
+                self.red.eq(next.value[16:24]),
+                self.green.eq(next.value[8:16]),
+                self.blue.eq(next.value[0:8]),
+            ]
+
+        ## Responder
+        m.submodules.response_rom = response_rom = ResponseRom(self._responses)
+        response_lengths = Array(Const(len(r), 8) for r in self._responses)
+        response_flags = Signal(Flags)
+        m.d.comb += [
+            response_flags.start.eq(1),
+            response_flags.end.eq(1),
+            response_flags.to_host.eq(1),
+        ]
+
+        ## Packets
+        stream_id = Signal(8)
+        length = Signal(8)
+        flags = Signal(Flags)
+        # Whether this packet's stream has a context:
+        served = Signal(1)
+        response = Signal(range(len(STATIC_RESPONSES)))
+        response_stream = Signal(8)
+        # The next packet's header started before the response:
+        resume_header = Signal(1)
+
+        m.d.comb += [
+            restore.addr.eq(stream_id),
+            restore.en.eq(0),
+            save.addr.eq(stream_id),
+            save.data.eq(next),
+            load_ctx.eq(restore.data),
+            response_rom.select.eq(response),
+        ]
+
+        # The packet that just ended has yet to be saved:
+        saving = Signal(1)
+
+        with m.FSM():
+            with m.State("stream"):
+                m.d.comb += self.rx.ready.eq(1)
+                with m.If(self.rx.valid):
+                    m.d.sync += stream_id.eq(self.rx.payload)
+                    m.next = "length"
+                with m.If(saving & served):
+                    # Save the context, while taking the next packet's header.
+                    m.d.comb += [
+                        ending.eq(flags.end),
+                        save.en.eq(1),
+                    ]
+                    with m.If((next.phase == self.PHASE_DONE) & ~next.responded):
+                        m.d.comb += save.data.responded.eq(1)
+                        m.d.sync += [
+                            response.eq(next.response),
+                            response_stream.eq(stream_id),
+                            resume_header.eq(self.rx.valid),
+                        ]
+                        m.next = "respond_stream"
+                m.d.sync += saving.eq(0)
+            with m.State("length"):
+                m.d.comb += self.rx.ready.eq(1)
+                with m.If(self.rx.valid):
+                    m.d.sync += length.eq(self.rx.payload)
+                    # Start reading the context.
+                    m.d.comb += restore.en.eq(1)
+                    m.next = "flags"
+            with m.State("flags"):
+                m.d.comb += self.rx.ready.eq(1)
+                with m.If(self.rx.valid):
+                    packet_flags = Flags(self.rx.payload)
+                    m.d.sync += [
+                        flags.eq(packet_flags),
+                        served.eq((stream_id < self._sessions)
+                                  & ~packet_flags.to_host),
+                    ]
+                    m.d.comb += load.eq(1)
+                    with m.If(packet_flags.start):
+                        # A new session.
+                        m.d.comb += load_ctx.eq(0)
+                    with m.If(length == 0):
+                        m.d.sync += saving.eq(1)
+                        m.next = "stream"
+                    with m.Else():
+                        m.next = "body"
+            with m.State("body"):
+                with m.If(served & (ctx.phase != self.PHASE_DONE)):
+                    # Hold the input while routing at the end of the headers,
+                    # and as a Content-Length starts.
+                    m.d.comb += [
+                        self.rx.ready.eq(
+                            (ctx.phase != self.PHASE_HEADERS)
+                            | ~(end_of_headers | content_length)),
+                        parse.eq(self.rx.valid & self.rx.ready),
+                    ]
+                with m.Else():
+                    # Discard the body.
+                    m.d.comb += self.rx.ready.eq(1)
+                with m.If(self.rx.valid & self.rx.ready):
+                    m.d.sync += length.eq(length - 1)
+                    with m.If(length == 1):
+                        m.d.sync += saving.eq(1)
+                        m.next = "stream"
+            with m.State("respond_stream"):
+                m.d.comb += [
+                    self.tx.payload.eq(response_stream),
+                    self.tx.valid.eq(1),
+                ]
+                with m.If(self.tx.ready):
+                    m.next = "respond_length"
+            with m.State("respond_length"):
+                m.d.comb += [
+                    self.tx.payload.eq(response_lengths[response]),
+                    self.tx.valid.eq(1),
+                ]
+                with m.If(self.tx.ready):
+                    m.next = "respond_flags"
+            with m.State("respond_flags"):
+                m.d.comb += [
+                    self.tx.payload.eq(response_flags),
+                    self.tx.valid.eq(1),
+                ]
+                with m.If(self.tx.ready):
+                    m.d.comb += response_rom.en.eq(1)
+                    m.next = "respond_body"
+            with m.State("respond_body"):
+                m.d.comb += [
+                    self.tx.payload.eq(response_rom.output.payload),
+                    self.tx.valid.eq(response_rom.output.valid),
+                    response_rom.output.ready.eq(self.tx.ready),
+                ]
+                with m.If(response_rom.done):
+                    with m.If(resume_header):
+                        m.next = "length"
+                    with m.Else():
+                        m.next = "stream"
+
+        return m
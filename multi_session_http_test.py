@@ -0,0 +1,218 @@
+import random
+
+from amaranth.sim import Simulator
+
+from not_tcp.host import Packet, Flag
+from multi_session_http import MultiSessionHttpServer
+from stream_fixtures import StreamSender, StreamCollector
+
+
+def run_packets(dut, packets: list[Packet], random_delay=False,
+                random_backpressure=False):
+    """
+    Sends the packets to the server, and returns the response packets.
+    """
+    data = b"".join(p.to_bytes() for p in packets)
+    sender = StreamSender(dut.rx, random_delay=random_delay)
+    receiver = StreamCollector(dut.tx, random_backpressure=random_backpressure)
+    leds = []
+
+    async def driver(ctx):
+        await sender.send_active(data)(ctx)
+        # Let the last response flush:
+        await ctx.tick().repeat(1000)
+        leds.append((ctx.get(dut.red), ctx.get(dut.green), ctx.get(dut.blue)))
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_process(receiver.collect())
+    sim.add_testbench(driver)
+    sim.run()
+
+    rcvd = receiver.body
+    responses = []
+    while len(rcvd) > 0:
+        (p, rcvd) = Packet.from_bytes(rcvd)
+        assert p is not None, f"remaining data: {rcvd}"
+        assert p.to_host and p.start and p.end
+        responses.append(p)
+    return (responses, leds[0])
+
+
+def split(stream_id: int, request: bytes, sizes: list[int]) -> list[Packet]:
+    """
+    Splits a request into a session's packets: the first starts the session,
+    the last ends it.
+    """
+    packets = []
+    for size in sizes:
+        packets.append(Packet(stream_id=stream_id, body=request[:size]))
+        request = request[size:]
+    packets.append(Packet(stream_id=stream_id, body=request))
+    packets[0].flags |= Flag.START
+    packets[-1].flags |= Flag.END
+    return packets
+
+
+def interleave(sessions: list[list[Packet]]) -> list[Packet]:
+    """
+    Interleaves sessions' packets at random, keeping each session in order.
+    """
+    sessions = [list(s) for s in sessions]
+    packets = []
+    while any(sessions):
+        s = random.choice([s for s in sessions if s])
+        packets.append(s.pop(0))
+    return packets
+
+
+def status(response: Packet) -> str:
+    return response.body.decode("utf-8").split("\r\n")[0]
+
+
+def test_single():
+    dut = MultiSessionHttpServer(sessions=4)
+    request = b"POST /led HTTP/1.0\r\nHost: fomu\r\n\r\n123456\r\n"
+    (responses, leds) = run_packets(dut, split(2, request, [5, 20]))
+    assert len(responses) == 1
+    assert responses[0].stream_id == 2
+    assert status(responses[0]) == "HTTP/1.0 200 OK"
+    assert leds == (0x12, 0x34, 0x56)
+
+
+def test_routes():
+    dut = MultiSessionHttpServer(sessions=8)
+    requests = {
+        0: (b"GET /coffee HTTP/1.0\r\n\r\n", "HTTP/1.0 418 I'm a teapot"),
+        1: (b"GET /led HTTP/1.0\r\n\r\n", "HTTP/1.0 405 Method Not Allowed"),
+        2: (b"GET /missing HTTP/1.0\r\nAccept: */*\r\n\r\n",
+            "HTTP/1.0 404 Not Found"),
+        3: (b"POST /led HTTP/1.0\r\n\r\nABCDEF", "HTTP/1.0 200 OK"),
+        4: (b"POST /led HTTP/1.0\r\n\r\nABCDEG\r\n", "HTTP/1.0 404 Not Found"),
+        5: (b"BREW /coffee HTTP/1.0\r\n", "HTTP/1.0 404 Not Found"),
+        6: (b"BREW /coffee HTTP/1.0\r\n\r\n", "HTTP/1.0 418 I'm a teapot"),
+    }
+    sessions = [split(s, request, [random.randint(0, 10), random.randint(0, 10)])
+                for (s, (request, _)) in requests.items()]
+    (responses, leds) = run_packets(
+        dut, interleave(sessions), random_delay=True, random_backpressure=True)
+    got = {r.stream_id: status(r) for r in responses}
+    assert len(got) == len(responses)
+    assert got == {s: want for (s, (_, want)) in requests.items()}
+    assert leds == (0xAB, 0xCD, 0xEF)
+
+
+def test_many_sessions():
+    """
+    Serves dozens of concurrent sessions, with their packets interleaved.
+    """
+    n = 32
+    dut = MultiSessionHttpServer(sessions=n)
+    sessions = []
+    for s in range(n):
+        request = f"POST /led HTTP/1.0\r\n\r\n{s:06X}\r\n".encode("utf-8")
+        sizes = sorted(random.sample(range(1, len(request)), 4))
+        sessions.append(split(s, request, [b - a for (a, b) in zip([0] + sizes, sizes)]))
+    (responses, _) = run_packets(dut, interleave(sessions))
+    assert sorted(r.stream_id for r in responses) == list(range(n))
+    assert all(status(r) == "HTTP/1.0 200 OK" for r in responses)
+
+
+def test_unserved_stream():
+    dut = MultiSessionHttpServer(sessions=2)
+    packets = (split(7, b"GET /coffee HTTP/1.0\r\n\r\n", [3])
+               + split(1, b"GET /coffee HTTP/1.0\r\n\r\n", [3]))
+    (responses, _) = run_packets(dut, packets)
+    assert [r.stream_id for r in responses] == [1]
+
+
+def test_session_reuse():
+    """
+    A new session on a stream starts parsing afresh.
+    """
+    dut = MultiSessionHttpServer(sessions=2)
+    packets = (split(1, b"GET /coff", [])
+               + split(1, b"GET /coffee HTTP/1.0\r\n\r\n", [8]))
+    (responses, _) = run_packets(dut, packets)
+    assert [status(r) for r in responses] == [
+        "HTTP/1.0 404 Not Found", "HTTP/1.0 418 I'm a teapot"]
+
+
+def test_switch_overhead():
+    """
+    Switching sessions between packets costs no cycles: the bus moves a byte
+    every cycle while no response is written.
+    """
+    dut = MultiSessionHttpServer(sessions=8)
+    sessions = [split(s, b"GET /coffee HTTP/1.0\r\nHost: fomu\r\n", [3, 9, 1, 12])
+                for s in range(8)]
+    # Leave the sessions open, so none is answered yet.
+    packets = [p for p in interleave(sessions) if not p.end]
+    data = b"".join(p.to_bytes() for p in packets)
+
+    async def driver(ctx):
+        ctx.set(dut.tx.ready, 1)
+        ctx.set(dut.rx.valid, 1)
+        cycles = 0
+        idx = 0
+        while idx < len(data):
+            ctx.set(dut.rx.payload, data[idx])
+            if ctx.get(dut.rx.ready):
+                idx += 1
+            cycles += 1
+            await ctx.tick()
+        ctx.set(dut.rx.valid, 0)
+        assert cycles == len(data), (cycles, len(data))
+        assert not ctx.get(dut.tx.valid)
+
+    sim = Simulator(dut)
+    sim.add_clock(1e-6)
+    sim.add_testbench(driver)
+    sim.run()
+
+
+def test_content_length():
+    dut = MultiSessionHttpServer(sessions=8)
+    requests = {
+        # The body ends after its length, whatever follows:
+        0: (b"POST /led HTTP/1.0\r\ncontent-length: 6\r\n\r\n123456GARBAGE",
+            "HTTP/1.0 200 OK"),
+        1: (b"POST /led HTTP/1.0\r\nContent-Length: 4\r\n\r\n123456",
+            "HTTP/1.0 404 Not Found"),
+        2: (b"POST /led HTTP/1.0\r\nContent-Length: 0\r\n\r\n123456",
+            "HTTP/1.0 404 Not Found"),
+        # Or at its delimiter, if that's sooner:
+        3: (b"POST /led HTTP/1.0\r\nCONTENT-LENGTH:\t20 \r\n\r\nABCDEF\r\n",
+            "HTTP/1.0 200 OK"),
+        4: (b"GET /coffee HTTP/1.0\r\nContent-Length: 0\r\n\r\n",
+            "HTTP/1.0 418 I'm a teapot"),
+        # Not a Content-Length:
+        5: (b"GET /coffee HTTP/1.0\r\nX-Content-Length: x\r\n\r\n",
+            "HTTP/1.0 418 I'm a teapot"),
+    }
+    sessions = [split(s, request, [random.randint(0, 30)])
+                for (s, (request, _)) in requests.items()]
+    (responses, _) = run_packets(dut, interleave(sessions))
+    got = {r.stream_id: status(r) for r in responses}
+    assert got == {s: want for (s, (_, want)) in requests.items()}
+
+
+def test_invalid_content_length():
+    dut = MultiSessionHttpServer(sessions=8)
+    lengths = [
+        # Would wrap to 1 in 16 bits:
+        b"Content-Length: 65537\r\n",
+        # Would be read as 10:
+        b"Content-Length: 1\r\nContent-Length: 0\r\n",
+        # Would be read as 12:
+        b"Content-Length: 1 2\r\n",
+        b"Content-Length: 12ab\r\n",
+        b"Content-Length: \r\n",
+    ]
+    sessions = [
+        split(s, b"GET /coffee HTTP/1.0\r\n" + length + b"\r\n",
+              [random.randint(0, 30)])
+        for (s, length) in enumerate(lengths)]
+    (responses, _) = run_packets(dut, interleave(sessions))
+    assert sorted(r.stream_id for r in responses) == list(range(len(lengths)))
+    assert all(status(r) == "HTTP/1.0 400 Bad Request" for r in responses)
@@ -143,6 +143,26 @@ class InboundStop(Component):
 
         this_stop = read_stream == self._stream_id
 
+        def read_body(flags):
+            """
+            Read the body of the packet, if it has one.
+            """
+            with m.If(read_len == 0):
+                end_packet(flags)
+            with m.Else():
+                m.d.comb += input_limiter.count.eq(read_len)
+                m.d.comb += input_limiter.start.eq(1)
+                m.next = "read-body"
+
+        def end_packet(flags):
+            m.next = "read-stream"
+            m.d.sync += [read_len.eq(0), read_stream.eq(0)]
+            with m.If(flags.end):
+                m.d.sync += [
+                    self.stop.active.eq(0),
+                    connected.eq(0)
+                ]
+
         with m.FSM(name="read"):
             bus = self.bus
             with m.State("read-stream"):
@@ -164,7 +184,8 @@ class InboundStop(Component):
                 m.d.comb += bus.ready.eq(1)
                 with m.If(bus.valid):
                     m.d.sync += read_flags.bytes.eq(bus.payload)
-                    is_start = flags_layout(bus.payload).flags.start
+                    flags = flags_layout(bus.payload).flags
+                    is_start = flags.start
 
                     # If the packet is for this channel
                     # and we're already connected or it's a start panic,
@@ -174,18 +195,14 @@ class InboundStop(Component):
                             m.d.sync += self.stop.active.eq(1)
                             m.next = "await-accept"
                         with m.Else():
-                            m.d.comb += input_limiter.count.eq(read_len)
-                            m.d.comb += input_limiter.start.eq(1)
-                            m.next = "read-body"
+                            read_body(flags)
                     # Otherwise, ignore the packet.
                     with m.Else():
                         # TODO: Forward data to downstream stop if stream
                         # doesn't match.
                         # For now: if this isn't for our stream,
                         # proceed to read (and discard)
-                        m.d.comb += input_limiter.count.eq(read_len)
-                        m.d.comb += input_limiter.start.eq(1)
-                        m.next = "read-body"
+                        read_body(flags)
             with m.State("await-accept"):
                 m.next = "await-accept"
                 # Flags handling. We only do this if we've matched the stop ID.
@@ -194,9 +211,7 @@ class InboundStop(Component):
 
                 with m.If(self.accepted):
                     m.d.sync += connected.eq(1)
-                    m.d.comb += input_limiter.count.eq(read_len)
-                    m.d.comb += input_limiter.start.eq(1)
-                    m.next = "read-body"
+                    read_body(read_flags.flags)
 
             with m.State("read-body"):
                 m.next = "read-body"
@@ -213,13 +228,7 @@ class InboundStop(Component):
                     ]
                 m.d.comb += input_limiter.start.eq(0)
                 with m.If(input_limiter.done):
-                    m.next = "read-stream"
-                    m.d.sync += [read_len.eq(0), read_stream.eq(0)]
-                    with m.If(read_flags.flags.end):
-                        m.d.sync += [
-                            self.stop.active.eq(0),
-                            connected.eq(0)
-                        ]
+                    end_packet(read_flags.flags)
 
         return m
 
@@ -263,6 +272,17 @@ class OutboundStop(Component):
         m.d.sync += send_flags.flags.to_host.eq(1)
         send_len = Signal(8)
 
+        def end_packet():
+            m.d.sync += [
+                send_flags.flags.start.eq(0),
+                send_flags.flags.end.eq(0),
+            ]
+            with m.If(send_flags.flags.end):
+                m.d.sync += self.connected.eq(0)
+                m.next = "disconnected"
+            with m.Else():
+                m.next = "write-stream"
+
         # Cases in which we want to send a packet:
         with m.FSM(name="write"):
             with m.State("disconnected"):
@@ -307,11 +327,14 @@ class OutboundStop(Component):
                     self.bus.valid.eq(1),
                 ]
                 with m.If(self.bus.ready):
-                    m.d.comb += [
-                        output_limiter.count.eq(send_len),
-                        output_limiter.start.eq(1),
-                    ]
-                    m.next = "write-body"
+                    with m.If(send_len == 0):
+                        end_packet()
+                    with m.Else():
+                        m.d.comb += [
+                            output_limiter.count.eq(send_len),
+                            output_limiter.start.eq(1),
+                        ]
+                        m.next = "write-body"
             with m.State("write-body"):
                 m.next = "write-body"
                 m.d.comb += [
@@ -321,15 +344,7 @@ class OutboundStop(Component):
                 ]
 
                 with m.If(output_limiter.done):
-                    m.d.sync += [
-                        send_flags.flags.start.eq(0),
-                        send_flags.flags.end.eq(0),
-                    ]
-                    with m.If(send_flags.flags.end):
-                        m.d.sync += self.connected.eq(0)
-                        m.next = "disconnected"
-                    with m.Else():
-                        m.next = "write-stream"
+                    end_packet()
 
         return m
 
@@ -94,3 +94,49 @@ def test_single_stop():
         bodies += packet.body
 
     assert bodies == p4_body
+
+
+def test_inbound_overhead():
+    """
+    Once a session is started, reading packets costs only their header
+    bytes: the bus moves a byte every cycle.
+    """
+    dut = StreamStop(2)
+
+    sim = Simulator(dut)
+    collect_stop = StreamCollector(dut.stop.inbound.data)
+    sim.add_process(collect_stop.collect())
+    send_bus = StreamSender(dut.bus.upstream)
+
+    start = Packet(flags=Flag.START, stream_id=2, body=bytes())
+    packets = [Packet(stream_id=2, body=bytes(range(n)))
+               for n in [1, 10, 0, 255, 3]]
+    data = b"".join(p.to_bytes() for p in packets)
+
+    async def driver(ctx):
+        await send_bus.send_active(start.to_bytes())(ctx)
+        ctx.set(dut.stop.outbound.active, 1)
+        await ctx.tick().until(dut.stop.inbound.active)
+        # Let the stop finish with the start packet.
+        await ctx.tick().repeat(4)
+
+        in_stream = dut.bus.upstream
+        ctx.set(in_stream.valid, 1)
+        cycles = 0
+        idx = 0
+        while idx < len(data):
+            ctx.set(in_stream.payload, data[idx])
+            if ctx.get(in_stream.ready):
+                idx += 1
+            cycles += 1
+            await ctx.tick()
+        ctx.set(in_stream.valid, 0)
+        assert cycles == len(data), (cycles, len(data))
+        # Let the data drain out of the stop:
+        await ctx.tick().repeat(10)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    collect_stop.assert_eq(b"".join(p.body for p in packets))
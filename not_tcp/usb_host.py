@@ -0,0 +1,70 @@
+import usb.core
+import usb.util
+
+from not_tcp.host import StreamProxy
+
+__all__ = ["UsbBulkProxy"]
+
+VENDOR_SPECIFIC = 0xFF
+
+
+class UsbBulkProxy(StreamProxy):
+    """
+    StreamProxy to a device over a pair of USB bulk endpoints,
+    as presented by usb_bulk.USBBulkDevice; bypassing the tty layer that
+    a USB serial device goes through.
+
+    Reads ask for several packets' worth at once, so a busy device
+    fills whole transfers.
+    """
+
+    def __init__(self, ep_in, ep_out, timeout: int = 100,
+                 read_packets: int = 64):
+        """
+        Arguments:
+        ep_in:          Bulk IN endpoint, e.g. a usb.core.Endpoint.
+        ep_out:         Bulk OUT endpoint.
+        timeout:        Timeout for each read or write, in milliseconds.
+        read_packets:   Most packets to read at once.
+        """
+        self._ep_in = ep_in
+        self._ep_out = ep_out
+        self._timeout = timeout
+        self._read_size = ep_in.wMaxPacketSize * read_packets
+
+    @classmethod
+    def open(cls, idVendor: int = 0x1209, idProduct: int = 0x5411,
+             **kwargs) -> "UsbBulkProxy":
+        """
+        Find a device by its IDs, and claim its vendor-specific interface.
+        """
+        device = usb.core.find(idVendor=idVendor, idProduct=idProduct)
+        if device is None:
+            raise ValueError(
+                f"no USB device {idVendor:04x}:{idProduct:04x}")
+        device.set_configuration()
+        interface = usb.util.find_descriptor(
+            device.get_active_configuration(),
+            bInterfaceClass=VENDOR_SPECIFIC)
+        if interface is None:
+            raise ValueError(
+                f"USB device {idVendor:04x}:{idProduct:04x} "
+                "has no vendor-specific interface")
+        usb.util.claim_interface(device, interface)
+
+        def endpoint(direction):
+            return usb.util.find_descriptor(
+                interface, custom_match=lambda e:
+                usb.util.endpoint_direction(e.bEndpointAddress) == direction)
+
+        return cls(endpoint(usb.util.ENDPOINT_IN),
+                   endpoint(usb.util.ENDPOINT_OUT), **kwargs)
+
+    def send(self, b: bytes):
+        self._ep_out.write(b, self._timeout)
+
+    def recv(self) -> bytes:
+        try:
+            return bytes(self._ep_in.read(self._read_size, self._timeout))
+        except usb.core.USBTimeoutError:
+            return bytes()
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+import usb.core
+
+from ntcp_http import NtcpHttpServer
+from not_tcp.usb_host import UsbBulkProxy
+from sim_server import SimServer
+
+pytest_plugins = ('pytest_asyncio',)
+
+
+class SimEndpoints:
+    """
+    Bulk endpoints, as pyusb presents them, onto a simulated server.
+    """
+
+    wMaxPacketSize = 64
+
+    def __init__(self, srv: SimServer):
+        self._srv = srv
+        self._buffer = bytes()
+        self.reads = []
+
+    def write(self, data: bytes, timeout: int):
+        self._srv.send(data)
+        return len(data)
+
+    def read(self, size: int, timeout: int):
+        self.reads.append(size)
+        if not self._buffer:
+            self._buffer = self._srv.recv()
+        if not self._buffer:
+            raise usb.core.USBTimeoutError("timeout", -7, 110)
+        (data, self._buffer) = (self._buffer[:size], self._buffer[size:])
+        return data
+
+
+@pytest.mark.asyncio
+async def test_usb_bulk_proxy():
+    dut = NtcpHttpServer()
+
+    with SimServer(dut, dut.tx, dut.rx) as srv:
+        endpoints = SimEndpoints(srv)
+        proxy = UsbBulkProxy(endpoints, endpoints)
+        server = await asyncio.start_server(
+            client_connected_cb=proxy.client_connected, host="localhost",
+            port=3279)
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", 3279)
+            writer.write(
+                "\r\n".join([
+                    "POST /nothing-here HTTP/1.0",
+                    "",
+                    "",
+                ]).encode("utf-8")
+            )
+            await writer.drain()
+
+            read = await reader.read(-1)
+        response = read.decode("utf-8")
+        assert response.split("\r\n")[0] == "HTTP/1.0 404 Not Found"
+        # Reads are for whole packets:
+        assert {size % 64 for size in endpoints.reads} == {0}
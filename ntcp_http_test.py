@@ -38,7 +38,14 @@ def test_sim_without_fixture():
 
 
 def test_sim():
-    dut = NtcpHttpServer()
+    check_sim(NtcpHttpServer())
+
+
+def test_sim_registered():
+    check_sim(NtcpHttpServer(registered=True))
+
+
+def check_sim(dut):
 
     with SimServer(dut, dut.tx, dut.rx) as srv:
         p1 = Packet(flags=Flag.START | Flag.END, stream_id=1,
@@ -0,0 +1,217 @@
+import concurrent.futures
+import os
+import pathlib
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Optional
+
+from amaranth.build.run import LocalBuildProducts
+
+from build_cache import BuildCache
+
+__all__ = ["ClockTiming", "Placement", "Sweep", "parse_timing", "sweep",
+           "sweep_build"]
+
+_MAX_FREQUENCY = re.compile(
+    r"Max frequency for clock\s+'([^']+)': ([\d.]+) MHz "
+    r"\((?:PASS|FAIL) at ([\d.]+) MHz\)")
+
+
+@dataclass
+class ClockTiming:
+    """
+    Timing of one clock, in MHz.
+    """
+    fmax: float
+    target: float
+
+    @property
+    def margin(self) -> float:
+        return self.fmax / self.target
+
+
+def parse_timing(log: str) -> dict[str, ClockTiming]:
+    """
+    Timing of each clock from a nextpnr log.
+
+    nextpnr reports timing after placement and again after routing;
+    the last report is the one that counts.
+    """
+    timing = {}
+    for (clock, fmax, target) in _MAX_FREQUENCY.findall(log):
+        timing[clock] = ClockTiming(float(fmax), float(target))
+    return timing
+
+
+@dataclass
+class Placement:
+    """
+    Result of place-and-route with one seed.
+
+    timing is empty if place-and-route failed, with the reason in error.
+    """
+    seed: int
+    timing: dict[str, ClockTiming] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def margin(self) -> Optional[float]:
+        """
+        fmax / target of the worst clock.
+        """
+        if not self.timing:
+            return None
+        return min(t.margin for t in self.timing.values())
+
+    @property
+    def passed(self) -> bool:
+        return self.margin is not None and self.margin >= 1
+
+
+@dataclass
+class Sweep:
+    """
+    Results of a seed sweep; best is the placement that was kept.
+    """
+    placements: list[Placement]
+    best: Optional[Placement]
+
+    def summary(self) -> str:
+        clocks = sorted({c for p in self.placements for c in p.timing})
+        width = max([len(c) for c in clocks] + [8])
+        lines = ["seed  margin  " + "  ".join(f"{c:>{width}}" for c in clocks)]
+        for p in self.placements:
+            if p.margin is None:
+                lines.append(f"{p.seed:>4}  failed: {p.error}")
+                continue
+            fmax = (f"{p.timing[c].fmax:>{width}.2f}" if c in p.timing
+                    else " " * width for c in clocks)
+            lines.append(f"{p.seed:>4}  {p.margin:>6.3f}  " + "  ".join(fmax))
+
+        lines.append("")
+        lines.append(f"{'clock':<{width}}  target     min  median     max"
+                     "  passed")
+        for c in clocks:
+            timings = [p.timing[c] for p in self.placements if c in p.timing]
+            fmax = [t.fmax for t in timings]
+            passed = sum(1 for t in timings if t.margin >= 1)
+            lines.append(
+                f"{c:<{width}}  {timings[0].target:>6.2f}  {min(fmax):>6.2f}"
+                f"  {statistics.median(fmax):>6.2f}  {max(fmax):>6.2f}"
+                f"  {passed:>3}/{len(self.placements)}")
+
+        lines.append("")
+        if self.best is None:
+            lines.append("no seed placed and routed")
+        else:
+            lines.append(f"best: seed {self.best.seed}, "
+                         f"worst-clock fmax / target {self.best.margin:.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def seeded(command: list[str], seed: int) -> list[str]:
+    """
+    A nextpnr command with the given seed, that completes even if timing
+    fails (so failing seeds still report their fmax).
+    """
+    (tool, *args) = command
+    kept = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == "--seed":
+            skip = True
+        elif arg != "--timing-allow-fail":
+            kept.append(arg)
+    return [tool, "--seed", str(seed), "--timing-allow-fail", *kept]
+
+
+def sweep(cache: BuildCache, plan, name: str, seeds, build_dir="build",
+          jobs: Optional[int] = None) -> Sweep:
+    """
+    Build a plan, placing and routing once per seed, in parallel; and keep
+    the seed with the best timing. Its products go in build_dir;
+    each seed's in a seed_<n> directory below it.
+
+    The best seed is that with the best fmax / target on its worst clock.
+    A summary of the sweep goes in {name}.seeds.txt.
+
+    Parameters
+    ----------
+    cache:      BuildCache to build through. Synthesis runs once;
+                and a seed that's been placed before isn't run again.
+    plan:       Build plan, from platform.prepare.
+    name:       Name of the design in the plan.
+    seeds:      nextpnr seeds to try.
+    build_dir:  Directory to build in.
+    jobs:       Most placements to run at once; by default, one per CPU.
+    """
+    build_dir = plan.extract(build_dir)
+    commands = cache.commands(plan, name)
+    (pnr,) = (i for (i, (tool, *_)) in enumerate(commands)
+              if tool.startswith("nextpnr"))
+    log = commands[pnr][commands[pnr].index("--log") + 1]
+
+    # Synthesize once, before the placements start:
+    key = cache.source_key(plan, name)
+    for command in commands[:pnr]:
+        key = cache.run(plan, build_dir, key, command)
+
+    # (Extracting changes directory, so can't be done in parallel.)
+    seed_dirs = {seed: plan.extract(build_dir / f"seed_{seed}")
+                 for seed in seeds}
+
+    def place(seed: int) -> Placement:
+        seed_dir = seed_dirs[seed]
+        key = cache.source_key(plan, name)
+        try:
+            for command in commands[:pnr]:
+                key = cache.run(plan, seed_dir, key, command)
+            key = cache.run(plan, seed_dir, key, seeded(commands[pnr], seed))
+            for command in commands[pnr + 1:]:
+                key = cache.run(plan, seed_dir, key, command)
+        except subprocess.CalledProcessError as e:
+            return Placement(seed, error=str(e))
+        return Placement(seed, parse_timing((seed_dir / log).read_text()))
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs or os.cpu_count()) as pool:
+        placements = list(pool.map(place, seed_dirs))
+
+    placed = [p for p in placements if p.margin is not None]
+    best = max(placed, key=lambda p: p.margin) if placed else None
+    if best is not None:
+        for f in seed_dirs[best.seed].iterdir():
+            if f.is_file() and f.name not in plan.files:
+                shutil.copyfile(f, build_dir / f.name)
+
+    result = Sweep(placements, best)
+    (build_dir / f"{name}.seeds.txt").write_text(result.summary())
+    return result
+
+
+def sweep_build(platform, elaboratable, seeds, cache: BuildCache,
+                name: str = "top", build_dir="build",
+                jobs: Optional[int] = None, do_program: bool = False,
+                program_opts: dict = None, **kwargs) -> Sweep:
+    """
+    As platform.build(elaboratable, ...), but sweeping nextpnr seeds.
+
+    Programs the device only if the best seed meets timing.
+    Raises RuntimeError if it was to program, and no seed met timing.
+    """
+    plan = platform.prepare(elaboratable, name, **kwargs)
+    result = sweep(cache, plan, name, seeds, build_dir, jobs)
+    sys.stderr.write(result.summary())
+    if do_program:
+        if result.best is None or not result.best.passed:
+            raise RuntimeError("no seed met timing; not programming")
+        platform.toolchain_program(
+            LocalBuildProducts(pathlib.Path(build_dir).resolve()), name,
+            **(program_opts or {}))
+    return result
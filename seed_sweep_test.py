@@ -0,0 +1,61 @@
+from amaranth_boards.fomu_pvt import FomuPVTPlatform
+
+from build_cache import BuildCache
+from build_cache_test import Blinky
+from seed_sweep import ClockTiming, Placement, parse_timing, seeded, sweep
+
+LOG = """
+Info: Max frequency for clock    'core_clk': 21.90 MHz (PASS at 20.01 MHz)
+Info: Max frequency for clock 'cd_sync.clk': 11.50 MHz (FAIL at 12.00 MHz)
+Info: Routing..
+Info: Max frequency for clock    'core_clk': 23.73 MHz (PASS at 20.01 MHz)
+Info: Max frequency for clock 'cd_sync.clk': 21.41 MHz (PASS at 12.00 MHz)
+"""
+
+
+def test_parse_timing():
+    # After routing, not after placement:
+    assert parse_timing(LOG) == {
+        "core_clk": ClockTiming(23.73, 20.01),
+        "cd_sync.clk": ClockTiming(21.41, 12.00),
+    }
+    placement = Placement(1, parse_timing(LOG))
+    assert placement.margin == 23.73 / 20.01
+    assert placement.passed
+    assert Placement(2, {"c": ClockTiming(11, 12)}).passed is False
+    assert Placement(3, error="no").margin is None
+
+
+def test_seeded():
+    command = ["nextpnr-ice40", "--seed", "1", "--log", "top.tim"]
+    assert seeded(command, 7) == [
+        "nextpnr-ice40", "--seed", "7", "--timing-allow-fail",
+        "--log", "top.tim"]
+
+
+def test_sweep(tmp_path):
+    build_dir = tmp_path / "build"
+    cache = BuildCache(tmp_path / "cache")
+    plan = FomuPVTPlatform().prepare(Blinky())
+    result = sweep(cache, plan, "top", range(1, 4), build_dir, jobs=2)
+
+    # Synthesized once, and placed once per seed:
+    assert cache.misses.count("yosys") == 1
+    assert cache.misses.count("nextpnr-ice40") == 3
+    assert [p.seed for p in result.placements] == [1, 2, 3]
+    assert all(p.passed for p in result.placements)
+    assert result.best.margin == max(p.margin for p in result.placements)
+
+    # The best seed's products are kept:
+    best = build_dir / f"seed_{result.best.seed}"
+    assert (build_dir / "top.bin").read_bytes() == \
+        (best / "top.bin").read_bytes()
+    assert parse_timing((build_dir / "top.tim").read_text()) == \
+        result.best.timing
+    summary = (build_dir / "top.seeds.txt").read_text()
+    assert f"best: seed {result.best.seed}" in summary
+
+    # Seeds placed before aren't placed again:
+    cache = BuildCache(tmp_path / "cache")
+    sweep(cache, plan, "top", range(1, 5), build_dir)
+    assert cache.misses == ["nextpnr-ice40", "icepack"]
@@ -7,7 +7,7 @@ import random
 import queue
 from typing import Iterable
 
-__all__ = ["StreamCollector", "StreamSender"]
+__all__ = ["StreamCollector", "StreamSender", "WideStreamSender"]
 
 
 class StreamCollector:
@@ -278,9 +278,73 @@ class StreamSender:
                     else:
                         # Don't become in-valid until the byte is transferred.
                         valid = valid | self.is_valid()
+                        ctx.set(stream.valid, valid)
                 counter += 1
             # All done with the data input.
             ctx.set(stream.valid, 0)
             self.done = True
 
         return sender
+
+
+class WideStreamSender:
+    """
+    Transmit bytes into an Amaranth stream of several bytes at a time,
+    with the layout from http_server.widen.wide_layout.
+    """
+
+    def __init__(self, stream, lanes: int, random_delay=False,
+                 random_partial=False):
+        """
+        Construct a wide sender.
+
+        Arguments:
+        stream: Amaranth stream of wide_layout(lanes) to write to.
+        lanes:  Bytes per word.
+        random_delay: Introduce random delay before words are valid.
+        random_partial: Send randomly partially-filled words.
+        """
+        super().__init__()
+        self.random_delay = random_delay
+        self.random_partial = random_partial
+        self._stream = stream
+        self._lanes = lanes
+
+    def words(self, data: bytes) -> list[bytes]:
+        """
+        Split the data into words.
+        """
+        words = []
+        while len(data) > 0:
+            n = self._lanes
+            if self.random_partial:
+                n = random.randint(1, self._lanes)
+            words.append(data[:n])
+            data = data[n:]
+        return words
+
+    def send_active(self, data: Iterable[int]):
+        """
+        Returns a coroutine that drives the simulation while sending the
+        provided data.
+        The provided coroutine returns when all the data are sent.
+        """
+        stream = self._stream
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        async def sender(ctx):
+            for word in self.words(bytes(data)):
+                for (j, datum) in enumerate(word):
+                    ctx.set(stream.payload.data[j], datum)
+                ctx.set(stream.payload.mask, (1 << len(word)) - 1)
+                valid = (not self.random_delay) or random.randint(0, 1)
+                while True:
+                    ctx.set(stream.valid, valid)
+                    ready = ctx.get(stream.ready)
+                    await ctx.tick()
+                    if ready == 1 and valid == 1:
+                        break
+                    valid = valid or random.randint(0, 1)
+            ctx.set(stream.valid, 0)
+        return sender
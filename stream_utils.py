@@ -1,7 +1,6 @@
-from amaranth import Module, Signal
+from amaranth import Module, Signal, Array, Mux
 from amaranth.lib.wiring import Component, In, Out
 from amaranth.lib import stream
-from amaranth.utils import ceil_log2
 
 
 def tree_and(m: Module, inputs: list[Signal]) -> Signal:
@@ -47,64 +46,266 @@ class LimitForwarder(Component):
     """
     Forwards a limited number of bytes from one stream to another, then stops.
 
+    Forwarding starts in the same cycle as `start`, and `done` is asserted
+    with the last transfer; so bursts can follow each other without a dead
+    cycle between them.
+
     Parameters
     ---------
     width: width of the data stream.
-    max_count: maximum value of the counter.
+    max_count: maximum number of bytes to forward.
 
-    TODO: Documentation for attributes
+    Attributes
+    ----------
+    inbound:  Stream(width), in
+    outbound: Stream(width), out
+    count:    Signal(range(max_count + 1)), in
+              Number of bytes to forward; sampled with `start`.
+    start:    Signal(1), in
+              Start forwarding. Only valid while `done` is high, and not in
+              the cycle of the last transfer.
+    done:     Signal(1), out
+              High when not forwarding, and in the cycle of the last
+              transfer.
     """
 
     def __init__(self, width: int, max_count: int):
-        count = ceil_log2(max_count)
-
         super().__init__({
             "inbound": In(stream.Signature(width)),
             "outbound": Out(stream.Signature(width)),
-            "count": In(count),
+            "count": In(range(max_count + 1)),
             "start": In(1),
             "done": Out(1),
         })
-        self._count = count
+        self._max_count = max_count
 
     def elaborate(self, _platform):
         m = Module()
 
-        countdown = Signal(self._count)
+        running = Signal(1)
+        countdown = Signal(range(self._max_count + 1))
+        # Bytes left to forward, including a count loaded this cycle:
+        remaining = Signal(range(self._max_count + 1))
+        m.d.comb += remaining.eq(Mux(self.start, self.count, countdown))
+        forwarding = Signal(1)
+        m.d.comb += forwarding.eq((self.start | running) & (remaining != 0))
+
         # No transfer by default:
         m.d.comb += [
             self.inbound.ready.eq(0),
             self.outbound.valid.eq(0),
+            self.outbound.payload.eq(self.inbound.payload),
+        ]
+        with m.If(forwarding):
+            m.d.comb += [
+                self.inbound.ready.eq(self.outbound.ready),
+                self.outbound.valid.eq(self.inbound.valid),
+            ]
+        transferred = Signal(1)
+        m.d.comb += [
+            transferred.eq(forwarding & self.inbound.valid & self.outbound.ready),
+            self.done.eq(~forwarding | (transferred & (remaining == 1))),
+        ]
+        m.d.sync += [
+            running.eq(~self.done),
+            countdown.eq(remaining - transferred),
+        ]
+
+        return m
+
+
+class PipelineRegister(Component):
+    """
+    Registers the forward (valid and payload) path of a stream.
+
+    `ready` passes through combinationally, so this breaks only the forward
+    paths; it accepts a transfer every cycle that its output is ready or
+    empty, so adds one cycle of latency without reducing throughput.
+
+    Parameters
+    ----------
+    width: width of the data stream.
+
+    Attributes
+    ----------
+    inbound:  Stream(width), in
+    outbound: Stream(width), out
+    """
+
+    def __init__(self, width: int):
+        super().__init__({
+            "inbound": In(stream.Signature(width)),
+            "outbound": Out(stream.Signature(width)),
+        })
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        m.d.comb += self.inbound.ready.eq(
+            self.outbound.ready | ~self.outbound.valid)
+        with m.If(self.inbound.ready):
+            m.d.sync += [
+                self.outbound.valid.eq(self.inbound.valid),
+                self.outbound.payload.eq(self.inbound.payload),
+            ]
+
+        return m
+
+
+class SkidBuffer(Component):
+    """
+    Registers both the forward (valid and payload) and backward (ready)
+    paths of a stream.
+
+    The output comes from a register; a second "skid" register catches the
+    transfer that is accepted in the cycle the output stalls, since the
+    registered `ready` only deasserts the cycle after. Adds one cycle of
+    latency without reducing throughput.
+
+    Parameters
+    ----------
+    width: width of the data stream.
+
+    Attributes
+    ----------
+    inbound:  Stream(width), in
+    outbound: Stream(width), out
+    """
+
+    def __init__(self, width: int):
+        super().__init__({
+            "inbound": In(stream.Signature(width)),
+            "outbound": Out(stream.Signature(width)),
+        })
+        self._width = width
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        skid = Signal(self._width)
+        skid_valid = Signal(1)
+        m.d.comb += self.inbound.ready.eq(~skid_valid)
+
+        with m.If(self.outbound.ready | ~self.outbound.valid):
+            # The output register is free for the next transfer.
+            with m.If(skid_valid):
+                m.d.sync += [
+                    self.outbound.valid.eq(1),
+                    self.outbound.payload.eq(skid),
+                    skid_valid.eq(0),
+                ]
+            with m.Else():
+                m.d.sync += [
+                    self.outbound.valid.eq(self.inbound.valid),
+                    self.outbound.payload.eq(self.inbound.payload),
+                ]
+        with m.Elif(self.inbound.valid & self.inbound.ready):
+            # The output is stalled; hold this transfer until it's free.
+            m.d.sync += [
+                skid.eq(self.inbound.payload),
+                skid_valid.eq(1),
+            ]
+
+        return m
+
+
+class RegisteredStreamMux(Component):
+    """
+    Takes in multiple streams and muxes to a single, registered stream.
+
+    Like StreamMux, but the output comes from a SkidBuffer; so `select`
+    applies to transfers into the buffer, and data already buffered is
+    still delivered after `select` changes.
+
+    Parameters
+    ----------
+    mux_width:    Number of input channels.
+    stream_width: Width of each of the streams.
+
+    Attributes
+    ----------
+    input:  Array(Stream(stream_width)), in
+            Input datastreams
+    select: Signal(range(mux_width)), in
+            Selects between the possible datastreams
+    out:    Stream(stream_width), out
+            Selected datastream
+    """
+
+    def __init__(self, mux_width: int, stream_width: int):
+        super().__init__({
+            "input": In(stream.Signature(stream_width)).array(mux_width),
+            "select": In(range(mux_width)),
+            "out": Out(stream.Signature(stream_width)),
+        })
+        self._stream_width = stream_width
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        m.submodules.buffer = buffer = SkidBuffer(self._stream_width)
+        inputs = Array([*self.input])
+        m.d.comb += [
+            buffer.inbound.payload.eq(inputs[self.select].payload),
+            buffer.inbound.valid.eq(inputs[self.select].valid),
+            inputs[self.select].ready.eq(buffer.inbound.ready),
+
+            self.out.payload.eq(buffer.outbound.payload),
+            self.out.valid.eq(buffer.outbound.valid),
+            buffer.outbound.ready.eq(self.out.ready),
         ]
 
-        with m.FSM():
-            with m.State("idle"):
-                m.next = "idle"
-                m.d.comb += self.done.eq(1)
-                with m.If(self.start):
-                    m.next = "run"
-                    m.d.sync += countdown.eq(self.count)
-            with m.State("run"):
-                m.next = "run"
-                m.d.comb += self.done.eq(0)
-                with m.If(countdown == 0):
-                    m.next = "idle"
-                with m.Else():
-                    # We want to do this:
-                    # connect(m, self.inbound, self.outbound)
-                    # But if we do so in the testbench, we get
-                    #   raise DriverConflict("Combinationally driven signals cannot be overriden by testbenches")
-                    # from
-                    #   ctx.set(dut.inbound.valid, 1)
-
-                    # Yet this works:
-                    m.d.comb += [
-                        self.inbound.ready.eq(self.outbound.ready),
-                        self.outbound.valid.eq(self.inbound.valid),
-                        self.outbound.payload.eq(self.inbound.payload),
-                    ]
-                    with m.If(self.outbound.ready & self.inbound.valid):
-                        # Byte was transferred
-                        m.d.sync += countdown.eq(countdown - 1)
+        return m
+
+
+class RegisteredStreamDemux(Component):
+    """
+    Takes in a single stream and demuxes it to multiple registered outputs.
+
+    Like StreamDemux, but each output comes from a SkidBuffer; so `select`
+    applies to transfers into the buffers, and data already buffered is
+    still delivered to its output after `select` changes.
+
+    Parameters
+    ----------
+    mux_width:    Number of output channels.
+    stream_width: Width of each of the streams.
+
+    Attributes
+    ----------
+    input:  Stream(stream_width), in
+            Input datastream
+    select: Signal(range(mux_width)), in
+            Selects between the possible datastream outputs
+    outs:   Array(Stream(stream_width)), out
+            Output datastreams
+    """
+
+    def __init__(self, mux_width: int, stream_width: int):
+        super().__init__({
+            "input": In(stream.Signature(stream_width)),
+            "select": In(range(mux_width)),
+            "outs": Out(stream.Signature(stream_width)).array(mux_width),
+        })
+        self._mux_width = mux_width
+        self._stream_width = stream_width
+
+    def elaborate(self, _platform):
+        m = Module()
+
+        buffers = []
+        for i in range(self._mux_width):
+            buffer = m.submodules[f"buffer_{i}"] = SkidBuffer(self._stream_width)
+            m.d.comb += [
+                buffer.inbound.payload.eq(self.input.payload),
+                buffer.inbound.valid.eq(self.input.valid & (self.select == i)),
+
+                self.outs[i].payload.eq(buffer.outbound.payload),
+                self.outs[i].valid.eq(buffer.outbound.valid),
+                buffer.outbound.ready.eq(self.outs[i].ready),
+            ]
+            buffers.append(buffer)
+        m.d.comb += self.input.ready.eq(
+            Array(buffer.inbound.ready for buffer in buffers)[self.select])
 
         return m
@@ -1,6 +1,9 @@
 from amaranth.sim import Simulator
 
-from stream_utils import LimitForwarder
+from stream_utils import (
+    LimitForwarder, PipelineRegister, SkidBuffer,
+    RegisteredStreamMux, RegisteredStreamDemux,
+)
 from stream_fixtures import StreamSender, StreamCollector
 
 
@@ -25,8 +28,9 @@ def test_limit_forward():
         # Send one block:
         ctx.set(dut.count, 40)
         ctx.set(dut.start, 1)
-        # Until the tick, still "done"...
-        assert ctx.get(dut.done)
+        # Forwarding starts immediately:
+        assert not ctx.get(dut.done)
+        assert ctx.get(dut.inbound.ready)
         await ctx.tick()
         ctx.set(dut.start, 0)
         assert not ctx.get(dut.done)
@@ -46,3 +50,147 @@ def test_limit_forward():
     sim.add_clock(1e-6)
 
     sim.run()
+
+
+def test_limit_forward_back_to_back():
+    """
+    Bursts can follow each other without a dead cycle, and `done` comes with
+    the last transfer.
+    """
+    dut = LimitForwarder(width=8, max_count=256)
+    bursts = [3, 1, 0, 256, 5]
+    data = bytes(i % 256 for i in range(sum(bursts)))
+
+    sim = Simulator(dut)
+    collector = StreamCollector(dut.outbound)
+    sim.add_process(collector.collect())
+    sender = StreamSender(dut.inbound)
+    sim.add_process(sender.send_passive(data))
+
+    async def driver(ctx):
+        await ctx.tick()
+        for burst in bursts:
+            ctx.set(dut.count, burst)
+            ctx.set(dut.start, 1)
+            for i in range(max(burst, 1)):
+                assert ctx.get(dut.outbound.valid) == (burst > 0)
+                assert ctx.get(dut.done) == (i == max(burst, 1) - 1), (burst, i)
+                await ctx.tick()
+                ctx.set(dut.start, 0)
+        assert ctx.get(dut.done)
+        assert not ctx.get(dut.outbound.valid)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    collector.assert_eq(data)
+
+
+def check_full_throughput(dut):
+    """
+    With the output always ready, a stage passes a transfer every cycle.
+    """
+    data = bytes(range(0, 100))
+
+    sim = Simulator(dut)
+    collector = StreamCollector(dut.outbound)
+    sim.add_process(collector.collect())
+    sender = StreamSender(dut.inbound)
+    sim.add_process(sender.send_passive(data))
+
+    async def driver(ctx):
+        valid_cycles = []
+        for cycle in range(len(data) + 10):
+            if ctx.get(dut.outbound.valid):
+                valid_cycles.append(cycle)
+            await ctx.tick()
+        # One transfer per cycle, without gaps:
+        assert len(valid_cycles) == len(data)
+        assert valid_cycles[-1] - valid_cycles[0] + 1 == len(data)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    collector.assert_eq(data)
+
+
+def check_backpressure(dut):
+    data = bytes(i % 256 for i in range(0, 500))
+
+    sim = Simulator(dut)
+    collector = StreamCollector(dut.outbound, random_backpressure=True)
+    sim.add_process(collector.collect())
+    sender = StreamSender(dut.inbound, random_delay=True)
+    sim.add_process(sender.send_passive(data))
+
+    async def driver(ctx):
+        await ctx.tick().repeat(3000)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    collector.assert_eq(data)
+
+
+def test_pipeline_register():
+    check_full_throughput(PipelineRegister(8))
+    check_backpressure(PipelineRegister(8))
+
+
+def test_skid_buffer():
+    check_full_throughput(SkidBuffer(8))
+    check_backpressure(SkidBuffer(8))
+
+
+def test_registered_mux():
+    dut = RegisteredStreamMux(mux_width=2, stream_width=8)
+
+    sim = Simulator(dut)
+    collector = StreamCollector(dut.out, random_backpressure=True)
+    sim.add_process(collector.collect())
+    senders = [StreamSender(dut.input[i], random_delay=True) for i in range(2)]
+    sim.add_process(senders[0].send_passive(b"first stream"))
+    sim.add_process(senders[1].send_passive(b"second stream"))
+
+    async def driver(ctx):
+        ctx.set(dut.select, 0)
+        await ctx.tick().until(dut.input[0].ready & dut.input[0].valid
+                               & (dut.input[0].payload == ord("m")))
+        ctx.set(dut.select, 1)
+        await ctx.tick().repeat(200)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    # The last byte of the first stream was in flight when select changed.
+    collector.assert_eq(b"first stream" + b"second stream")
+
+
+def test_registered_demux():
+    dut = RegisteredStreamDemux(mux_width=2, stream_width=8)
+
+    sim = Simulator(dut)
+    collectors = [StreamCollector(dut.outs[i], random_backpressure=True)
+                  for i in range(2)]
+    for collector in collectors:
+        sim.add_process(collector.collect())
+    sender = StreamSender(dut.input, random_delay=True)
+    sim.add_process(sender.send_passive(b"first stream|second stream"))
+
+    async def driver(ctx):
+        ctx.set(dut.select, 0)
+        await ctx.tick().until(dut.input.ready & dut.input.valid
+                               & (dut.input.payload == ord("|")))
+        ctx.set(dut.select, 1)
+        await ctx.tick().repeat(200)
+
+    sim.add_testbench(driver)
+    sim.add_clock(1e-6)
+    sim.run()
+
+    collectors[0].assert_eq(b"first stream|")
+    collectors[1].assert_eq(b"second stream")
@@ -0,0 +1,137 @@
+import amaranth as am
+from luna.gateware.stream import StreamInterface
+from luna.gateware.usb.usb2.device import USBDevice
+from luna.gateware.usb.usb2.request import StallOnlyRequestHandler
+from luna.gateware.usb.usb2.endpoints.stream import (
+    USBStreamInEndpoint, USBStreamOutEndpoint)
+from usb_protocol.types import USBRequestType
+from usb_protocol.emitters import DeviceDescriptorCollection
+
+__all__ = ["USBBulkDevice"]
+
+
+class USBBulkDevice(am.Elaboratable):
+    """
+    A byte stream over a vendor-specific pair of USB bulk endpoints.
+
+    A drop-in for LUNA's USBSerialDevice, without the CDC-ACM interfaces:
+    one interface, of the vendor-specific class, with a bulk OUT and a
+    bulk IN endpoint. The host reads and writes the endpoints directly
+    (e.g. with libusb) instead of through a tty.
+
+    Data to the host goes in max-size packets while the tx stream keeps
+    them full. Once tx has been idle for flush_cycles, whatever is
+    buffered goes as a short packet, so a response's tail isn't held
+    back waiting for more.
+
+    Runs in the "usb" domain, like LUNA's devices.
+
+    Parameters
+    ----------
+    bus:             USB PHY, as for LUNA's USBDevice.
+    idVendor:        Vendor ID to present.
+    idProduct:       Product ID to present.
+    max_packet_size: Size of bulk packets: 64 at full speed,
+                     512 at high speed.
+    flush_cycles:    How long tx is idle before a short packet is sent.
+
+    Attributes
+    ----------
+    connect: Signal(), in
+        When asserted, the device is presented to the host.
+    rx: StreamInterface(), out
+        Data received from the host.
+    tx: StreamInterface(), in
+        Data to transmit to the host.
+    """
+
+    INTERFACE_CLASS = 0xFF  # Vendor-specific
+    ENDPOINT_NUMBER = 1
+
+    def __init__(self, *, bus, idVendor, idProduct,
+                 manufacturer_string="LUNA",
+                 product_string="USB bulk stream",
+                 serial_number="",
+                 max_packet_size=64,
+                 flush_cycles=16):
+        self._bus = bus
+        self._idVendor = idVendor
+        self._idProduct = idProduct
+        self._manufacturer_string = manufacturer_string
+        self._product_string = product_string
+        self._serial_number = serial_number
+        self._max_packet_size = max_packet_size
+        self._flush_cycles = flush_cycles
+
+        self.connect = am.Signal()
+        self.rx = StreamInterface()
+        self.tx = StreamInterface()
+
+    def create_descriptors(self) -> DeviceDescriptorCollection:
+        descriptors = DeviceDescriptorCollection()
+
+        with descriptors.DeviceDescriptor() as d:
+            d.idVendor = self._idVendor
+            d.idProduct = self._idProduct
+
+            d.iManufacturer = self._manufacturer_string
+            d.iProduct = self._product_string
+            d.iSerialNumber = self._serial_number
+
+            d.bNumConfigurations = 1
+
+        with descriptors.ConfigurationDescriptor() as c:
+            with c.InterfaceDescriptor() as i:
+                i.bInterfaceNumber = 0
+                i.bInterfaceClass = self.INTERFACE_CLASS
+                i.bInterfaceSubclass = 0x00
+                i.bInterfaceProtocol = 0x00
+
+                # IN, to the host: our tx.
+                with i.EndpointDescriptor() as e:
+                    e.bEndpointAddress = 0x80 | self.ENDPOINT_NUMBER
+                    e.wMaxPacketSize = self._max_packet_size
+
+                # OUT, from the host: our rx.
+                with i.EndpointDescriptor() as e:
+                    e.bEndpointAddress = self.ENDPOINT_NUMBER
+                    e.wMaxPacketSize = self._max_packet_size
+
+        return descriptors
+
+    def elaborate(self, platform):
+        m = am.Module()
+
+        usb = m.submodules.usb = USBDevice(bus=self._bus)
+        control_ep = usb.add_standard_control_endpoint(
+            self.create_descriptors())
+        # We have no class or vendor requests.
+        control_ep.add_request_handler(StallOnlyRequestHandler(
+            lambda setup: (setup.type == USBRequestType.CLASS) |
+            (setup.type == USBRequestType.VENDOR) |
+            (setup.type == USBRequestType.RESERVED)))
+
+        rx_ep = USBStreamOutEndpoint(
+            endpoint_number=self.ENDPOINT_NUMBER,
+            max_packet_size=self._max_packet_size)
+        usb.add_endpoint(rx_ep)
+        tx_ep = USBStreamInEndpoint(
+            endpoint_number=self.ENDPOINT_NUMBER,
+            max_packet_size=self._max_packet_size)
+        usb.add_endpoint(tx_ep)
+
+        # Flush once tx has been idle a while.
+        idle = am.Signal(range(self._flush_cycles + 1))
+        with m.If(self.tx.valid):
+            m.d.usb += idle.eq(0)
+        with m.Elif(idle != self._flush_cycles):
+            m.d.usb += idle.eq(idle + 1)
+
+        m.d.comb += [
+            tx_ep.stream.stream_eq(self.tx),
+            tx_ep.flush.eq(idle == self._flush_cycles),
+            self.rx.stream_eq(rx_ep.stream),
+            usb.connect.eq(self.connect),
+        ]
+
+        return m
@@ -0,0 +1,99 @@
+import amaranth as am
+from luna.gateware.test import usb_domain_test_case
+from luna.gateware.test.usb2 import USBDeviceTest
+from luna.gateware.usb.usb2.packet import USBPacketID
+from usb_protocol.types import DescriptorTypes
+
+from usb_bulk import USBBulkDevice
+
+
+class BulkLoopback(am.Elaboratable):
+    """
+    A USBBulkDevice that sends back whatever it receives.
+
+    Only the bytes go back; not the packet boundaries, as with a server.
+    """
+
+    def __init__(self, *, bus):
+        self.device = USBBulkDevice(bus=bus, idVendor=0x1209, idProduct=0x5411)
+
+    def elaborate(self, platform):
+        m = am.Module()
+        device = m.submodules.device = self.device
+        m.d.comb += [
+            device.connect.eq(1),
+            device.tx.payload.eq(device.rx.payload),
+            device.tx.valid.eq(device.rx.valid),
+            device.rx.ready.eq(device.tx.ready),
+        ]
+        return m
+
+
+class USBBulkDeviceTest(USBDeviceTest):
+    FRAGMENT_UNDER_TEST = BulkLoopback
+
+    def initialize_signals(self):
+        # Keep the device out of bus reset, and the PHY ready.
+        yield self.utmi.line_state.eq(0b01)
+        yield self.utmi.tx_ready.eq(1)
+
+    def read_in(self, count):
+        """
+        Read packets from the bulk IN endpoint until count bytes arrive.
+        Returns the packets.
+        """
+        packets = []
+        received = 0
+        naks = 0
+        data_pid = USBPacketID.DATA0
+        while received < count:
+            pid, data = yield from self.in_transaction(
+                endpoint=USBBulkDevice.ENDPOINT_NUMBER, data_pid=data_pid)
+            if pid == USBPacketID.NAK:
+                naks += 1
+                self.assertLess(naks, self.MAX_NAKS)
+                continue
+            packets.append(bytes(data))
+            received += len(data)
+            data_pid = (USBPacketID.DATA1 if data_pid == USBPacketID.DATA0
+                        else USBPacketID.DATA0)
+        return packets
+
+    @usb_domain_test_case
+    def test_descriptors(self):
+        handshake, data = yield from self.get_descriptor(
+            DescriptorTypes.CONFIGURATION, length=64)
+        self.assertEqual(handshake, USBPacketID.ACK)
+        want = self.dut.device.create_descriptors().get_descriptor_bytes(
+            DescriptorTypes.CONFIGURATION)
+        self.assertEqual(bytes(data), want)
+
+        # One vendor-specific interface...
+        interface = bytes(data[9:18])
+        self.assertEqual(interface[1], DescriptorTypes.INTERFACE)
+        self.assertEqual(interface[4], 2)
+        self.assertEqual(interface[5], USBBulkDevice.INTERFACE_CLASS)
+        # ... with two bulk endpoints, IN and OUT.
+        endpoints = [bytes(data[18:25]), bytes(data[25:32])]
+        self.assertEqual({e[2] for e in endpoints}, {0x81, 0x01})
+        self.assertEqual({e[3] for e in endpoints}, {0x02})
+
+    @usb_domain_test_case
+    def test_vendor_request_stalls(self):
+        handshake = yield from self.control_request_out(0x40, 0x01)
+        self.assertEqual(handshake, USBPacketID.STALL)
+
+    @usb_domain_test_case
+    def test_loopback(self):
+        self.assertEqual(
+            (yield from self.set_configuration(1)), USBPacketID.DATA1)
+
+        data = bytes(range(100))
+        handshake = yield from self.out_transfer(
+            *data, endpoint=USBBulkDevice.ENDPOINT_NUMBER)
+        self.assertEqual(handshake, USBPacketID.ACK)
+
+        packets = yield from self.read_in(len(data))
+        self.assertEqual(b"".join(packets), data)
+        # Full-size packets, then the tail once the stream goes idle:
+        self.assertEqual([len(p) for p in packets], [64, 36])